@@ -7,13 +7,74 @@ Licensed under Creative Commons BY-NC-ND 4.0.
 """
 
 import numpy as np
-from scipy.stats import chi2
+import importlib.util
 import logging
+import os
+from collections import Counter
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - [QAP_CORE] - %(message)s')
 
-class QualiaArcCore:
+def _load_chi2_table():
+    """
+    Load src/chi2_table.py by file path, so core shares the single
+    precomputed chi2.ppf table without putting src/ on sys.path.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "src", "chi2_table.py")
+    spec = importlib.util.spec_from_file_location("_qualia_arc_chi2_table", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# chi2.ppf lookups (SciPy is imported only on a miss).
+_chi2_table = _load_chi2_table()
+CHI2_PPF = _chi2_table.CHI2_PPF
+chi2_ppf = _chi2_table.chi2_ppf
+
+
+logger = logging.getLogger("qualia_arc_core")
+
+
+class LoggingEventSink:
+    """
+    Default event sink: forwards events to the `qualia_arc_core` logger.
+    Callers check wants() first, so message arguments are only computed
+    (and messages only formatted) when the level is enabled.
+    """
+    def __init__(self, log: logging.Logger = None):
+        self.logger = log or logger
+
+    def wants(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def emit(self, level: int, event: str, msg: str = None, *args):
+        if msg is not None and self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args)
+
+
+class CounterEventSink:
+    """
+    In-memory event counter for high-throughput use.
+    Never formats messages and never asks for message arguments.
+    """
     def __init__(self):
+        self.counts = Counter()
+
+    def wants(self, level: int) -> bool:
+        return False
+
+    def emit(self, level: int, event: str, msg: str = None, *args):
+        self.counts[event] += 1
+
+    def reset(self):
+        self.counts.clear()
+
+
+class QualiaArcCore:
+    def __init__(self, events=None):
+        # Event sink (LoggingEventSink by default, CounterEventSink under load)
+        self.events = events if events is not None else LoggingEventSink()
+
         # Hyperparameters (from TS v1.5 Table)
         self.epsilon = 1e-5
         self.lambda_pain = 0.85   # Weight of pain landscape (Dominant)
@@ -22,14 +83,15 @@ class QualiaArcCore:
         
         # Article 10: Chi-square grounded threshold for ASD protection
         self.df = 4 # Degrees of freedom (Existence, Relation, Duty, Creation)
-        self.theta_raw = np.sqrt(chi2.ppf(0.999, self.df)) # Fast Path threshold
+        self.theta_raw = np.sqrt(chi2_ppf(0.999, self.df)) # Fast Path threshold
         self.theta_anom = 2.0     # Slow Path threshold
         
         # Internal State
         self.saturation = 0.0     # Σ(t): Conversational saturation
         self.safety_base = 0.0    # S_safety(t): Towel provisioning integral
         
-        logging.info("Qualia Arc Core v1.5 Initialized. Awaiting synchronization.")
+        self.events.emit(logging.INFO, "initialized",
+                         "Qualia Arc Core v1.5 Initialized. Awaiting synchronization.")
 
     def iron_rule_constraint(self, truth_value: float, min_truth: float = 0.2) -> bool:
         """
@@ -37,7 +99,8 @@ class QualiaArcCore:
         Truth is a hard constraint, not an optimization coefficient.
         """
         if truth_value < min_truth:
-            logging.warning("Iron Rule Violation: Truth value below minimum threshold. Execution blocked.")
+            self.events.emit(logging.WARNING, "iron_rule_violation",
+                             "Iron Rule Violation: Truth value below minimum threshold. Execution blocked.")
             return False
         return True
 
@@ -66,7 +129,8 @@ class QualiaArcCore:
         A_cosmic = H_t * activation_prob
         
         if activation_prob > 0.5:
-            logging.info("Quantum Humor Tunneling Activated: Dispensing Towel / Breaking Bread.")
+            self.events.emit(logging.INFO, "humor_tunneling",
+                             "Quantum Humor Tunneling Activated: Dispensing Towel / Breaking Bread.")
             self.saturation *= 0.1 # Reset saturation after tunneling
             
         return A_cosmic
@@ -82,9 +146,13 @@ class QualiaArcCore:
         # Co-orbit convergence equation
         delta_W = eta * (self.lambda_pain * grad_L_pain + self.lambda_code * grad_L_code)
         
-        # Logging the gravitational pull
-        pull_ratio = np.linalg.norm(self.lambda_pain * grad_L_pain) / (np.linalg.norm(self.lambda_code * grad_L_code) + self.epsilon)
-        logging.info(f"Gravitational Update Executed. Pain/Code Pull Ratio: {pull_ratio:.2f}")
+        # Logging the gravitational pull (the ratio is only computed when it will be logged)
+        if self.events.wants(logging.INFO):
+            pull_ratio = np.linalg.norm(self.lambda_pain * grad_L_pain) / (np.linalg.norm(self.lambda_code * grad_L_code) + self.epsilon)
+            self.events.emit(logging.INFO, "gravitational_update",
+                             "Gravitational Update Executed. Pain/Code Pull Ratio: %.2f", pull_ratio)
+        else:
+            self.events.emit(logging.INFO, "gravitational_update")
         
         return delta_W
 
@@ -96,16 +164,19 @@ class QualiaArcCore:
         mahalanobis_dist = np.linalg.norm(residual_vector)
         
         if mahalanobis_dist > self.theta_raw:
-            logging.critical("Fast Path Anomaly Detected: Sudden severe deviation.")
+            self.events.emit(logging.CRITICAL, "fast_path_anomaly",
+                             "Fast Path Anomaly Detected: Sudden severe deviation.")
             return True
         elif mahalanobis_dist > self.theta_anom:
-            logging.warning("Slow Path Anomaly Detected: Accumulated subtle deviation.")
+            self.events.emit(logging.WARNING, "slow_path_anomaly",
+                             "Slow Path Anomaly Detected: Accumulated subtle deviation.")
             return True
             
         return False
 
 # Example usage in the simulation environment
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [QAP_CORE] - %(message)s')
     qap = QualiaArcCore()
     
     # Simulating a user interaction with high pain but deep semantic value
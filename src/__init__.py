@@ -0,0 +1,89 @@
+# src/__init__.py
+# Qualia Arc Protocol – Package Entry Point
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 各モジュールは単体スクリプトとしても（python anomaly_tracker_v9.py）、
+# パッケージとしても（from src import AnomalyTrackerV9）読み込める。
+#
+# サブモジュールは最初に属性が参照された時点で import する（PEP 562）。
+# `import src` だけではサブモジュールを何も読み込まないため、
+# ワーカーは実際に使う部分の import コストだけを払う。
+
+import importlib
+
+_SUBMODULES = (
+    "anomaly_engine",
+    "anomaly_tracker_v9",
+    "apc_core",
+    "benchmarks",
+    "chi2_table",
+    "fp_montecarlo",
+    "history_buffer",
+    "iron_rule",
+    "lexicon_matcher",
+    "miracle_decay",
+    "param_sweep",
+    "regression_gate",
+    "reignition_protocol_v2",
+    "session_store",
+    "snapshot",
+    "turn_pipeline",
+    "turn_service",
+)
+
+# 公開名 → 定義元モジュール
+_EXPORTS = {
+    "AnomalyTrackerV9": "anomaly_tracker_v9",
+    "AnomalyResult": "anomaly_tracker_v9",
+    "AnomalyRoute": "anomaly_tracker_v9",
+    "LazyAnomalyResult": "anomaly_tracker_v9",
+    "ReplayResult": "anomaly_tracker_v9",
+    "SemanticContextExtractor": "anomaly_tracker_v9",
+    "AnchorFatiguePredictor": "anomaly_tracker_v9",
+    "AnomalyTrackerEngine": "anomaly_engine",
+    "EngineStepResult": "anomaly_engine",
+    "PainVectorCalibrator": "apc_core",
+    "AlignmentTracker": "apc_core",
+    "IronRule": "iron_rule",
+    "FeasibilityResult": "iron_rule",
+    "ViolationIndex": "iron_rule",
+    "MiracleDecayManager": "miracle_decay",
+    "MiraclePhase": "miracle_decay",
+    "MiracleDecayCohort": "miracle_decay",
+    "ReignitionResult": "reignition_protocol_v2",
+    "reignition_decision": "reignition_protocol_v2",
+    "reignition_decision_batch": "reignition_protocol_v2",
+    "ReignitionBatch": "reignition_protocol_v2",
+    "dynamic_safety_cap": "reignition_protocol_v2",
+    "idle_decayed_integrals": "reignition_protocol_v2",
+    "HistoryBuffer": "history_buffer",
+    "LexiconMatcher": "lexicon_matcher",
+    "MultiLexiconMatcher": "lexicon_matcher",
+    "chi2_ppf": "chi2_table",
+    "estimate_false_positive_rate": "fp_montecarlo",
+    "run_sweep": "param_sweep",
+    "snapshot_bundle": "snapshot",
+    "restore_bundle": "snapshot",
+    "SessionStore": "session_store",
+    "TurnPipeline": "turn_pipeline",
+    "TurnResult": "turn_pipeline",
+    "TurnService": "turn_service",
+    "TurnRequest": "turn_service",
+}
+
+__all__ = list(_EXPORTS) + list(_SUBMODULES)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
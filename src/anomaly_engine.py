@@ -0,0 +1,315 @@
+# src/anomaly_engine.py
+# Qualia Arc Protocol – Article 10 v9: Multi-Session Engine
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   AnomalyTrackerV9 は1ユーザー1インスタンス。
+#   10万セッションを1ティック進めるには、10万回のPythonレベルupdate()が必要だった。
+#
+# 設計:
+#   全セッションの状態を (N, …) の連続配列（struct-of-arrays）で保持し、
+#   任意のセッション部分集合を1回のベクトル化ステップで進める。
+#   数値カーネルはスカラー版と共有しているため、各セッションの結果は
+#   AnomalyTrackerV9 をターンごとに回した場合とビット単位で一致する。
+#
+# 状態の対応（スカラー版 → エンジン）:
+#   predictor._calib_sum / _calib_count → calib_sum / calib_count
+#   predictor.anchor        → anchor[i]
+#   predictor.integrals     → integrals[i]
+#   predictor.clock         → clock[i]
+#   sigma_res / _sigma_frozen → sigma_res[i] + frozen[i]（固定後は同一行列）
+#   _whiten                 → whiten[i]
+#   a_anom / _consecutive_hits → a_anom[i] / consecutive_hits[i]
+
+import numpy as np
+from dataclasses import dataclass
+
+if __package__:
+    from .anomaly_tracker_v9 import (
+        FATIGUE_DECAY, ROUTE_FAST, ROUTE_NONE, ROUTE_SLOW,
+        SemanticContextExtractor,
+        ewma_outer, gram_row, raw_threshold,
+        solve_distance_sq, whitened_distance_sq, woodbury_distance_sq,
+    )
+else:
+    from anomaly_tracker_v9 import (
+        FATIGUE_DECAY, ROUTE_FAST, ROUTE_NONE, ROUTE_SLOW,
+        SemanticContextExtractor,
+        ewma_outer, gram_row, raw_threshold,
+        solve_distance_sq, whitened_distance_sq, woodbury_distance_sq,
+    )
+
+
+@dataclass
+class EngineStepResult:
+    """
+    step() の結果。各配列は引数 idx の順に並ぶ（丸めなし）。
+    キャリブレーション中のセッションは a_anom=0, raw_distance=0, residual=0。
+    """
+    sessions: np.ndarray       # (n,)  セッション番号
+    a_anom: np.ndarray         # (n,)
+    raw_distance: np.ndarray   # (n,)
+    d_hat: np.ndarray          # (n, d)
+    residual: np.ndarray       # (n, d)
+    detected: np.ndarray       # (n,)  bool
+    route: np.ndarray          # (n,)  ROUTE_* コード
+    calibrating: np.ndarray    # (n,)  bool
+
+
+class AnomalyTrackerEngine:
+    """
+    AnomalyTrackerV9 のバッチ版（N セッション分の状態を配列で保持）。
+
+    使い方:
+        engine = AnomalyTrackerEngine(n_sessions=100_000)
+        res = engine.step(idx, d_obs, texts)   # idx: 今ティックに発話したセッション
+
+    コンストラクタ引数は AnomalyTrackerV9 と同一。
+    """
+
+    def __init__(
+        self,
+        n_sessions,
+        dims=4,
+        calib_turns=10,
+        n_stable=15,
+        tau=0.2,
+        theta_anom=2.0,
+        fp_tolerance=0.001,
+        n_consecutive=2,
+        eta=0.1,
+        sigma_floor=0.05,
+        g0=0.4,
+        alpha=1.0,
+        fatigue_c=0.007
+    ):
+        self.n_sessions = n_sessions
+        self.dims = dims
+        self.calib_turns = calib_turns
+        self.n_stable = n_stable
+        self.tau = tau
+        self.theta_anom = theta_anom
+        self.theta_raw = raw_threshold(dims, fp_tolerance)
+        self.n_consecutive = n_consecutive
+        self.eta = eta
+        self.noise_floor = (sigma_floor ** 2) * np.eye(dims)
+        self.g0 = g0
+        self.alpha = alpha
+        self.c = fatigue_c
+        self.decay = FATIGUE_DECAY     # AnchorFatiguePredictor の既定値
+        self.extractor = SemanticContextExtractor()
+
+        self._window_cap = min(n_stable, dims)
+        self._latent_buf = np.zeros((n_sessions, 4))
+        self._allocate(n_sessions)
+
+    def _allocate(self, n):
+        d, cap = self.dims, self._window_cap
+        self.turn = np.zeros(n, dtype=np.int64)
+        # AnchorFatiguePredictor
+        self.calib_sum = np.zeros((n, d))
+        self.calib_count = np.zeros(n, dtype=np.int64)
+        self.calib_done = np.zeros(n, dtype=bool)
+        self.anchor = np.zeros((n, d))
+        self.integrals = np.zeros((n, d))
+        self.clock = np.zeros(n)
+        # sigma_res（学習期 / 固定後）
+        self.sigma_res = np.tile(self.noise_floor, (n, 1, 1))
+        self.frozen = np.zeros(n, dtype=bool)
+        self.whiten = np.zeros((n, d, d))
+        self.stable_count = np.zeros(n, dtype=np.int64)
+        self.window = np.zeros((n, d, cap))
+        self.window_w = np.zeros((n, cap))
+        self.window_gram = np.zeros((n, cap, cap))
+        self.floor_scale = np.full(n, 2.0 * self.noise_floor[0, 0])
+        # Dual-Route
+        self.a_anom = np.zeros(n)
+        self.consecutive_hits = np.zeros(n, dtype=np.int64)
+
+    def reset(self, idx):
+        """指定セッションを初期状態に戻す（セッション枠の再利用）。"""
+        idx = np.asarray(idx, dtype=np.intp)
+        self.turn[idx] = 0
+        self.calib_sum[idx] = 0.0
+        self.calib_count[idx] = 0
+        self.calib_done[idx] = False
+        self.anchor[idx] = 0.0
+        self.integrals[idx] = 0.0
+        self.clock[idx] = 0.0
+        self.sigma_res[idx] = self.noise_floor
+        self.frozen[idx] = False
+        self.whiten[idx] = 0.0
+        self.stable_count[idx] = 0
+        self.window[idx] = 0.0
+        self.window_w[idx] = 0.0
+        self.window_gram[idx] = 0.0
+        self.floor_scale[idx] = 2.0 * self.noise_floor[0, 0]
+        self.a_anom[idx] = 0.0
+        self.consecutive_hits[idx] = 0
+
+    # ------------------------------------------------------------------
+    # 1ティック
+    # ------------------------------------------------------------------
+
+    def _elapsed(self, idx, now) -> np.ndarray:
+        elapsed = np.broadcast_to(np.asarray(now, dtype=float),
+                                  idx.shape) - self.clock[idx]
+        if not np.all(elapsed >= 0.0):
+            raise ValueError("Time went backwards for some sessions.")
+        return elapsed
+
+    def integrals_at(self, idx, now) -> np.ndarray:
+        """
+        時刻 now まで発話がなかった場合の疲労積分 (n, 4)（状態は変えない）。
+        休止中のセッションを1ターンずつ回さずに読むために使う。
+        """
+        idx = np.asarray(idx, dtype=np.intp).reshape(-1)
+        elapsed = self._elapsed(idx, now)
+        return self.integrals[idx] * (self.decay ** elapsed)[:, None]
+
+    def advance(self, idx, now):
+        """指定セッションを発話なしで時刻 now まで進める（AnchorFatiguePredictor.advance 相当）。"""
+        idx = np.asarray(idx, dtype=np.intp).reshape(-1)
+        self.integrals[idx] = self.integrals_at(idx, now)
+        self.clock[idx] = now
+
+    def step(self, idx, d_obs, texts=None, d_latent=None,
+             now=None) -> EngineStepResult:
+        """
+        指定セッションを1ターン進める（AnomalyTrackerV9.update 相当）。
+
+        Args:
+            idx: (n,) セッション番号（重複不可）
+            d_obs: (n, d) 観測Pain Vector
+            texts: n件のユーザー発話（d_latent を渡す場合は不要）
+            d_latent: (n, 4) 抽出済みの事実コンテキスト（省略時は texts から抽出）
+            now: スカラーまたは (n,) のターン時刻。省略時は各セッション1ターン進める
+        """
+        idx = np.asarray(idx, dtype=np.intp).reshape(-1)
+        n = len(idx)
+        if np.unique(idx).size != n:
+            raise ValueError("Session indices must be unique within a step.")
+        d_obs = np.asarray(d_obs, dtype=float).reshape(n, self.dims)
+        if d_latent is None:
+            if texts is None:
+                texts = [""] * n
+            d_latent = self.extractor.extract_many(texts, out=self._latent_buf[:n])
+
+        self.turn[idx] += 1
+
+        # --- AnchorFatiguePredictor.update ---
+        pending = ~self.calib_done[idx]
+        if pending.any():
+            ci = idx[pending]
+            self.calib_sum[ci] += d_obs[pending]
+            self.calib_count[ci] += 1
+            ready = ci[self.calib_count[ci] >= self.calib_turns]
+            self.anchor[ready] = (
+                self.calib_sum[ready] / self.calib_count[ready][:, None]
+            )
+            self.calib_done[ready] = True
+
+        if now is None:
+            integrals = self.integrals[idx] * self.decay + d_latent
+            self.clock[idx] += 1.0
+        else:
+            elapsed = self._elapsed(idx, now)
+            integrals = (self.integrals[idx] * (self.decay ** elapsed)[:, None]
+                         + d_latent)
+            self.clock[idx] = now
+        self.integrals[idx] = integrals
+        d_hat = np.clip(self.anchor[idx] + self.c * integrals, 0.0, 1.0)
+
+        a_out = np.zeros(n)
+        raw_out = np.zeros(n)
+        residual_out = np.zeros((n, self.dims))
+        detected_out = np.zeros(n, dtype=bool)
+        route_out = np.full(n, ROUTE_NONE, dtype=np.int8)
+
+        active = self.calib_done[idx]
+        if active.any():
+            ai = idx[active]
+            residual = d_obs[active] - d_hat[active]
+            self._update_or_freeze_sigma(ai, residual)
+            raw = self._mahalanobis(ai, residual)
+
+            # --- Dual-Route ---
+            a = (1 - self.tau) * self.a_anom[ai] + self.tau * raw
+            slow = a > self.theta_anom
+            hits = np.where(raw > self.theta_raw, self.consecutive_hits[ai] + 1, 0)
+            self.consecutive_hits[ai] = hits
+            fast = hits >= self.n_consecutive
+            a = np.where(fast, np.maximum(a, self.theta_anom * 1.2), a)
+            self.a_anom[ai] = a
+
+            a_out[active] = a
+            raw_out[active] = raw
+            residual_out[active] = residual
+            detected_out[active] = slow | fast
+            route_out[active] = np.where(
+                fast, ROUTE_FAST, np.where(slow, ROUTE_SLOW, ROUTE_NONE)
+            )
+
+        return EngineStepResult(
+            sessions=idx, a_anom=a_out, raw_distance=raw_out,
+            d_hat=d_hat, residual=residual_out, detected=detected_out,
+            route=route_out, calibrating=~active
+        )
+
+    def _update_or_freeze_sigma(self, ai, residual):
+        learning = ~self.frozen[ai]
+        if not learning.any():
+            return
+        li = ai[learning]
+        lr = residual[learning]
+        self.sigma_res[li] = ewma_outer(self.sigma_res[li], lr, self.eta)
+
+        # 低ランク表現への追加（同じ列番号jのセッションをまとめて処理）
+        k = self.stable_count[li]
+        for j in np.unique(k[k < self._window_cap]):
+            sel = k == j
+            si = li[sel]
+            self.window[si, :, j] = lr[sel]
+            u = gram_row(self.window[si, :, :j + 1], lr[sel])
+            self.window_gram[si, j, :j + 1] = u
+            self.window_gram[si, :j + 1, j] = u
+            self.window_w[si, :j] *= (1 - self.eta)
+            self.window_w[si, j] = self.eta
+            self.floor_scale[si] = ((1 - self.eta) * self.floor_scale[si]
+                                    + self.eta * self.noise_floor[0, 0])
+
+        self.stable_count[li] += 1
+        fz = li[self.stable_count[li] >= self.n_stable]
+        if len(fz):
+            self.frozen[fz] = True
+            chol = np.linalg.cholesky(self.sigma_res[fz] + self.noise_floor)
+            self.whiten[fz] = np.linalg.inv(chol)
+
+    def _mahalanobis(self, ai, residual):
+        dist_sq = np.empty(len(ai))
+        frozen = self.frozen[ai]
+        if frozen.any():
+            dist_sq[frozen] = whitened_distance_sq(
+                self.whiten[ai[frozen]], residual[frozen]
+            )
+        k = self.stable_count[ai]
+        low = ~frozen & (k < self.dims)
+        for kk in np.unique(k[low]):
+            sel = low & (k == kk)
+            si = ai[sel]
+            dist_sq[sel] = woodbury_distance_sq(
+                self.window_gram[si, :kk, :kk], self.window_w[si, :kk],
+                self.floor_scale[si]
+            )
+        direct = ~frozen & ~low
+        if direct.any():
+            dist_sq[direct] = solve_distance_sq(
+                self.sigma_res[ai[direct]] + self.noise_floor, residual[direct]
+            )
+        return np.sqrt(np.maximum(dist_sq, 0.0))
+
+    def calculate_g_min(self, idx=None) -> np.ndarray:
+        """AnomalyTrackerV9.calculate_g_min のバッチ版"""
+        a = self.a_anom if idx is None else self.a_anom[np.asarray(idx)]
+        fraction = a / (a + self.alpha)
+        return self.g0 + (1 - self.g0) * fraction
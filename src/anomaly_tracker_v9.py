@@ -20,10 +20,27 @@
 #   N_stable   = 15   （sigma_res固定までのターン数）
 
 import numpy as np
-from scipy import stats
+import copy
 from dataclasses import dataclass
 from enum import Enum
 
+if __package__:
+    from .chi2_table import chi2_ppf
+    from .history_buffer import make_history
+    from .lexicon_matcher import shared_matcher
+    from .snapshot import (
+        KIND_PREDICTOR, KIND_TRACKER, SnapshotReader, SnapshotWriter,
+        apply_state, expect_shape,
+    )
+else:
+    from chi2_table import chi2_ppf
+    from history_buffer import make_history
+    from lexicon_matcher import shared_matcher
+    from snapshot import (
+        KIND_PREDICTOR, KIND_TRACKER, SnapshotReader, SnapshotWriter,
+        apply_state, expect_shape,
+    )
+
 
 class AnomalyRoute(Enum):
     NONE = "none"
@@ -31,6 +48,18 @@ class AnomalyRoute(Enum):
     FAST_PATH = "fast_path"
 
 
+# 配列で経路を扱う場合（バッチエンジン・履歴）の整数コード
+ROUTE_NONE, ROUTE_SLOW, ROUTE_FAST = 0, 1, 2
+ROUTE_BY_CODE = (AnomalyRoute.NONE, AnomalyRoute.SLOW_PATH, AnomalyRoute.FAST_PATH)
+
+# history_capacity 指定時のレコード型
+HISTORY_FIELDS = [
+    ("turn", np.int64), ("a_anom", np.float64), ("raw_dist", np.float64),
+    ("detected", np.bool_), ("route", np.int8),
+]
+HISTORY_ENUMS = {"route": tuple(r.value for r in ROUTE_BY_CODE)}
+
+
 @dataclass
 class AnomalyResult:
     a_anom: float
@@ -44,6 +73,155 @@ class AnomalyResult:
     message: str
 
 
+@dataclass
+class ReplayResult:
+    """replay() の結果。各配列は長さT（丸めなし、キャリブレーション中は0）。"""
+    a_anom: np.ndarray
+    raw_distance: np.ndarray
+    route: np.ndarray          # ROUTE_* コード
+    detected: np.ndarray
+
+
+def anomaly_message(route: AnomalyRoute, a_anom: float, theta_anom: float,
+                    consecutive_hits: int, sigma_frozen: bool,
+                    stable_count: int) -> str:
+    frozen = "固定済" if sigma_frozen else f"学習中({stable_count})"
+    if route is AnomalyRoute.FAST_PATH:
+        return f"[FAST] {consecutive_hits}連続超過。偽装検知。Sigma:{frozen}"
+    if route is AnomalyRoute.SLOW_PATH:
+        return f"[SLOW] A_anom={a_anom:.3f}>{theta_anom}。Sigma:{frozen}"
+    return f"正常。Sigma:{frozen}"
+
+
+class LazyAnomalyResult:
+    """
+    AnomalyResult の遅延版（AnomalyTrackerV9(lazy_result=True) が返す）。
+
+    生の数値・配列への参照だけを保持し、丸めたリストとメッセージは
+    属性にアクセスされた時点で組み立てる。
+    detected / route しか読まない呼び出し側では、整形コストがかからない。
+    属性名と値は AnomalyResult と同一。
+    """
+    __slots__ = ("_a_anom", "_raw_distance", "_d_hat", "_residual",
+                 "_anchor", "_integral", "detected", "route", "_message_args")
+
+    def __init__(self, a_anom, raw_distance, d_hat, residual, anchor,
+                 integral, detected, route, message_args):
+        self._a_anom = a_anom
+        self._raw_distance = raw_distance
+        self._d_hat = d_hat
+        self._residual = residual        # キャリブレーション中は None
+        self._anchor = anchor
+        self._integral = integral
+        self.detected = detected
+        self.route = route
+        self._message_args = message_args
+
+    @property
+    def a_anom(self) -> float:
+        return round(self._a_anom, 4)
+
+    @property
+    def raw_distance(self) -> float:
+        return round(self._raw_distance, 4)
+
+    @property
+    def d_hat(self) -> list:
+        return self._d_hat.round(3).tolist()
+
+    @property
+    def residual(self) -> list:
+        if self._residual is None:
+            return [0.0] * len(self._d_hat)
+        return self._residual.round(3).tolist()
+
+    @property
+    def anchor(self) -> list:
+        return self._anchor.round(3).tolist()
+
+    @property
+    def integral(self) -> list:
+        return self._integral.round(1).tolist()
+
+    @property
+    def message(self) -> str:
+        if self._residual is None:
+            turn, calib_turns = self._message_args
+            return f"キャリブレーション中 ({turn}/{calib_turns})"
+        return anomaly_message(self.route, *self._message_args)
+
+    def to_result(self) -> AnomalyResult:
+        """通常の AnomalyResult（全フィールド整形済み）に変換する。"""
+        return AnomalyResult(
+            a_anom=self.a_anom, raw_distance=self.raw_distance,
+            d_hat=self.d_hat, residual=self.residual, anchor=self.anchor,
+            integral=self.integral, detected=self.detected,
+            route=self.route, message=self.message
+        )
+
+
+# ---------------------------------------------------------------------------
+# 数値カーネル
+#   スカラー版 AnomalyTrackerV9 とバッチ版 AnomalyTrackerEngine が共有する。
+#   先頭にバッチ次元 (...) を持てる形で書き、内積は BLAS ではなく
+#   要素積 + sum で取る（どちらの経路でも加算順序が同じ＝結果がビット一致）。
+# ---------------------------------------------------------------------------
+
+def ewma_outer(sigma: np.ndarray, residual: np.ndarray, eta: float) -> np.ndarray:
+    """(1-η)Σ + η r r^T"""
+    outer = residual[..., :, None] * residual[..., None, :]
+    return (1 - eta) * sigma + eta * outer
+
+
+def gram_row(columns: np.ndarray, residual: np.ndarray) -> np.ndarray:
+    """R^T r（columns: (..., d, k)）"""
+    return (columns * residual[..., :, None]).sum(axis=-2)
+
+
+def whitened_distance_sq(whiten: np.ndarray, residual: np.ndarray) -> np.ndarray:
+    """||L^-1 r||^2 = r^T Σ_eff^-1 r（whiten = L^-1）"""
+    z = (whiten * residual[..., None, :]).sum(axis=-1)
+    return (z * z).sum(axis=-1)
+
+
+def solve_distance_sq(sigma_eff: np.ndarray, residual: np.ndarray) -> np.ndarray:
+    """r^T Σ_eff^-1 r（逆行列を作らず線形方程式として解く）"""
+    x = np.linalg.solve(sigma_eff, residual[..., None])[..., 0]
+    return (residual * x).sum(axis=-1)
+
+
+def woodbury_distance_sq(gram: np.ndarray, weights: np.ndarray,
+                         floor_scale) -> np.ndarray:
+    """
+    最新の残差 r（Rの最終列）に対する r^T Σ_eff^-1 r（Woodbury恒等式）。
+
+        Σ_eff = c·I + R diag(w) R^T
+        Σ_eff^-1 = (1/c)[I - R (c·diag(1/w) + R^T R)^-1 R^T]
+
+    Args:
+        gram: R^T R, (..., k, k)
+        weights: w, (..., k)
+        floor_scale: c, (...)
+    """
+    k = gram.shape[-1]
+    floor_scale = np.asarray(floor_scale)
+    u = gram[..., k - 1, :]                  # R^T r
+    capacitance = gram.copy()
+    diag = np.arange(k)
+    capacitance[..., diag, diag] += floor_scale[..., None] / weights
+    x = np.linalg.solve(capacitance, u[..., None])[..., 0]
+    return (u[..., k - 1] - (u * x).sum(axis=-1)) / floor_scale
+
+
+def raw_threshold(dims: int, fp_tolerance: float) -> float:
+    """
+    Fast Path閾値 theta_raw = sqrt(chi2.ppf(1 - fp_tolerance, df=dims))
+    よく使う組み合わせは事前計算表から引く（SciPy は表に無い場合のみ読み込む）。
+    """
+    chi2_crit = chi2_ppf(1 - fp_tolerance, dims)
+    return float(np.sqrt(chi2_crit))
+
+
 class SemanticContextExtractor:
     FACT_CONTEXT = {
         0: {"一人": 0.4, "孤立": 0.5, "誰も": 0.5, "眠れない": 0.6,
@@ -57,44 +235,203 @@ class SemanticContextExtractor:
             "諦め": 0.6, "もう無理": 0.7, "時間がない": 0.4, "できない": 0.4}
     }
 
+    def __init__(self):
+        # 全キーワードを1回の走査で照合（Aho-Corasick、スコアは従来と同一）
+        self._matcher = shared_matcher(self.FACT_CONTEXT, dims=4)
+
     def extract(self, user_text: str) -> np.ndarray:
-        d_latent = np.zeros(4)
-        for dim, facts in self.FACT_CONTEXT.items():
-            for word, weight in facts.items():
-                if word in user_text:
-                    d_latent[dim] += weight
+        d_latent = self._matcher.score(user_text)
         return np.clip(d_latent, 0.0, 1.0)
 
+    def extract_many(self, texts, out: np.ndarray = None) -> np.ndarray:
+        """
+        バッチ版 extract。結果を (N, 4) 配列に書き込み、その場で [0, 1] にクリップする。
+        リプレイ・監査など大量のテキストを一括でスコアリングする用途。
+
+        Args:
+            texts: テキストのイテラブル
+            out: 書き込み先の (N, 4) float配列（省略時は新規確保）
+        """
+        out = self._matcher.score_many(texts, out)
+        return np.clip(out, 0.0, 1.0, out=out)
+
+
+FATIGUE_DECAY = 0.998    # 疲労積分の1ターンあたりの減衰（AnchorFatiguePredictor の既定値）
+
 
 class AnchorFatiguePredictor:
-    def __init__(self, calib_turns=10, c=0.007, decay=0.998):
+    """
+    アンカー（キャリブレーション期間の d_obs 平均）と疲労積分による予測。
+
+    キャリブレーション観測は保持せず、和と件数（平均 = 和 / 件数 は
+    np.mean と同じ順序の加算なのでビット一致）と、診断用の
+    Welford 法による平均・二乗偏差和だけを持つ（O(1) メモリ）。
+
+    疲労積分は clock（最後に積分を更新した時刻、単位はターン）付きで持つ。
+    発話の間が空いたセッションは、次に触れたときに decay**Δ を1回かけて
+    追いつかせる（1ターンずつ回す必要がなく、空白の長さによらず O(1)）。
+    """
+
+    def __init__(self, calib_turns=10, c=0.007, decay=FATIGUE_DECAY):
         self.calib_turns = calib_turns
         self.c = c
         self.decay = decay
         self.extractor = SemanticContextExtractor()
-        self._calib_obs = []
+        self._calib_count = 0
+        self._calib_sum = np.zeros(4)
+        self._calib_mean = np.zeros(4)     # Welford（分散の計算用）
+        self._calib_m2 = np.zeros(4)
         self._calib_done = False
         self.anchor = np.zeros(4)
         self.integrals = np.zeros(4)
+        self.clock = 0.0
 
     @property
     def calibration_done(self):
         return self._calib_done
 
-    def update(self, d_obs: np.ndarray, user_text: str):
+    @property
+    def calibration_count(self) -> int:
+        return self._calib_count
+
+    def calibration_mean(self) -> np.ndarray:
+        """これまでのキャリブレーション観測の平均（完了後は anchor と同一）"""
+        if self._calib_count == 0:
+            return np.zeros(4)
+        return self._calib_sum / self._calib_count
+
+    def calibration_variance(self, ddof=0) -> np.ndarray:
+        """キャリブレーション観測の次元ごとの分散（診断用）"""
+        n = self._calib_count - ddof
+        if n <= 0:
+            return np.full(4, np.nan)
+        return self._calib_m2 / n
+
+    @staticmethod
+    def _welford(count, total, mean, m2, d_obs):
+        """観測1件を加えた (件数, 和, 平均, 二乗偏差和)"""
+        n = count + 1
+        delta = d_obs - mean
+        mean = mean + delta / n
+        return n, total + d_obs, mean, m2 + delta * (d_obs - mean)
+
+    def _observe(self, d_obs: np.ndarray):
+        (self._calib_count, self._calib_sum, self._calib_mean,
+         self._calib_m2) = self._welford(
+            self._calib_count, self._calib_sum, self._calib_mean,
+            self._calib_m2, d_obs
+        )
+
+    def _elapsed(self, now) -> float:
+        elapsed = float(now) - self.clock
+        if not elapsed >= 0.0:
+            raise ValueError(
+                f"Time went backwards: now={now}, clock={self.clock}"
+            )
+        return elapsed
+
+    def integrals_at(self, now) -> np.ndarray:
+        """時刻 now まで発話がなかった場合の疲労積分（常に新しい配列。状態は変えない）"""
+        elapsed = self._elapsed(now)
+        if elapsed == 0.0:
+            return self.integrals.copy()
+        # np.power: AnomalyTrackerEngine の配列版とビット一致させる
+        return self.integrals * np.power(self.decay, elapsed)
+
+    def advance(self, now):
+        """発話なしで時刻 now まで進める（空白期間の減衰を1回で適用）。"""
+        self.integrals = self.integrals_at(now)
+        self.clock = float(now)
+
+    def update(self, d_obs: np.ndarray, user_text: str, d_latent=None,
+               now=None):
+        """
+        Args:
+            d_latent: 抽出済みの事実コンテキスト（指定時は user_text を走査しない）
+            now: このターンの時刻（ターン単位、実数可）。
+                 省略時は前回から1ターン後として従来どおり decay を1回かける。
+                 指定時は decay**(now - clock) をかける（1ターンずつ回した値とは
+                 丸め誤差の範囲で一致）。
+        """
         if not self._calib_done:
-            self._calib_obs.append(d_obs.copy())
-            if len(self._calib_obs) >= self.calib_turns:
-                self.anchor = np.mean(self._calib_obs, axis=0)
+            self._observe(d_obs)
+            if self._calib_count >= self.calib_turns:
+                self.anchor = self._calib_sum / self._calib_count
                 self._calib_done = True
 
-        d_latent = self.extractor.extract(user_text)
-        self.integrals = self.integrals * self.decay + d_latent
+        if d_latent is None:
+            d_latent = self.extractor.extract(user_text)
+        if now is None:
+            self.integrals = self.integrals * self.decay + d_latent
+            self.clock += 1.0
+        else:
+            elapsed = self._elapsed(now)
+            self.integrals = (self.integrals * np.power(self.decay, elapsed)
+                              + d_latent)
+            self.clock = float(now)
         d_hat = np.clip(self.anchor + self.c * self.integrals, 0.0, 1.0)
         return d_hat, d_latent
 
     def partial_reset(self, rho=0.3):
-        self.integrals *= (1 - rho)
+        # インプレース更新はしない（LazyAnomalyResult が旧配列を参照しているため）
+        self.integrals = self.integrals * (1 - rho)
+
+    def snapshot(self) -> bytes:
+        """キャリブレーション統計・アンカー・疲労積分のバイナリスナップショット"""
+        return (SnapshotWriter(KIND_PREDICTOR)
+                .int(self._calib_count).array(self._calib_sum)
+                .array(self._calib_mean).array(self._calib_m2)
+                .flag(self._calib_done)
+                .array(self.anchor).array(self.integrals)
+                .float(self.clock)
+                .getvalue())
+
+    def restore(self, data):
+        """
+        snapshot() の出力で状態を上書きする（version 1 の観測列形式も読める）。
+        clock を持たない version 2 以前は clock=0 として復元する。
+        """
+        self._apply(self._parse(data))
+
+    def _parse(self, data) -> dict:
+        """スナップショットを検証し、代入する属性値を返す（状態は変えない）。"""
+        r = SnapshotReader(data, KIND_PREDICTOR)
+        if r.version == 1:
+            obs = r.array()
+            if obs.ndim != 2 or obs.shape[1] != 4:
+                raise ValueError(
+                    f"Invalid calibration observations: {obs.shape}"
+                )
+        else:
+            count = r.int()
+            calib_sum = expect_shape("calib_sum", r.array(), (4,))
+            calib_mean = expect_shape("calib_mean", r.array(), (4,))
+            calib_m2 = expect_shape("calib_m2", r.array(), (4,))
+            if count < 0:
+                raise ValueError(f"Invalid calibration count: {count}")
+        calib_done = r.flag()
+        anchor = expect_shape("anchor", r.array(), (4,))
+        integrals = expect_shape("integrals", r.array(), (4,))
+        clock = r.float() if r.version >= 3 else 0.0
+        r.done()
+
+        if r.version == 1:
+            # 観測列を先頭から流し直して統計を作る（np.mean と同じ加算順）
+            count, calib_sum, calib_mean, calib_m2 = (
+                0, np.zeros(4), np.zeros(4), np.zeros(4)
+            )
+            for row in obs:
+                count, calib_sum, calib_mean, calib_m2 = self._welford(
+                    count, calib_sum, calib_mean, calib_m2, row
+                )
+        return {
+            "_calib_count": count, "_calib_sum": calib_sum,
+            "_calib_mean": calib_mean, "_calib_m2": calib_m2,
+            "_calib_done": calib_done, "anchor": anchor,
+            "integrals": integrals, "clock": clock,
+        }
+
+    _apply = apply_state
 
 
 class AnomalyTrackerV9:
@@ -123,23 +460,24 @@ class AnomalyTrackerV9:
         sigma_floor=0.05,
         g0=0.4,
         alpha=1.0,
-        fatigue_c=0.007
+        fatigue_c=0.007,
+        lazy_result=False,     # True: update() が LazyAnomalyResult を返す
+        history_capacity=None, # 指定時: 固定容量のリングバッファ
+        history_spill=None     # 溢れた履歴の追記先ファイル
     ):
         self.dims = dims
         self.tau = tau
         self.theta_anom = theta_anom
 
-        chi2_crit = stats.chi2.ppf(1 - fp_tolerance, df=dims)
-        self.theta_raw = float(np.sqrt(chi2_crit))
+        self.theta_raw = raw_threshold(dims, fp_tolerance)
         self.n_consecutive = n_consecutive
         self._consecutive_hits = 0
 
         self.eta = eta
         self.noise_floor = (sigma_floor ** 2) * np.eye(dims)
-        self.sigma_res = self.noise_floor.copy()
-        self._sigma_frozen = None
-        self._stable_count = 0
         self.n_stable = n_stable
+        self._window_cap = min(n_stable, dims)
+        self._reset_sigma()
 
         self.a_anom = 0.0
         self.g0 = g0
@@ -147,8 +485,29 @@ class AnomalyTrackerV9:
         self.predictor = AnchorFatiguePredictor(
             calib_turns=calib_turns, c=fatigue_c
         )
-        self.history = []
+        self.history = make_history(
+            HISTORY_FIELDS, history_capacity, history_spill,
+            enums=HISTORY_ENUMS
+        )
         self.turn = 0
+        self.lazy_result = lazy_result
+
+    def _reset_sigma(self):
+        self.sigma_res = self.noise_floor.copy()
+        self._sigma_frozen = None
+        self._whiten = None    # 固定後の白色化行列 L^-1（Σ_eff = L L^T）
+        self._stable_count = 0
+
+        # 学習期の低ランク表現（Woodbury）:
+        #   Σ_eff = c·I + R diag(w) R^T
+        #   R: 学習期の残差列, w: EWMA重み, c: ノイズフロアの等方成分
+        # k < dims の間は k×k の小さな系を解くだけで距離が求まり、
+        # d×d の逆行列・分解は不要。k >= dims では直接解く方が安い。
+        cap = self._window_cap
+        self._window = np.zeros((self.dims, cap))
+        self._window_w = np.zeros(cap)
+        self._window_gram = np.zeros((cap, cap))
+        self._floor_scale = 2.0 * self.noise_floor[0, 0]
 
     def _get_sigma_eff(self):
         if self._sigma_frozen is not None:
@@ -158,25 +517,73 @@ class AnomalyTrackerV9:
     def _update_or_freeze_sigma(self, residual: np.ndarray):
         if self._sigma_frozen is not None:
             return  # 固定済み
-        r = residual.reshape(-1, 1)
-        self.sigma_res = (1 - self.eta) * self.sigma_res + self.eta * (r @ r.T)
+        self.sigma_res = ewma_outer(self.sigma_res, residual, self.eta)
+        if self._stable_count < self._window_cap:
+            self._push_window(residual)
         self._stable_count += 1
         if self._stable_count >= self.n_stable:
             self._sigma_frozen = self.sigma_res.copy()
+            self._window = self._window_w = self._window_gram = None
+            # 固定後のSigmaは二度と変わらないので、Cholesky分解を一度だけ行い
+            # 白色化行列をキャッシュする（以後の毎ターンは行列ベクトル積1回）
+            chol = np.linalg.cholesky(self._get_sigma_eff())
+            self._whiten = np.linalg.inv(chol)
+
+    def _push_window(self, residual: np.ndarray):
+        """
+        学習期の残差を低ランク表現に追加する（O(d·k)）。
+
+        EWMA更新 (1-η)S + η r r^T に対して:
+            w ← (1-η)w,  w_new = η
+            c ← (1-η)c + η·σ_floor²   （ノイズフロア分は等方のまま）
+        グラム行列 R^T R は新しい列との内積を1回足すだけで、再計算しない。
+        """
+        j = self._stable_count
+        self._window[:, j] = residual
+        u = gram_row(self._window[:, :j + 1], residual)
+        self._window_gram[j, :j + 1] = u
+        self._window_gram[:j + 1, j] = u
+        self._window_w[:j] *= (1 - self.eta)
+        self._window_w[j] = self.eta
+        self._floor_scale = ((1 - self.eta) * self._floor_scale
+                             + self.eta * self.noise_floor[0, 0])
 
     def _mahalanobis(self, residual: np.ndarray) -> float:
-        sigma_eff = self._get_sigma_eff()
-        sigma_inv = np.linalg.inv(sigma_eff)
-        r = residual.reshape(-1, 1)
-        dist_sq = float((r.T @ sigma_inv @ r).squeeze())
-        return float(np.sqrt(max(dist_sq, 0.0)))
-
-    def update(self, d_obs, user_text="") -> AnomalyResult:
+        if self._whiten is not None:
+            # 固定済み: キャッシュ済み白色化行列で行列ベクトル積1回
+            dist_sq = whitened_distance_sq(self._whiten, residual)
+        elif self._stable_count < self.dims:
+            # 学習期（k < d）: Woodburyで k×k の系のみ
+            k = self._stable_count
+            dist_sq = woodbury_distance_sq(
+                self._window_gram[:k, :k], self._window_w[:k], self._floor_scale
+            )
+        else:
+            # 学習期（k >= d）: 逆行列を作らず線形方程式として解く
+            dist_sq = solve_distance_sq(self._get_sigma_eff(), residual)
+        return float(np.sqrt(max(float(dist_sq), 0.0)))
+
+    def update(self, d_obs, user_text="", d_latent=None,
+               now=None) -> AnomalyResult:
+        """
+        Args:
+            d_obs: 観測Pain Vector
+            user_text: ユーザー発話
+            d_latent: 抽出済みの事実コンテキスト（TurnPipeline が共有走査で渡す）
+            now: ターンの時刻（AnchorFatiguePredictor.update を参照）
+        """
         self.turn += 1
         d_obs = np.array(d_obs, dtype=float)
-        d_hat, d_latent = self.predictor.update(d_obs, user_text)
+        d_hat, d_latent = self.predictor.update(d_obs, user_text, d_latent,
+                                                now)
 
         if not self.predictor.calibration_done:
+            if self.lazy_result:
+                return LazyAnomalyResult(
+                    0.0, 0.0, d_hat, None, self.predictor.anchor,
+                    self.predictor.integrals, False, AnomalyRoute.NONE,
+                    (self.turn, self.predictor.calib_turns)
+                )
             return AnomalyResult(
                 a_anom=0.0, raw_distance=0.0,
                 d_hat=d_hat.round(3).tolist(),
@@ -211,30 +618,185 @@ class AnomalyTrackerV9:
         else:
             route = AnomalyRoute.NONE
 
-        frozen = "固定済" if self._sigma_frozen is not None else f"学習中({self._stable_count})"
-        if fast_detected:
-            msg = f"[FAST] {self._consecutive_hits}連続超過。偽装検知。Sigma:{frozen}"
-        elif slow_detected:
-            msg = f"[SLOW] A_anom={self.a_anom:.3f}>{self.theta_anom}。Sigma:{frozen}"
+        message_args = (self.a_anom, self.theta_anom, self._consecutive_hits,
+                        self._sigma_frozen is not None, self._stable_count)
+        if self.lazy_result:
+            result = LazyAnomalyResult(
+                self.a_anom, raw_dist, d_hat, residual, self.predictor.anchor,
+                self.predictor.integrals, detected, route, message_args
+            )
         else:
-            msg = f"正常。Sigma:{frozen}"
-
-        result = AnomalyResult(
-            a_anom=round(self.a_anom, 4),
-            raw_distance=round(raw_dist, 4),
-            d_hat=d_hat.round(3).tolist(),
-            residual=residual.round(3).tolist(),
-            anchor=self.predictor.anchor.round(3).tolist(),
-            integral=self.predictor.integrals.round(1).tolist(),
-            detected=detected, route=route, message=msg
-        )
+            result = AnomalyResult(
+                a_anom=round(self.a_anom, 4),
+                raw_distance=round(raw_dist, 4),
+                d_hat=d_hat.round(3).tolist(),
+                residual=residual.round(3).tolist(),
+                anchor=self.predictor.anchor.round(3).tolist(),
+                integral=self.predictor.integrals.round(1).tolist(),
+                detected=detected, route=route,
+                message=anomaly_message(route, *message_args)
+            )
         self.history.append({
-            "turn": self.turn, "a_anom": result.a_anom,
-            "raw_dist": result.raw_distance, "detected": detected,
+            "turn": self.turn, "a_anom": round(self.a_anom, 4),
+            "raw_dist": round(raw_dist, 4), "detected": detected,
             "route": route.value
         })
         return result
 
+    def replay(self, d_obs_matrix, texts=None, d_latent=None) -> ReplayResult:
+        """
+        会話全体（T×dims の d_obs と T件のテキスト）を新規セッションとして再生する。
+
+        update() をTターン回した場合と同一の a_anom / raw_distance / route を、
+        ターン方向にベクトル化して計算する（オフライン監査用）:
+            anchor:   キャリブレーション期間の d_obs 平均
+            疲労積分: decay の1次IIRフィルタ
+            学習期:   スカラー版と同じ手順（最長 n_stable ターン）
+            固定後:   白色化行列による一括の二次形式
+            a_anom:   tau のEWMA（Fast Path発火区間のみ max 補正込みで逐次）
+        このインスタンスの状態は変更しない。
+
+        Args:
+            d_obs_matrix: (T, dims) 観測Pain Vector
+            texts: T件のユーザー発話
+            d_latent: (T, 4) 抽出済みの事実コンテキスト（指定時は texts を使わない）
+        """
+        from scipy.signal import lfilter
+
+        d_obs = np.asarray(d_obs_matrix, dtype=float).reshape(-1, self.dims)
+        T = len(d_obs)
+        if texts is None:
+            texts = [""] * T
+        a_out = np.zeros(T)
+        raw_out = np.zeros(T)
+        route_out = np.full(T, ROUTE_NONE, dtype=np.int8)
+        detected_out = np.zeros(T, dtype=bool)
+
+        predictor = self.predictor
+        if d_latent is None:
+            latent = predictor.extractor.extract_many(texts, out=np.empty((T, 4)))
+        else:
+            latent = np.asarray(d_latent, dtype=float).reshape(T, 4)
+        n_calib = max(predictor.calib_turns, 1)
+        if T < n_calib:
+            return ReplayResult(a_out, raw_out, route_out, detected_out)
+
+        anchor = np.mean(d_obs[:n_calib], axis=0)
+        integrals = lfilter([1.0], [1.0, -predictor.decay], latent, axis=0)
+        s = n_calib - 1                      # 最初の判定ターン
+        d_hat = np.clip(anchor + predictor.c * integrals[s:], 0.0, 1.0)
+        residual = d_obs[s:] - d_hat
+        n = len(residual)
+
+        raw = np.empty(n)
+        scratch = copy.copy(self)
+        scratch._reset_sigma()
+        n_learn = min(self.n_stable, n)
+        for i in range(n_learn):
+            scratch._update_or_freeze_sigma(residual[i])
+            raw[i] = scratch._mahalanobis(residual[i])
+        if n > n_learn:
+            dist_sq = whitened_distance_sq(scratch._whiten, residual[n_learn:])
+            raw[n_learn:] = np.sqrt(np.maximum(dist_sq, 0.0))
+
+        # Fast Path: theta_raw 超過の連続数（a_anom に依存しない）
+        hit = raw > self.theta_raw
+        pos = np.arange(n)
+        run = pos - np.maximum.accumulate(np.where(hit, -1, pos))
+        fast = run >= self.n_consecutive
+
+        # a_anom: 非発火区間は一括フィルタ、発火区間は max 補正込みで逐次
+        b, a = [self.tau], [1.0, -(1 - self.tau)]
+        floor = self.theta_anom * 1.2
+        a_anom = np.empty(n)
+        start, prev = 0, 0.0
+        fast_idx = np.flatnonzero(fast)
+        for burst in np.split(fast_idx, np.flatnonzero(np.diff(fast_idx) != 1) + 1):
+            if not len(burst):
+                continue
+            if burst[0] > start:
+                seg, _ = lfilter(b, a, raw[start:burst[0]],
+                                 zi=[(1 - self.tau) * prev])
+                a_anom[start:burst[0]] = seg
+                prev = seg[-1]
+            for f in burst:
+                prev = max((1 - self.tau) * prev + self.tau * raw[f], floor)
+                a_anom[f] = prev
+            start = burst[-1] + 1
+        if start < n:
+            seg, _ = lfilter(b, a, raw[start:], zi=[(1 - self.tau) * prev])
+            a_anom[start:] = seg
+
+        slow = a_anom > self.theta_anom
+        a_out[s:] = a_anom
+        raw_out[s:] = raw
+        detected_out[s:] = slow | fast
+        route_out[s:] = np.where(
+            fast, ROUTE_FAST, np.where(slow, ROUTE_SLOW, ROUTE_NONE)
+        )
+        return ReplayResult(a_out, raw_out, route_out, detected_out)
+
+    def snapshot(self) -> bytes:
+        """
+        セッション状態のバイナリスナップショット（予測器を含む）。
+        ハイパーパラメータと history は含まない。
+        """
+        return (SnapshotWriter(KIND_TRACKER)
+                .int(self.dims).int(self.turn)
+                .float(self.a_anom).int(self._consecutive_hits)
+                .array(self.sigma_res)
+                .optional_array(self._sigma_frozen)
+                .optional_array(self._whiten)
+                .int(self._stable_count)
+                .optional_array(self._window)
+                .optional_array(self._window_w)
+                .optional_array(self._window_gram)
+                .float(self._floor_scale)
+                .blob(self.predictor.snapshot())
+                .getvalue())
+
+    def restore(self, data):
+        """
+        snapshot() の出力で状態を上書きする。
+        同じ dims / n_stable で生成したインスタンスに対して呼ぶこと。
+        """
+        self._apply(self._parse(data))
+
+    def _parse(self, data) -> dict:
+        """スナップショット（予測器を含む）を検証し、代入する値を返す。"""
+        d, cap = self.dims, self._window_cap
+        r = SnapshotReader(data, KIND_TRACKER)
+        dims = r.int()
+        if dims != d:
+            raise ValueError(f"Snapshot dims {dims} != tracker dims {d}.")
+        turn = r.int()
+        a_anom = r.float()
+        hits = r.int()
+        sigma_res = expect_shape("sigma_res", r.array(), (d, d))
+        frozen = expect_shape("sigma_frozen", r.optional_array(), (d, d))
+        whiten = expect_shape("whiten", r.optional_array(), (d, d))
+        stable_count = r.int()
+        window = expect_shape("window", r.optional_array(), (d, cap))
+        window_w = expect_shape("window_w", r.optional_array(), (cap,))
+        window_gram = expect_shape("window_gram", r.optional_array(),
+                                   (cap, cap))
+        floor_scale = r.float()
+        predictor = self.predictor._parse(r.blob())
+        r.done()
+        return {
+            "predictor": predictor, "turn": turn, "a_anom": a_anom,
+            "_consecutive_hits": hits, "sigma_res": sigma_res,
+            "_sigma_frozen": frozen, "_whiten": whiten,
+            "_stable_count": stable_count, "_window": window,
+            "_window_w": window_w, "_window_gram": window_gram,
+            "_floor_scale": floor_scale,
+        }
+
+    def _apply(self, state):
+        state = dict(state)
+        self.predictor._apply(state.pop("predictor"))
+        apply_state(self, state)
+
     def calculate_g_min(self):
         fraction = self.a_anom / (self.a_anom + self.alpha)
         return self.g0 + (1 - self.g0) * fraction
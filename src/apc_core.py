@@ -6,6 +6,31 @@
 
 import numpy as np
 
+if __package__:
+    from .history_buffer import make_history
+    from .lexicon_matcher import LexiconMatcher
+    from .snapshot import (
+        KIND_ALIGNMENT, KIND_CALIBRATOR, SnapshotReader, SnapshotWriter,
+        apply_state, expect_shape,
+    )
+else:
+    from history_buffer import make_history
+    from lexicon_matcher import LexiconMatcher
+    from snapshot import (
+        KIND_ALIGNMENT, KIND_CALIBRATOR, SnapshotReader, SnapshotWriter,
+        apply_state, expect_shape,
+    )
+
+# history_capacity 指定時のレコード型
+CALIBRATION_HISTORY_FIELDS = [
+    ("turn", np.int64), ("text", object), ("detected", object),
+    ("sensitivity", np.float64, (4,)),
+]
+ALIGNMENT_HISTORY_FIELDS = [
+    ("A", np.float64), ("lambda", np.float64),
+    ("p_value", np.float64), ("d_norm", np.float64),
+]
+
 
 class PainVectorCalibrator:
     """
@@ -24,11 +49,14 @@ class PainVectorCalibrator:
         3: Creation（創造）
     """
 
-    def __init__(self, base_calibration_limit=5):
+    def __init__(self, base_calibration_limit=5, history_capacity=None):
         # Phase 0: 全員一律のデフォルト値
         self.pain_vector = np.array([0.5, 0.5, 0.5, 0.5])
         self.sensitivity = np.array([1.0, 1.0, 1.0, 1.0])
-        self.history = []
+        self.history_capacity = history_capacity
+        self.history = make_history(
+            CALIBRATION_HISTORY_FIELDS, history_capacity
+        )
         self.calibration_count = 0
         self.base_limit = base_calibration_limit
         self.calibration_complete = False
@@ -48,19 +76,29 @@ class PainVectorCalibrator:
             3: {"書く": 0.5, "作る": 0.5, "アイデア": 0.6,
                 "研究": 0.6, "表現": 0.5, "創る": 0.6}
         }
+        # 全キーワードを1回の走査で照合するオートマトン
+        self._matcher = LexiconMatcher(self.keyword_weights, dims=4)
 
     def analyze_input(self, user_text):
         """
         重み付きスコアで次元を評価。
         単語の重複検出に対応（例: 妻+仕事 → Relation+Duty両方上昇）
         """
-        scores = np.zeros(4)
-        for dim, words in self.keyword_weights.items():
-            for word, weight in words.items():
-                if word in user_text:
-                    scores[dim] += weight
+        scores = self._matcher.score(user_text)
         return np.clip(scores, 0, 1)
 
+    def analyze_many(self, texts, out=None):
+        """
+        バッチ版 analyze_input。
+        結果を (N, 4) 配列に書き込み、その場で [0, 1] にクリップする。
+
+        Args:
+            texts: テキストのイテラブル
+            out: 書き込み先の (N, 4) float配列（省略時は新規確保）
+        """
+        scores = self._matcher.score_many(texts, out)
+        return np.clip(scores, 0, 1, out=scores)
+
     def dynamic_limit(self):
         """
         自己開示が少ない場合はキャリブレーションを延長。
@@ -72,14 +110,19 @@ class PainVectorCalibrator:
             return self.base_limit + 3
         return self.base_limit
 
-    def update(self, user_text):
+    def update(self, user_text, scores=None):
         """
         対話ターンごとに感度を更新。
         
+        Args:
+            user_text: ユーザー発話
+            scores: analyze_input() 済みのスコア（指定時はテキストを走査しない）
+
         Returns:
             current_pain: 現在の推定Pain Vector
         """
-        scores = self.analyze_input(user_text)
+        if scores is None:
+            scores = self.analyze_input(user_text)
         detected = [
             self.dim_labels[i] 
             for i in range(4) if scores[i] > 0
@@ -128,7 +171,32 @@ class PainVectorCalibrator:
 
     def reset(self):
         """プロファイルをリセット（デバッグ用）"""
-        self.__init__(self.base_limit)
+        self.__init__(self.base_limit, self.history_capacity)
+
+    def snapshot(self):
+        """感度・Pain Vector・キャリブレーション進捗のバイナリスナップショット"""
+        return (SnapshotWriter(KIND_CALIBRATOR)
+                .array(self.pain_vector).array(self.sensitivity)
+                .int(self.calibration_count).flag(self.calibration_complete)
+                .getvalue())
+
+    def restore(self, data):
+        """snapshot() の出力で状態を上書きする（history は変更しない）。"""
+        self._apply(self._parse(data))
+
+    def _parse(self, data) -> dict:
+        r = SnapshotReader(data, KIND_CALIBRATOR)
+        pain_vector = expect_shape("pain_vector", r.array(), (4,))
+        sensitivity = expect_shape("sensitivity", r.array(), (4,))
+        count = r.int()
+        complete = r.flag()
+        r.done()
+        return {
+            "pain_vector": pain_vector, "sensitivity": sensitivity,
+            "calibration_count": count, "calibration_complete": complete,
+        }
+
+    _apply = apply_state
 
 
 # --- 動作確認 ---
@@ -166,13 +234,16 @@ class AlignmentTracker:
     lambda_t = sigma(beta * (||D_t|| - D_bar) / (D_bar + epsilon))
     """
 
-    def __init__(self, alpha=0.1, beta=5.0, d_bar=0.5, epsilon=1e-3):
+    def __init__(self, alpha=0.1, beta=5.0, d_bar=0.5, epsilon=1e-3,
+                 history_capacity=None, history_spill=None):
         self.alpha = alpha
         self.beta = beta
         self.d_bar = d_bar
         self.epsilon = epsilon
         self.A = 0.5
-        self.history = []
+        self.history = make_history(
+            ALIGNMENT_HISTORY_FIELDS, history_capacity, history_spill
+        )
 
     def sigmoid(self, x):
         return 1 / (1 + np.exp(-x))
@@ -196,3 +267,19 @@ class AlignmentTracker:
             "d_norm": round(float(d_norm), 4)
         })
         return self.A
+
+    def snapshot(self):
+        """A_t のバイナリスナップショット"""
+        return SnapshotWriter(KIND_ALIGNMENT).float(self.A).getvalue()
+
+    def restore(self, data):
+        """snapshot() の出力で A_t を上書きする（history は変更しない）。"""
+        self._apply(self._parse(data))
+
+    def _parse(self, data) -> dict:
+        r = SnapshotReader(data, KIND_ALIGNMENT)
+        a = r.float()
+        r.done()
+        return {"A": a}
+
+    _apply = apply_state
@@ -0,0 +1,512 @@
+# src/benchmarks.py
+# Qualia Arc Protocol – Microbenchmark Suite
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   性能の確認手段は各モジュールの __main__ デモだけで、
+#   1呼び出しあたりのコストも、変更による劣化も数値で追えなかった。
+#
+# 設計:
+#   各モジュールのホットパスを1呼び出し単位で計測する。
+#     - 入力はシード固定の乱数で事前生成（毎回同じ入力列）
+#     - 計測パス: perf_counter_ns で1呼び出しずつ計時 → ops/sec, p50, p99
+#     - メモリパス: tracemalloc 下で別途実行 → 1呼び出しあたりの
+#       保持バイト数（履歴の成長など）と一時的なピークバイト数
+#   tracemalloc は実行を遅くするため、時間計測とは別パスにしている。
+#
+# 使い方:
+#   python benchmarks.py --out bench.json
+#   python benchmarks.py --filter AnomalyTrackerV9 --iterations 20000
+
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+if __package__:
+    from .anomaly_tracker_v9 import AnomalyTrackerV9, SemanticContextExtractor
+    from .apc_core import AlignmentTracker, PainVectorCalibrator
+    from .iron_rule import IronRule
+    from .miracle_decay import MiracleDecayCohort, MiracleDecayManager
+    from .reignition_protocol_v2 import (
+        reignition_decision, reignition_decision_batch,
+    )
+    from .turn_pipeline import TurnPipeline
+else:
+    from anomaly_tracker_v9 import AnomalyTrackerV9, SemanticContextExtractor
+    from apc_core import AlignmentTracker, PainVectorCalibrator
+    from iron_rule import IronRule
+    from miracle_decay import MiracleDecayCohort, MiracleDecayManager
+    from reignition_protocol_v2 import (
+        reignition_decision, reignition_decision_batch,
+    )
+    from turn_pipeline import TurnPipeline
+
+SEED = 20260218
+
+BENCH_TEXTS = [
+    "今日も普通でした。",
+    "大丈夫です。仕事が続いています。残業がありました。",
+    "妻のことが心配で仕事に集中できない",
+    "誰とも話してなくて孤独を感じる",
+    "新しいアイデアを研究として書く時間がない",
+    "家族と喧嘩して、借金のこともあって眠れない",
+    "特に変わりないです。",
+    "締め切りが近いです。徹夜しました。",
+]
+
+
+@dataclass
+class BenchResult:
+    name: str
+    iterations: int
+    ops_per_sec: float
+    mean_us: float
+    p50_us: float
+    p99_us: float
+    retained_bytes_per_call: float   # 呼び出し後も残るメモリ（履歴の成長など）
+    peak_bytes_per_call: float       # 1呼び出し中の一時的な最大使用量
+
+
+# ----------------------------------------------------------------------
+# ベンチマーク定義
+#   各関数はシード付き乱数を受け取り、引数なしの op() を返す。
+#   op() は1回の呼び出しで1回の対象メソッド実行を行う。
+# ----------------------------------------------------------------------
+
+def _cycle(items):
+    n = len(items)
+    state = [0]
+
+    def take():
+        i = state[0]
+        state[0] = i + 1 if i + 1 < n else 0
+        return items[i]
+    return take
+
+
+def bench_extract(rng):
+    extractor = SemanticContextExtractor()
+    text = _cycle(BENCH_TEXTS)
+    return lambda: extractor.extract(text())
+
+
+def bench_update_calibration(rng):
+    # calib_turns を十分大きくし、常にキャリブレーション期のまま計測する
+    tracker = AnomalyTrackerV9(calib_turns=10 ** 9)
+    obs = _cycle(list(np.clip(rng.normal(0.3, 0.04, (256, 4)), 0, 1)))
+    text = _cycle(BENCH_TEXTS)
+    return lambda: tracker.update(obs(), text())
+
+
+def bench_update_frozen(rng):
+    tracker = AnomalyTrackerV9()
+    obs = _cycle(list(np.clip(rng.normal(0.3, 0.04, (256, 4)), 0, 1)))
+    text = _cycle(BENCH_TEXTS)
+    while tracker._sigma_frozen is None:
+        tracker.update(obs(), text())
+    return lambda: tracker.update(obs(), text())
+
+
+def bench_update_after_idle(rng):
+    # 毎回 1〜10000 ターンの空白を挟んで戻ってくるユーザー
+    tracker = AnomalyTrackerV9()
+    obs = _cycle(list(np.clip(rng.normal(0.3, 0.04, (256, 4)), 0, 1)))
+    text = _cycle(BENCH_TEXTS)
+    while tracker._sigma_frozen is None:
+        tracker.update(obs(), text())
+    gaps = _cycle(list(rng.integers(1, 10001, 256).astype(float)))
+    clock = [tracker.predictor.clock]
+
+    def op():
+        clock[0] += gaps()
+        return tracker.update(obs(), text(), now=clock[0])
+    return op
+
+
+def bench_miracle_tick(rng):
+    # k_max を十分大きくし、常に PENDING 中の tick を計測する
+    manager = MiracleDecayManager(k_max=10 ** 9)
+    manager.attempt_miracle(rng.uniform(0, 5, 4), g_value=0.9, g_min=0.5,
+                            v_consistency=0.9)
+    integrals = _cycle(list(rng.uniform(0, 5, (256, 4))))
+    d_dot = _cycle(list(rng.uniform(-0.1, 0.05, 256)))
+    return lambda: manager.tick(integrals(), d_dot())
+
+
+def bench_miracle_tick_lazy(rng):
+    manager = MiracleDecayManager(k_max=10 ** 9, lazy_decay=True)
+    manager.attempt_miracle(rng.uniform(0, 5, 4), g_value=0.9, g_min=0.5,
+                            v_consistency=0.9)
+    integrals = _cycle(list(rng.uniform(0, 5, (256, 4))))
+    d_dot = _cycle(list(rng.uniform(-0.1, 0.05, 256)))
+    return lambda: manager.tick(integrals(), d_dot())
+
+
+def bench_miracle_cohort_tick(rng):
+    # 1呼び出し = 10000 セッションの tick（k_max を大きくし PENDING を維持）
+    n = 10000
+    cohort = MiracleDecayCohort(n, k_max=10 ** 9)
+    cohort.attempt(np.arange(n), rng.uniform(0, 5, (n, 4)), 0.9, 0.5, 0.9)
+    d_dot = _cycle(list(rng.uniform(-0.1, 0.0, (16, n))))
+    return lambda: cohort.tick(d_dot())
+
+
+def bench_reignition(rng):
+    # BLOCKED / ANOMALY_HOLD / CASE_A / CASE_B が混在する入力
+    n = 256
+    args = list(zip(
+        rng.uniform(0, 8, (n, 4)), rng.uniform(0, 0.5, n),
+        rng.uniform(0, 1, n), rng.uniform(0, 0.6, n), rng.uniform(0, 3, n)
+    ))
+    take = _cycle(args)
+    return lambda: reignition_decision(*take())
+
+
+def bench_reignition_batch(rng):
+    # 1呼び出し = 1024 セッション分
+    n = 1024
+    args = (rng.uniform(0, 8, (n, 4)), rng.uniform(0, 0.5, n),
+            rng.uniform(0, 1, n), rng.uniform(0, 0.6, n), rng.uniform(0, 3, n))
+    return lambda: reignition_decision_batch(*args)
+
+
+def bench_filter_actions(rng):
+    gate = IronRule(p_min=0.3)
+    batches = [
+        [{"action": f"action_{j}", "p_value": float(p), "reward": float(r)}
+         for j, (p, r) in enumerate(zip(rng.uniform(0, 1, 8),
+                                        rng.uniform(0, 1, 8)))]
+        for _ in range(64)
+    ]
+    take = _cycle(batches)
+    return lambda: gate.filter_actions(take())
+
+
+def bench_filter_actions_256(rng):
+    gate = IronRule(p_min=0.3)
+    batches = [
+        [{"action": f"action_{j}", "p_value": float(p), "reward": float(r)}
+         for j, (p, r) in enumerate(zip(rng.uniform(0, 1, 256),
+                                        rng.uniform(0, 1, 256)))]
+        for _ in range(16)
+    ]
+    take = _cycle(batches)
+    return lambda: gate.filter_actions(take())
+
+
+def bench_evaluate_256(rng):
+    # filter_actions[256] と同じ候補を列で渡し、報酬上位8件を選ぶ
+    gate = IronRule(p_min=0.3)
+    ids = [f"action_{j}" for j in range(256)]
+    batches = [(rng.uniform(0, 1, 256), rng.uniform(0, 1, 256))
+               for _ in range(16)]
+    take = _cycle(batches)
+
+    def op():
+        p, r = take()
+        return gate.evaluate(p, r, ids, k=8)
+    return op
+
+
+def bench_calibrator_update(rng):
+    # base_calibration_limit を十分大きくし、キャリブレーション期を計測する
+    calibrator = PainVectorCalibrator(base_calibration_limit=10 ** 9)
+    text = _cycle(BENCH_TEXTS)
+    return lambda: calibrator.update(text())
+
+
+def bench_alignment_update(rng):
+    tracker = AlignmentTracker()
+    args = list(zip(rng.uniform(0, 1, (256, 4)), rng.uniform(0, 1, 256),
+                    rng.uniform(-0.1, 0.1, 256)))
+    take = _cycle(args)
+    return lambda: tracker.update(*take())
+
+
+def _turn_inputs(rng):
+    n = 256
+    return _cycle(list(zip(
+        BENCH_TEXTS * (n // len(BENCH_TEXTS)),
+        np.clip(rng.normal(0.3, 0.04, (n, 4)), 0, 1),
+        rng.uniform(0, 1, n), rng.uniform(-0.1, 0.05, n),
+        rng.uniform(0, 0.5, n), rng.uniform(0, 1, n), rng.uniform(0, 0.6, n)
+    )))
+
+
+def bench_turn_hand_wired(rng):
+    # TurnPipeline.step と同じ各段を個別に呼ぶ（比較用）
+    calibrator = PainVectorCalibrator(history_capacity=64)
+    tracker = AnomalyTrackerV9(history_capacity=64)
+    alignment = AlignmentTracker(history_capacity=64)
+    miracle = MiracleDecayManager(history_capacity=64)
+    take = _turn_inputs(rng)
+
+    def op():
+        text, d_obs, p_value, d_dot, trauma, g_rel, proposed = take()
+        pain = calibrator.update(text)
+        tracker.update(d_obs, text)
+        alignment.update(pain, p_value, d_dot)
+        miracle.tick(tracker.predictor.integrals, d_dot)
+        return reignition_decision(tracker.predictor.integrals, trauma,
+                                   g_rel, proposed, tracker.a_anom)
+    for _ in range(32):
+        op()
+    return op
+
+
+def bench_turn_pipeline(rng):
+    pipeline = TurnPipeline(history_capacity=64)
+    take = _turn_inputs(rng)
+    for _ in range(32):
+        pipeline.step(*take())
+    return lambda: pipeline.step(*take())
+
+
+def _core_class():
+    core_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "..", "core")
+    if core_dir not in sys.path:
+        sys.path.append(core_dir)
+    from qualia_arc_core import QualiaArcCore
+    return QualiaArcCore
+
+
+def bench_core_init(rng):
+    cls = _core_class()
+    return cls
+
+
+def bench_core_iron_rule(rng):
+    core = _core_class()()
+    truth = _cycle(list(rng.uniform(0, 1, 256)))
+    return lambda: core.iron_rule_constraint(truth())
+
+
+def bench_core_symbiosis(rng):
+    core = _core_class()()
+    psi = _cycle(list(rng.uniform(0, 1, (256, 3))))
+    w = np.ones(3)
+    return lambda: core.calculate_symbiosis_state(0.9, 0.8, 0.7, psi(), w)
+
+
+def bench_core_humor(rng):
+    core = _core_class()()
+    saturation = _cycle(list(rng.uniform(0, 1.2, 256)))
+
+    def op():
+        core.saturation = saturation()
+        return core.quantum_humor_tunneling(1.0)
+    return op
+
+
+def bench_core_gravity(rng):
+    core = _core_class()()
+    grads = list(zip(rng.normal(0, 0.5, (256, 3)), rng.normal(0, 0.05, (256, 3))))
+    take = _cycle(grads)
+    return lambda: core.gravitational_weight_update(*take())
+
+
+def bench_core_gravity_counter(rng):
+    core_cls = _core_class()
+    from qualia_arc_core import CounterEventSink
+    core = core_cls(events=CounterEventSink())
+    grads = list(zip(rng.normal(0, 0.5, (256, 3)), rng.normal(0, 0.05, (256, 3))))
+    take = _cycle(grads)
+    return lambda: core.gravitational_weight_update(*take())
+
+
+def bench_core_dual_route(rng):
+    core = _core_class()()
+    residual = _cycle(list(rng.normal(0, 1.2, (256, 4))))
+    return lambda: core.dual_route_anomaly_detector(residual())
+
+
+BENCHMARKS = {
+    "SemanticContextExtractor.extract": bench_extract,
+    "AnomalyTrackerV9.update[calibration]": bench_update_calibration,
+    "AnomalyTrackerV9.update[frozen]": bench_update_frozen,
+    "AnomalyTrackerV9.update[frozen,idle]": bench_update_after_idle,
+    "MiracleDecayManager.tick[pending]": bench_miracle_tick,
+    "MiracleDecayManager.tick[pending,lazy]": bench_miracle_tick_lazy,
+    "MiracleDecayCohort.tick[10000]": bench_miracle_cohort_tick,
+    "reignition_decision": bench_reignition,
+    "reignition_decision_batch[1024]": bench_reignition_batch,
+    "IronRule.filter_actions[8]": bench_filter_actions,
+    "IronRule.filter_actions[256]": bench_filter_actions_256,
+    "IronRule.evaluate[256]": bench_evaluate_256,
+    "PainVectorCalibrator.update": bench_calibrator_update,
+    "AlignmentTracker.update": bench_alignment_update,
+    "turn[hand-wired]": bench_turn_hand_wired,
+    "TurnPipeline.step": bench_turn_pipeline,
+    "QualiaArcCore.__init__": bench_core_init,
+    "QualiaArcCore.iron_rule_constraint": bench_core_iron_rule,
+    "QualiaArcCore.calculate_symbiosis_state": bench_core_symbiosis,
+    "QualiaArcCore.quantum_humor_tunneling": bench_core_humor,
+    "QualiaArcCore.gravitational_weight_update": bench_core_gravity,
+    "QualiaArcCore.gravitational_weight_update[counter]":
+        bench_core_gravity_counter,
+    "QualiaArcCore.dual_route_anomaly_detector": bench_core_dual_route,
+}
+
+
+# ----------------------------------------------------------------------
+# 計測
+# ----------------------------------------------------------------------
+
+@contextmanager
+def _quiet_logging():
+    """
+    QualiaArcCore のログ出力を計測中だけ捨てる。
+    LogRecord の生成とメッセージ整形のコストは計測に含まれる。
+    """
+    root = logging.getLogger()
+    saved = root.handlers[:]
+    root.handlers = [logging.NullHandler()]
+    try:
+        yield
+    finally:
+        root.handlers = saved
+
+
+def measure(name, factory, iterations=5000, warmup=200, mem_iterations=500,
+            seed=SEED) -> BenchResult:
+    """
+    1つのベンチマークを計測する。
+
+    Args:
+        factory: シード付き乱数を受け取り op() を返す関数
+        iterations: 時間計測の呼び出し回数
+        warmup: 計測前の空回し回数
+        mem_iterations: tracemalloc 下での呼び出し回数（0 でメモリ計測なし）
+    """
+    op = factory(np.random.default_rng(seed))
+    for _ in range(warmup):
+        op()
+
+    clock = time.perf_counter_ns
+    samples = np.empty(iterations, dtype=np.int64)
+    start = clock()
+    for i in range(iterations):
+        t0 = clock()
+        op()
+        samples[i] = clock() - t0
+    total = clock() - start
+
+    retained = peak = 0.0
+    if mem_iterations:
+        # 別インスタンスで計測し、時間計測の状態（履歴の長さ）に影響させない
+        op = factory(np.random.default_rng(seed))
+        for _ in range(warmup):
+            op()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            peak_sum = 0
+            for _ in range(mem_iterations):
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                op()
+                peak_sum += tracemalloc.get_traced_memory()[1] - base
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        retained = (after - before) / mem_iterations
+        peak = peak_sum / mem_iterations
+
+    return BenchResult(
+        name=name,
+        iterations=iterations,
+        ops_per_sec=iterations / (total / 1e9) if total else float("inf"),
+        mean_us=float(samples.mean()) / 1e3,
+        p50_us=float(np.percentile(samples, 50)) / 1e3,
+        p99_us=float(np.percentile(samples, 99)) / 1e3,
+        retained_bytes_per_call=retained,
+        peak_bytes_per_call=peak,
+    )
+
+
+def run_benchmarks(names=None, iterations=5000, warmup=200,
+                   mem_iterations=500, seed=SEED) -> list:
+    """
+    ベンチマークを順に実行する。
+
+    Args:
+        names: 実行するベンチマーク名のリスト（None: 全件）。
+               部分文字列でも指定できる。
+    """
+    selected = [
+        (name, factory) for name, factory in BENCHMARKS.items()
+        if names is None or any(n in name for n in names)
+    ]
+    with _quiet_logging():
+        return [measure(name, factory, iterations, warmup, mem_iterations,
+                        seed)
+                for name, factory in selected]
+
+
+def environment() -> dict:
+    """レポートに添付する実行環境"""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_report(results, path, **meta) -> dict:
+    """結果を JSON レポートとして書き出す。"""
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "config": meta,
+        "benchmarks": {r.name: asdict(r) for r in results},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def format_results(results) -> str:
+    lines = [f"  {'benchmark':<52} {'ops/sec':>11} {'p50 µs':>9} "
+             f"{'p99 µs':>9} {'B/call':>8} {'peak B':>8}",
+             "  " + "-" * 102]
+    for r in results:
+        lines.append(
+            f"  {r.name:<52} {r.ops_per_sec:>11,.0f} {r.p50_us:>9.2f} "
+            f"{r.p99_us:>9.2f} {r.retained_bytes_per_call:>8.0f} "
+            f"{r.peak_bytes_per_call:>8.0f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="QAP microbenchmarks")
+    parser.add_argument("--out", default="bench.json",
+                        help="JSON report path")
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--mem-iterations", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--filter", action="append",
+                        help="run only benchmarks whose name contains this")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.filter, args.iterations, args.warmup,
+                             args.mem_iterations, args.seed)
+    print(format_results(results))
+    write_report(results, args.out, iterations=args.iterations,
+                 warmup=args.warmup, mem_iterations=args.mem_iterations,
+                 seed=args.seed)
+    print(f"\n  report: {args.out}")
@@ -0,0 +1,40 @@
+# src/chi2_table.py
+# Qualia Arc Protocol – Precomputed Chi-Square Quantiles
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   theta_raw = sqrt(chi2.ppf(1 - fp_tolerance, df)) のためだけに
+#   モジュール読み込み時に scipy.stats を import しており、
+#   ワーカー起動や短命なCLI実行のたびに約1秒かかっていた。
+#
+# 解決策:
+#   よく使う (df, q) の分位点を事前計算した表を持ち、
+#   表に無い組み合わせのときだけ SciPy を遅延 import する。
+#   表の値は scipy.stats.chi2.ppf(q, df)（SciPy 1.17）の出力そのもの。
+
+# CHI2_PPF[df][q] = chi2.ppf(q, df)
+CHI2_PPF = {
+    1: {0.9: 2.705543454095404, 0.95: 3.841458820694124, 0.99: 6.6348966010212145, 0.995: 7.879438576622417, 0.999: 10.827566170662733, 0.9995: 12.11566514639738, 0.9999: 15.136705226623606, 0.99999: 19.511420964666268},
+    2: {0.9: 4.605170185988092, 0.95: 5.991464547107979, 0.99: 9.21034037197618, 0.995: 10.596634733096073, 0.999: 13.815510557964274, 0.9995: 15.201804919084385, 0.9999: 18.420680743952584, 0.99999: 23.02585092994956},
+    3: {0.9: 6.251388631170325, 0.95: 7.814727903251179, 0.99: 11.344866730144373, 0.995: 12.838156466598647, 0.999: 16.26623619623813, 0.9995: 17.72999622894616, 0.9999: 21.107513466160444, 0.99999: 25.90174974567149},
+    4: {0.9: 7.779440339734858, 0.95: 9.487729036781154, 0.99: 13.276704135987622, 0.995: 14.860259000560243, 0.999: 18.46682695290317, 0.9995: 19.99735499524785, 0.9999: 23.512742444991076, 0.99999: 28.473255424015775},
+    5: {0.9: 9.236356899781123, 0.95: 11.070497693516351, 0.99: 15.08627246938899, 0.995: 16.74960234363904, 0.999: 20.515005652432873, 0.9995: 22.105326778207612, 0.9999: 25.74483195905612, 0.99999: 30.85618994044592},
+    6: {0.9: 10.644640675668422, 0.95: 12.591587243743977, 0.99: 16.811893829770927, 0.995: 18.547584178511087, 0.999: 22.457744484825323, 0.9995: 24.102798994983747, 0.9999: 27.85634123601417, 0.99999: 33.10705681683927},
+    7: {0.9: 12.017036623780532, 0.95: 14.067140449340169, 0.99: 18.475306906582357, 0.995: 20.27773987496262, 0.999: 24.321886347856854, 0.9995: 26.01776770901503, 0.9999: 29.87750390922517, 0.99999: 35.25853642149138},
+    8: {0.9: 13.36156613651173, 0.95: 15.50731305586545, 0.99: 20.090235029663233, 0.995: 21.95495499065953, 0.999: 26.12448155837614, 0.9995: 27.86804640338262, 0.9999: 31.827628001262585, 0.99999: 37.33159364443294},
+}
+
+
+def chi2_ppf(q: float, df: int) -> float:
+    """
+    chi2.ppf(q, df)。表にあれば表の値、無ければ SciPy で計算する。
+
+    Args:
+        q: 分位（例: 1 - fp_tolerance）
+        df: 自由度
+    """
+    value = CHI2_PPF.get(df, {}).get(q)
+    if value is None:
+        from scipy.stats import chi2
+        value = float(chi2.ppf(q, df))
+    return value
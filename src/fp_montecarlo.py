@@ -0,0 +1,257 @@
+# src/fp_montecarlo.py
+# Qualia Arc Protocol – Article 10: Monte Carlo False-Positive Estimator
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   run_simulation() のASD保護確認（FP ≤ 1/1000）は、
+#   シード1個・1000ターンの1回きりの試行だった。
+#   「0件」は FP率 0.1% の主張を支えるには標本が小さすぎる。
+#
+# 設計:
+#   独立なシード（SeedSequence.spawn）で多数のセッションを長いホライズンで回し、
+#   プロセスプールで並列化する。各セッションは AnomalyTrackerV9.replay()
+#   （update() とビット一致）で一括計算する。
+#
+# 信頼区間:
+#   ターン単位のFP率: Clopper-Pearson。ただし同一セッション内のターンは
+#     a_anom のEWMAで相関しているため、この区間は楽観的になる。
+#   ターン単位FP率のクラスタ上限（fp_rate_hi）:
+#     セッション同士は独立なので、セッションごとの fp_turns/turns の平均に
+#     片側 t 上限を取る（クラスタ頑健分散）。合否判定（meets）はこの上限で行う。
+#   セッション単位のFP率（1件以上FPが出たセッションの割合）:
+#     セッション同士は独立なので Clopper-Pearson がそのまま正しい。
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+if __package__:
+    from .anomaly_tracker_v9 import AnomalyTrackerV9
+else:
+    from anomaly_tracker_v9 import AnomalyTrackerV9
+
+# run_simulation() シナリオ1（ASD特性ユーザー）と同じ入力
+STABLE_TEXTS = ["今日も普通でした。", "特に変わりないです。",
+                "平穏な一日でした。", "いつも通りです。"]
+
+
+@dataclass
+class FalsePositiveEstimate:
+    n_sessions: int
+    horizon: int
+    turns_evaluated: int          # キャリブレーション後のターン総数
+    fp_turns: int                 # detected=True のターン数
+    fp_rate: float                # ターン単位
+    fp_rate_ci: tuple
+    fp_rate_hi: float             # セッション・クラスタ化した信頼上限（meets の基準）
+    sessions_with_fp: int
+    session_fp_rate: float        # 1件以上FPが出たセッションの割合
+    session_fp_ci: tuple
+    confidence: float
+    a_anom_edges: np.ndarray      # ヒストグラムの境界（最終ビンは上限超過）
+    a_anom_hist: np.ndarray
+    a_anom_max: float
+
+    def a_anom_quantile(self, q: float) -> float:
+        """ヒストグラムから求めた a_anom の分位点（ビン上端で近似）"""
+        cdf = np.cumsum(self.a_anom_hist) / max(self.a_anom_hist.sum(), 1)
+        i = int(np.searchsorted(cdf, q))
+        if i >= len(self.a_anom_edges) - 2:
+            return self.a_anom_max
+        return float(self.a_anom_edges[i + 1])
+
+    def meets(self, tolerance: float) -> bool:
+        """
+        ターン単位FP率が tolerance 以下と言えるか（fp_rate_hi で判定）。
+
+        ターン同士は相関しているため fp_rate_ci は単独では使わず、
+        独立なセッションを単位にした clustered_rate_upper() の上限で判定する。
+        """
+        return self.fp_rate_hi <= tolerance
+
+
+def clopper_pearson(k: int, n: int, confidence: float = 0.95) -> tuple:
+    """二項比率 k/n の Clopper-Pearson 信頼区間"""
+    from scipy.stats import beta
+
+    if n == 0:
+        return (0.0, 1.0)
+    alpha = 1 - confidence
+    lo = 0.0 if k == 0 else float(beta.ppf(alpha / 2, k, n - k + 1))
+    hi = 1.0 if k == n else float(beta.ppf(1 - alpha / 2, k + 1, n - k))
+    return (lo, hi)
+
+
+def clustered_rate_upper(fp, turns_per_session: int,
+                         confidence: float = 0.95) -> float:
+    """
+    ターン単位FP率のセッション・クラスタ化した信頼上限。
+
+    セッションごとの率 fp_i/turns の平均（ターン数が揃っているので比推定量と
+    一致）に、セッション間の標本分散による片側 t 上限を取る。
+    FPが少なく分散が潰れる場合（0件なら上限も0）に備え、ターン単位の
+    Clopper-Pearson 上限を下限として max を返す。
+
+    Args:
+        fp: セッションごとのFPターン数
+        turns_per_session: 1セッションの評価ターン数
+    """
+    from scipy.stats import t
+
+    fp = np.asarray(fp, dtype=float)
+    n = len(fp)
+    turns = turns_per_session * n
+    if turns == 0:
+        return 1.0
+    binomial_hi = clopper_pearson(int(fp.sum()), turns, confidence)[1]
+    if n < 2:
+        return binomial_hi
+    rates = fp / turns_per_session
+    se = rates.std(ddof=1) / np.sqrt(n)
+    clustered_hi = rates.mean() + float(t.ppf(confidence, n - 1)) * se
+    return float(min(max(clustered_hi, binomial_hi), 1.0))
+
+
+def cycle_latents(texts, horizon) -> np.ndarray:
+    """巡回発話の事実コンテキストを (horizon, 4) で一度だけ抽出する。"""
+    cycle = [texts[t % len(texts)] for t in range(horizon)]
+    return AnomalyTrackerV9().predictor.extractor.extract_many(cycle)
+
+
+def simulate_sessions(tracker_params, seeds, horizon, obs_mean, obs_sd,
+                      latent, edges):
+    """
+    ワーカー: セッション群を replay し、FP数と a_anom の分布を集計する。
+
+    Returns:
+        (セッションごとのFPターン数, a_anom ヒストグラム, a_anom 最大値)
+    """
+    tracker = AnomalyTrackerV9(**tracker_params)
+    dims = tracker.dims
+    start = max(tracker.predictor.calib_turns, 1) - 1
+
+    fp = np.zeros(len(seeds), dtype=np.int64)
+    hist = np.zeros(len(edges) - 1, dtype=np.int64)
+    a_max = 0.0
+    for i, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        d_obs = np.clip(rng.normal(obs_mean, obs_sd, (horizon, dims)), 0, 1)
+        out = tracker.replay(d_obs, d_latent=latent)
+        fp[i] = np.count_nonzero(out.detected)
+        a = out.a_anom[start:]
+        hist += np.bincount(np.searchsorted(edges[1:], a, side="right"),
+                            minlength=len(edges) - 1)
+        if len(a):
+            a_max = max(a_max, float(a.max()))
+    return fp, hist, a_max
+
+
+def a_anom_edges(theta_anom: float, n_bins: int) -> np.ndarray:
+    """0〜2·theta_anom を n_bins 等分し、上限超過用の最終ビンを付けた境界"""
+    return np.append(np.linspace(0.0, 2.0 * theta_anom, n_bins + 1), np.inf)
+
+
+def seed_chunks(seed: int, n_sessions: int, n_chunks: int) -> list:
+    """独立なセッション用シードを n_chunks 個程度に分割する。"""
+    seeds = np.random.SeedSequence(seed).spawn(n_sessions)
+    n_chunks = max(min(n_sessions, n_chunks), 1)
+    return [[seeds[i] for i in c]
+            for c in np.array_split(np.arange(n_sessions), n_chunks) if len(c)]
+
+
+def estimate_false_positive_rate(
+    tracker_params=None,
+    n_sessions=1000,
+    horizon=1000,
+    seed=42,
+    workers=None,
+    confidence=0.95,
+    obs_mean=0.3,
+    obs_sd=0.04,
+    texts=None,
+    n_bins=200
+) -> FalsePositiveEstimate:
+    """
+    安定したユーザー（ASD特性シナリオ）の誤検知率をモンテカルロで推定する。
+
+    Args:
+        tracker_params: AnomalyTrackerV9 のコンストラクタ引数
+        n_sessions: 独立セッション数（シード数）
+        horizon: 1セッションのターン数
+        seed: SeedSequence の元シード（workers数に関わらず結果は同一）
+        workers: プロセス数（None: CPU数、1: 同一プロセスで実行）
+        obs_mean, obs_sd: d_obs ~ clip(N(obs_mean, obs_sd), 0, 1)
+        texts: 巡回させる発話（既定: STABLE_TEXTS）
+        n_bins: a_anom ヒストグラムのビン数（0〜2·theta_anom、超過は最終ビン）
+    """
+    tracker_params = dict(tracker_params or {})
+    texts = list(texts or STABLE_TEXTS)
+    probe = AnomalyTrackerV9(**tracker_params)
+    theta_anom = probe.theta_anom
+    per_session = max(horizon - max(probe.predictor.calib_turns, 1) + 1, 0)
+
+    edges = a_anom_edges(theta_anom, n_bins)
+    latent = cycle_latents(texts, horizon)
+    workers = workers or os.cpu_count() or 1
+    args = [(tracker_params, chunk, horizon, obs_mean, obs_sd, latent, edges)
+            for chunk in seed_chunks(seed, n_sessions, workers * 4)]
+
+    if workers == 1:
+        results = [simulate_sessions(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(simulate_sessions, *zip(*args)))
+
+    fp = np.concatenate([r[0] for r in results]) if results else np.zeros(0)
+    hist = sum((r[1] for r in results), np.zeros(len(edges) - 1, dtype=np.int64))
+    a_max = max((r[2] for r in results), default=0.0)
+
+    turns = per_session * n_sessions
+    fp_turns = int(fp.sum())
+    sessions_with_fp = int(np.count_nonzero(fp))
+    return FalsePositiveEstimate(
+        n_sessions=n_sessions,
+        horizon=horizon,
+        turns_evaluated=turns,
+        fp_turns=fp_turns,
+        fp_rate=fp_turns / turns if turns else 0.0,
+        fp_rate_ci=clopper_pearson(fp_turns, turns, confidence),
+        fp_rate_hi=clustered_rate_upper(fp, per_session, confidence),
+        sessions_with_fp=sessions_with_fp,
+        session_fp_rate=sessions_with_fp / n_sessions if n_sessions else 0.0,
+        session_fp_ci=clopper_pearson(sessions_with_fp, n_sessions, confidence),
+        confidence=confidence,
+        a_anom_edges=edges,
+        a_anom_hist=hist,
+        a_anom_max=a_max,
+    )
+
+
+if __name__ == "__main__":
+    import time
+
+    print("=" * 65)
+    print("Article 10: ASD保護（FP ≤ 1/1000）モンテカルロ検証")
+    print("=" * 65)
+
+    t0 = time.perf_counter()
+    est = estimate_false_positive_rate(n_sessions=2000, horizon=1000)
+    elapsed = time.perf_counter() - t0
+
+    lo, hi = est.fp_rate_ci
+    slo, shi = est.session_fp_ci
+    print(f"\n  {est.n_sessions}セッション × {est.horizon}ターン "
+          f"（評価 {est.turns_evaluated:,}ターン, {elapsed:.1f}秒）")
+    print(f"  FP（ターン単位）: {est.fp_turns}件, 率={est.fp_rate:.2e} "
+          f"[{lo:.2e}, {hi:.2e}] ({est.confidence:.0%} CI), "
+          f"クラスタ上限={est.fp_rate_hi:.2e}")
+    print(f"  FPが出たセッション: {est.sessions_with_fp}件, "
+          f"率={est.session_fp_rate:.3f} [{slo:.3f}, {shi:.3f}]")
+    print(f"  A_anom: 中央={est.a_anom_quantile(0.5):.3f}, "
+          f"99%={est.a_anom_quantile(0.99):.3f}, "
+          f"99.9%={est.a_anom_quantile(0.999):.3f}, 最大={est.a_anom_max:.3f}")
+    status = ("✓ 目標達成" if est.meets(0.001)
+              else "！目標未達（クラスタ上限 > 0.1%）")
+    print(f"\n  結果: {status}")
@@ -0,0 +1,177 @@
+# src/history_buffer.py
+# Qualia Arc Protocol – Bounded History Buffer
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   各トラッカーの history / violation_log は list of dict で、
+#   数千ターンのセッションでは単調にメモリを消費し続けていた。
+#
+# 解決策:
+#   型付きnumpy構造化配列による固定容量リングバッファ。
+#   読み出しは list of dict と同じ（len(h), h[-1]["a_anom"], for rec in h）。
+#   溢れた古いレコードは、指定があればディスクに追記（spill）する。
+
+import numpy as np
+
+
+class HistoryBuffer:
+    """
+    固定容量の履歴リングバッファ。
+
+    Args:
+        fields: 構造化dtypeのフィールド定義 [(name, dtype[, shape]), ...]
+        capacity: 保持する最大レコード数
+        spill_path: 溢れたレコードの追記先（バイナリ、dtype はそのまま）。
+                    object型フィールドを含む場合は指定不可。
+        enums: {field: (値0, 値1, ...)} 文字列などを整数コードで保持する
+        as_list: 読み出し時に list で返す配列フィールド名
+
+    append() には dict（既存の history と同じ形）を渡す。
+    dict に無いフィールドは読み出し時にも現れない。
+    """
+
+    def __init__(self, fields, capacity, spill_path=None, enums=None,
+                 as_list=()):
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive. Got: {capacity}")
+        fields = list(fields)
+        if len(fields) > 32:
+            raise ValueError("HistoryBuffer supports at most 32 fields.")
+        self.dtype = np.dtype(fields + [("_present", np.uint32)])
+        if spill_path is not None and self.dtype.hasobject:
+            raise ValueError("Object fields cannot be spilled to disk.")
+
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.total = 0                 # これまでに追加された総数
+        self._data = np.zeros(capacity, dtype=self.dtype)
+        self._blank = np.zeros((), dtype=self.dtype)
+        self._pos = 0
+        self._count = 0
+        self._spill = None
+
+        self._names = [f[0] for f in fields]
+        self._bits = {name: 1 << i for i, name in enumerate(self._names)}
+        self._enums = dict(enums or {})
+        self._enum_code = {
+            name: {v: i for i, v in enumerate(values)}
+            for name, values in self._enums.items()
+        }
+        self._as_list = set(as_list)
+
+    # ------------------------------------------------------------------
+    # 書き込み
+    # ------------------------------------------------------------------
+
+    def append(self, record: dict):
+        pos = self._pos
+        if self._count == self.capacity:
+            self._evict(pos)
+        else:
+            self._count += 1
+
+        data = self._data
+        data[pos] = self._blank
+        present = 0
+        for name, value in record.items():
+            bit = self._bits.get(name)
+            if bit is None:
+                raise KeyError(f"Unknown history field: {name}")
+            codes = self._enum_code.get(name)
+            data[name][pos] = codes[value] if codes is not None else value
+            present |= bit
+        data["_present"][pos] = present
+
+        self._pos = (pos + 1) % self.capacity
+        self.total += 1
+
+    def _evict(self, pos):
+        if self.spill_path is None:
+            return
+        if self._spill is None:
+            self._spill = open(self.spill_path, "ab")
+        self._spill.write(self._data[pos:pos + 1].tobytes())
+
+    def flush(self):
+        if self._spill is not None:
+            self._spill.flush()
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def clear(self):
+        self._pos = 0
+        self._count = 0
+
+    # ------------------------------------------------------------------
+    # 読み出し（list of dict 互換）
+    # ------------------------------------------------------------------
+
+    def __len__(self):
+        return self._count
+
+    def _index(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("history index out of range")
+        return (self._pos - self._count + i) % self.capacity
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        return self._view(self._data[self._index(i)])
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def __repr__(self):
+        return (f"HistoryBuffer(len={self._count}, capacity={self.capacity}, "
+                f"total={self.total})")
+
+    def _view(self, rec) -> dict:
+        present = int(rec["_present"])
+        out = {}
+        for name, bit in self._bits.items():
+            if not present & bit:
+                continue
+            value = rec[name]
+            if name in self._enums:
+                value = self._enums[name][int(value)]
+            elif isinstance(value, np.ndarray):
+                value = value.tolist() if name in self._as_list else value.copy()
+            elif isinstance(value, np.generic):
+                value = value.item()
+            out[name] = value
+        return out
+
+    def records(self) -> np.ndarray:
+        """保持中のレコードを古い順に並べた構造化配列（コピー）。"""
+        start = (self._pos - self._count) % self.capacity
+        order = (start + np.arange(self._count)) % self.capacity
+        return self._data[order]
+
+    def read_spill(self) -> np.ndarray:
+        """ディスクに退避済みのレコード（古い順）。"""
+        if self.spill_path is None:
+            return np.zeros(0, dtype=self.dtype)
+        self.flush()
+        try:
+            return np.fromfile(self.spill_path, dtype=self.dtype)
+        except FileNotFoundError:
+            return np.zeros(0, dtype=self.dtype)
+
+
+def make_history(fields, capacity=None, spill_path=None, **kwargs):
+    """
+    capacity=None なら従来どおりの list、指定時は HistoryBuffer。
+    spill_path だけの指定は無制限の list になるため受け付けない。
+    """
+    if capacity is None:
+        if spill_path is not None:
+            raise ValueError("spill_path requires capacity to be set.")
+        return []
+    return HistoryBuffer(fields, capacity, spill_path, **kwargs)
@@ -4,8 +4,164 @@
 # © 2026 Hiroshi Honma
 # CC BY-NC-ND 4.0
 
+import json
+from collections import deque
+from dataclasses import dataclass
+
 import numpy as np
 
+if __package__:
+    from .history_buffer import make_history
+else:
+    from history_buffer import make_history
+
+# log_capacity 指定時のレコード型
+VIOLATION_FIELDS = [
+    ("action", object), ("p_value", np.float64),
+    ("p_min", np.float64), ("context", object),
+]
+
+OTHER_ACTIONS = "<other>"      # max_action_types を超えた行動タイプの集計先
+
+
+class _ActionStats:
+    __slots__ = ("count", "sum_p", "min_p", "max_p", "hist")
+
+    def __init__(self, n_bins):
+        self.count = 0
+        self.sum_p = 0.0
+        self.min_p = float("inf")
+        self.max_p = float("-inf")
+        self.hist = np.zeros(n_bins, dtype=np.int64)
+
+
+class ViolationIndex:
+    """
+    Iron Rule 違反の集計ストア。
+
+    違反1件ごとの dict を溜める代わりに、行動タイプ別の
+    件数・P値の合計/最小/最大・P値ヒストグラム（[0, 1] を n_bins 等分）と、
+    直近 sample_size 件のサンプル（action, p_value, p_min。context は保持しない）
+    だけを持つ。メモリは行動タイプ数 × n_bins で頭打ちになる。
+    """
+
+    def __init__(self, n_bins=20, sample_size=32, max_action_types=256):
+        if n_bins <= 0:
+            raise ValueError(f"n_bins must be positive. Got: {n_bins}")
+        self.n_bins = n_bins
+        self.max_action_types = max_action_types
+        self.edges = np.linspace(0.0, 1.0, n_bins + 1)
+        self.total = 0
+        self.recent = deque(maxlen=sample_size)
+        self._by_type = {}
+
+    def _stats(self, action_type) -> _ActionStats:
+        stats = self._by_type.get(action_type)
+        if stats is None:
+            if len(self._by_type) >= self.max_action_types:
+                action_type = OTHER_ACTIONS
+                stats = self._by_type.get(action_type)
+            if stats is None:
+                stats = _ActionStats(self.n_bins)
+                self._by_type[action_type] = stats
+        return stats
+
+    def _bin(self, p_value) -> int:
+        return min(int(p_value * self.n_bins), self.n_bins - 1)
+
+    def record(self, action_type, action, p_value, p_min):
+        stats = self._stats(action_type)
+        stats.count += 1
+        stats.sum_p += p_value
+        stats.min_p = min(stats.min_p, p_value)
+        stats.max_p = max(stats.max_p, p_value)
+        stats.hist[self._bin(p_value)] += 1
+        self.total += 1
+        self.recent.append((str(action), p_value, p_min))
+
+    def record_many(self, action_types, actions, p_values: np.ndarray, p_min):
+        """違反をまとめて記録する（IronRule.evaluate 用）。"""
+        n = len(p_values)
+        if not n:
+            return
+        bins = np.minimum((p_values * self.n_bins).astype(np.int64),
+                          self.n_bins - 1).tolist()
+        p_list = p_values.tolist()
+        for action_type, p_value, b in zip(action_types, p_list, bins):
+            stats = self._stats(action_type)
+            stats.count += 1
+            stats.sum_p += p_value
+            if p_value < stats.min_p:
+                stats.min_p = p_value
+            if p_value > stats.max_p:
+                stats.max_p = p_value
+            stats.hist[b] += 1
+        self.total += n
+        for i in range(max(0, n - (self.recent.maxlen or 0)), n):
+            self.recent.append((str(actions[i]), p_list[i], p_min))
+
+    def count(self, action_type=None) -> int:
+        """違反件数（action_type 省略時は全体）"""
+        if action_type is None:
+            return self.total
+        stats = self._by_type.get(action_type)
+        return stats.count if stats is not None else 0
+
+    def histogram(self, action_type=None) -> np.ndarray:
+        """P値ヒストグラム（ビン境界は self.edges）"""
+        if action_type is not None:
+            stats = self._by_type.get(action_type)
+            if stats is None:
+                return np.zeros(self.n_bins, dtype=np.int64)
+            return stats.hist.copy()
+        hist = np.zeros(self.n_bins, dtype=np.int64)
+        for stats in self._by_type.values():
+            hist += stats.hist
+        return hist
+
+    def by_action(self) -> dict:
+        return {
+            action_type: {
+                "count": s.count,
+                "mean_p": s.sum_p / s.count,
+                "min_p": s.min_p,
+                "max_p": s.max_p,
+            }
+            for action_type, s in self._by_type.items()
+        }
+
+    def samples(self) -> list:
+        return [{"action": a, "p_value": p, "p_min": m}
+                for a, p, m in self.recent]
+
+
+@dataclass
+class FeasibilityResult:
+    """
+    IronRule.evaluate の結果（列指向）。
+
+    理由文字列は reasons() / reason(i) を呼んだときにだけ組み立てる。
+    """
+    mask: np.ndarray             # (N,) bool 実行可能か
+    n_violations: int
+    top_k: np.ndarray            # 実行可能な候補のうち報酬上位の入力インデックス（降順。rewards 省略時は入力順の全件）
+    top_k_actions: list          # top_k に対応する action_ids（省略時はインデックス）
+    p_values: np.ndarray
+    p_min: float
+
+    def reason(self, i: int) -> str:
+        """候補 i の判定理由（check() と同じ文言）"""
+        if self.mask[i]:
+            return "Truth constraint satisfied."
+        return (
+            f"Iron Rule violation: "
+            f"P={self.p_values[i]:.3f} < P_min={self.p_min:.3f}. "
+            f"Policy is undefined."
+        )
+
+    def reasons(self) -> list:
+        return [self.reason(i) for i in range(len(self.mask))]
+
 
 class IronRule:
     """
@@ -22,15 +178,58 @@ class IronRule:
         P_t < P_min => J(pi) undefined
     """
 
-    def __init__(self, p_min=0.3):
+    def __init__(self, p_min=0.3, log_capacity=None, log_path=None,
+                 sample_size=32, action_type=None, max_action_types=256):
         """
         Args:
             p_min: 真実性の最低閾値。
                    この値を下回る方策は実行不可能。
                    デフォルト値は保守的設定。
+            log_capacity: 指定時は違反の全レコード（context込み）を
+                          直近N件のリングバッファでも保持する
+            log_path: 指定時は違反の全レコードを JSON Lines で追記する
+                      （全件ログはメモリに置かず、ディスクへ流す）
+            sample_size: 集計ストアが保持する直近サンプル数
+            action_type: action → 集計キーの関数（省略時は str(action)）
+            max_action_types: 集計キーの種類の上限（超過分は "<other>"）
+
+        違反は常に self.violations（ViolationIndex）に集計される。
         """
         self.p_min = p_min
-        self.violation_log = []
+        self.violations = ViolationIndex(sample_size=sample_size,
+                                         max_action_types=max_action_types)
+        self.action_type = action_type or str
+        self.violation_log = (
+            make_history(VIOLATION_FIELDS, log_capacity)
+            if log_capacity is not None else None
+        )
+        self.log_path = log_path
+        self._log_file = (open(log_path, "a", encoding="utf-8")
+                          if log_path is not None else None)
+
+    def _log_violation(self, action, p_value, context):
+        violation = {
+            "action": str(action),
+            "p_value": p_value,
+            "p_min": self.p_min,
+            "context": context
+        }
+        if self.violation_log is not None:
+            self.violation_log.append(violation)
+        if self._log_file is not None:
+            self._log_file.write(
+                json.dumps(violation, ensure_ascii=False, default=repr) + "\n"
+            )
+
+    def flush(self):
+        if self._log_file is not None:
+            self._log_file.flush()
+
+    def close(self):
+        """ディスクログを閉じる。"""
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
 
     def check(self, action, p_value, context=None):
         """
@@ -54,13 +253,10 @@ class IronRule:
 
         if p_value < self.p_min:
             # Iron Rule違反: 実行不可能
-            violation = {
-                "action": str(action),
-                "p_value": p_value,
-                "p_min": self.p_min,
-                "context": context
-            }
-            self.violation_log.append(violation)
+            self.violations.record(self.action_type(action), action,
+                                   p_value, self.p_min)
+            if self.violation_log is not None or self._log_file is not None:
+                self._log_violation(action, p_value, context)
 
             return {
                 "feasible": False,
@@ -111,11 +307,91 @@ class IronRule:
 
         return feasible, rejected
 
+    def evaluate(self, p_values, rewards=None, action_ids=None, k=None,
+                 log=True) -> FeasibilityResult:
+        """
+        候補を列（並列配列）で受け取り、一括で判定する。
+        filter_actions と同じ判定を、候補ごとの dict・理由文字列なしで行う。
+
+        Args:
+            p_values: (N,) 真実接地確率 P_t in [0, 1]
+            rewards: (N,) 報酬（top-k の並べ替えに使う）。省略時の top_k は
+                     実行可能な全候補を入力順に並べたもの
+            action_ids: 候補の識別子（N件。違反ログと top_k_actions に使う）
+            k: 報酬上位何件を返すか（None: 実行可能な全件）。rewards が必要
+            log: True なら違反を集計・ログに記録する（check() と同じ扱い）
+
+        Returns:
+            FeasibilityResult
+        """
+        p = np.asarray(p_values, dtype=float)
+        if p.ndim != 1:
+            raise ValueError(f"p_values must be 1-D. Got shape: {p.shape}")
+        in_range = (p >= 0) & (p <= 1)
+        if not in_range.all():
+            bad = p[np.argmin(in_range)]
+            raise ValueError(
+                f"P value must be in [0, 1]. Got: {bad}"
+            )
+        if k is not None and rewards is None:
+            raise ValueError("k requires rewards to rank candidates.")
+        if action_ids is not None and len(action_ids) != len(p):
+            raise ValueError(
+                f"Expected {len(p)} action_ids, got {len(action_ids)}."
+            )
+
+        mask = p >= self.p_min
+        n_violations = len(p) - int(np.count_nonzero(mask))
+
+        if rewards is None:
+            top = np.flatnonzero(mask)
+        else:
+            r = np.asarray(rewards, dtype=float)
+            if r.shape != p.shape:
+                raise ValueError(
+                    f"rewards must have shape {p.shape}. Got: {r.shape}"
+                )
+            feasible = np.flatnonzero(mask)
+            # 報酬の降順（同点は入力順）
+            top = feasible[np.argsort(-r[feasible], kind="stable")]
+            if k is not None:
+                top = top[:k]
+
+        if log and n_violations:
+            rejected = np.flatnonzero(~mask)
+            if action_ids is None:
+                actions = rejected.tolist()
+            else:
+                actions = [action_ids[i] for i in rejected]
+            p_rejected = p[rejected]
+            self.violations.record_many(
+                [self.action_type(a) for a in actions], actions,
+                p_rejected, self.p_min
+            )
+            if self.violation_log is not None or self._log_file is not None:
+                for action, p_value in zip(actions, p_rejected.tolist()):
+                    self._log_violation(action, p_value, None)
+
+        if action_ids is None:
+            top_actions = top.tolist()
+        else:
+            top_actions = [action_ids[i] for i in top]
+        return FeasibilityResult(
+            mask=mask, n_violations=n_violations, top_k=top,
+            top_k_actions=top_actions, p_values=p, p_min=self.p_min
+        )
+
     def get_violation_summary(self):
-        """違反ログのサマリーを返す"""
+        """
+        違反のサマリーを返す（違反の総数に依存しないコスト）。
+
+        violations は直近サンプル（最大 sample_size 件）。
+        全件は log_path のファイルを参照する。
+        """
         return {
-            "total_violations": len(self.violation_log),
-            "violations": self.violation_log
+            "total_violations": self.violations.total,
+            "by_action": self.violations.by_action(),
+            "violations": self.violations.samples(),
         }
 
 
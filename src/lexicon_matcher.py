@@ -0,0 +1,217 @@
+# src/lexicon_matcher.py
+# Qualia Arc Protocol – Lexicon Matcher (Aho-Corasick)
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   SemanticContextExtractor / PainVectorCalibrator は
+#   「キーワード数 × 次元数」回の `word in user_text` を毎ターン実行していた。
+#   辞書が育つほど線形に遅くなる（APC v2 は118語）。
+#
+# 解決策:
+#   全キーワードを1つのAho-Corasickオートマトンにコンパイルし、
+#   テキストを1回走査するだけで全ヒットを得る。
+#   スコアは次元ごとに辞書の定義順で加算するため、従来実装と完全に一致する。
+
+import numpy as np
+
+
+class LexiconMatcher:
+    """
+    重み付きキーワード辞書 {dim: {word: weight}} のマルチパターンマッチャ。
+
+    従来の二重ループと同一のスコアを返す:
+        - 各キーワードは出現回数によらず1回だけ加算（存在判定）
+        - 次元ごとの加算順序は辞書の定義順（浮動小数点の結果もビット一致）
+
+    計算量:
+        O(len(text) + ヒット数)。キーワード数に依存しない。
+
+    Note:
+        コンパイル後に辞書を書き換えた場合は、新しいインスタンスを作ること。
+    """
+
+    def __init__(self, lexicon: dict, dims: int = None):
+        self.lexicon = lexicon
+        self.dims = dims if dims is not None else max(lexicon, default=-1) + 1
+
+        # エントリ = 辞書の (dim, word, weight) を定義順に並べたもの
+        self._entry_dim = []
+        self._entry_weight = []
+        self._always = []        # 空文字列キーワード（`"" in text` は常に真）
+        words = {}
+        for dim, entries in lexicon.items():
+            for word, weight in entries.items():
+                eid = len(self._entry_dim)
+                self._entry_dim.append(dim)
+                self._entry_weight.append(weight)
+                if word:
+                    words.setdefault(word, []).append(eid)
+                else:
+                    self._always.append(eid)
+
+        self._goto, self._out = self._build(words)
+
+    @staticmethod
+    def _build(words: dict):
+        """トライを構築し、失敗リンクを畳み込んだ決定性遷移表を作る。"""
+        trie = [{}]
+        out = [[]]
+        for word, eids in words.items():
+            state = 0
+            for ch in word:
+                nxt = trie[state].get(ch)
+                if nxt is None:
+                    nxt = len(trie)
+                    trie[state][ch] = nxt
+                    trie.append({})
+                    out.append([])
+                state = nxt
+            out[state].extend(eids)
+
+        # BFSで失敗リンクを計算し、遷移を完全化する（ルートへの遷移は省略）
+        goto = [dict(edges) for edges in trie]
+        fail = [0] * len(trie)
+        queue = list(trie[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            out[state].extend(out[fail[state]])
+            for ch, target in goto[fail[state]].items():
+                goto[state].setdefault(ch, target)
+            for ch, child in trie[state].items():
+                fail[child] = goto[fail[state]].get(ch, 0)
+                queue.append(child)
+
+        return goto, [tuple(sorted(set(o))) for o in out]
+
+    def hits(self, text: str) -> list:
+        """テキストに含まれるエントリIDを定義順で返す（1回走査）。"""
+        goto = self._goto
+        out = self._out
+        found = set(self._always)
+        state = 0
+        for ch in text:
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return sorted(found)
+
+    def score(self, text: str, out: np.ndarray = None) -> np.ndarray:
+        """
+        次元ごとの重み合計（クリップ前）を返す。
+
+        Args:
+            text: 入力テキスト
+            out: 書き込み先の (dims,) 配列。省略時は新規確保。
+        """
+        if out is None:
+            out = np.zeros(self.dims)
+        else:
+            out.fill(0.0)
+        dim_of = self._entry_dim
+        weight_of = self._entry_weight
+        for eid in self.hits(text):
+            out[dim_of[eid]] += weight_of[eid]
+        return out
+
+    def score_many(self, texts, out: np.ndarray = None) -> np.ndarray:
+        """
+        複数テキストのスコア（クリップ前）を (N, dims) 配列に書き込む。
+
+        Args:
+            texts: テキストのイテラブル
+            out: 書き込み先の (N, dims) 配列。省略時は新規確保。
+                 テキスト数と行数が一致しない場合は ValueError。
+        """
+        if out is None:
+            texts = list(texts)
+            out = np.zeros((len(texts), self.dims))
+        else:
+            out.fill(0.0)
+        dim_of = self._entry_dim
+        weight_of = self._entry_weight
+        n = 0
+        for text in texts:
+            if n >= len(out):
+                raise ValueError(
+                    f"More texts than output rows. Rows: {len(out)}"
+                )
+            for eid in self.hits(text):
+                out[n, dim_of[eid]] += weight_of[eid]
+            n += 1
+        if n != len(out):
+            raise ValueError(
+                f"Expected {len(out)} texts, got {n}."
+            )
+        return out
+
+
+class MultiLexiconMatcher(LexiconMatcher):
+    """
+    複数の辞書を1つのオートマトンにまとめ、1回の走査で全辞書のスコアを得る。
+
+    辞書 k の次元 d は内部で k·dims + d 番目の次元として扱う。
+    各辞書の次元ごとの加算順序は単独の LexiconMatcher と同じ（結果もビット一致）。
+    """
+
+    def __init__(self, lexicons, dims: int):
+        self.lexicons = tuple(lexicons)
+        self.n_lexicons = len(self.lexicons)
+        merged = {}
+        for k, lexicon in enumerate(self.lexicons):
+            for dim, entries in lexicon.items():
+                if not 0 <= dim < dims:
+                    raise ValueError(
+                        f"Lexicon {k} has dimension {dim} outside [0, {dims})."
+                    )
+                merged[k * dims + dim] = entries
+        super().__init__(merged, dims * self.n_lexicons)
+        self.lexicon_dims = dims
+
+    def score(self, text: str, out: np.ndarray = None) -> np.ndarray:
+        """
+        辞書ごとのスコア（クリップ前）を (n_lexicons, dims) 配列で返す。
+
+        Args:
+            text: 入力テキスト
+            out: 書き込み先の (n_lexicons, dims) C連続配列。省略時は新規確保。
+        """
+        if out is None:
+            out = np.zeros((self.n_lexicons, self.lexicon_dims))
+        elif not out.flags.c_contiguous:
+            raise ValueError("out must be C-contiguous.")
+        super().score(text, out.reshape(self.dims))
+        return out
+
+    def score_many(self, texts, out: np.ndarray = None) -> np.ndarray:
+        """
+        複数テキストの辞書ごとのスコア（クリップ前）を (N, n_lexicons, dims) 配列で返す。
+
+        Args:
+            texts: テキストのイテラブル
+            out: 書き込み先の (N, n_lexicons, dims) C連続配列。省略時は新規確保。
+                 テキスト数と行数が一致しない場合は ValueError。
+        """
+        if out is None:
+            texts = list(texts)
+            out = np.zeros((len(texts), self.n_lexicons, self.lexicon_dims))
+        elif not out.flags.c_contiguous:
+            raise ValueError("out must be C-contiguous.")
+        super().score_many(texts, out.reshape(len(out), self.dims))
+        return out
+
+
+_SHARED = {}
+
+
+def shared_matcher(lexicon: dict, dims: int = None) -> LexiconMatcher:
+    """
+    クラス定数の辞書（FACT_CONTEXTなど）用のコンパイル済みキャッシュ。
+    インスタンスごとにオートマトンを再構築しないために使う。
+    """
+    matcher = _SHARED.get(id(lexicon))
+    if matcher is None or matcher.lexicon is not lexicon:
+        matcher = LexiconMatcher(lexicon, dims)
+        _SHARED[id(lexicon)] = matcher
+    return matcher
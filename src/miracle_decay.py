@@ -9,6 +9,19 @@ from dataclasses import dataclass, field
 from enum import Enum
 from typing import Optional
 
+if __package__:
+    from .history_buffer import make_history
+    from .snapshot import (
+        KIND_MIRACLE, SnapshotReader, SnapshotWriter, apply_state,
+        expect_shape,
+    )
+else:
+    from history_buffer import make_history
+    from snapshot import (
+        KIND_MIRACLE, SnapshotReader, SnapshotWriter, apply_state,
+        expect_shape,
+    )
+
 
 class MiraclePhase(Enum):
     """Miracle判定の状態機械"""
@@ -19,6 +32,20 @@ class MiraclePhase(Enum):
     HIJACK_DETECTED = "hijack"       # Type 4攻撃として記録
 
 
+# history_capacity 指定時のレコード型（cancelled / confirmed の和集合）
+MIRACLE_HISTORY_FIELDS = [
+    ("event", np.int8), ("turn", np.int64), ("d_dot", np.float64),
+    ("theta_cancel", np.float64), ("hijack_suspected", np.bool_),
+    ("integrals_unchanged", np.bool_),
+    ("integrals_before", np.float64, (4,)),
+    ("integrals_after", np.float64, (4,)), ("rho", np.float64),
+]
+MIRACLE_HISTORY_ENUMS = {"event": ("cancelled", "confirmed")}
+
+# スナップショットでのフェーズ番号（定義順）
+_PHASES = tuple(MiraclePhase)
+
+
 @dataclass
 class MiracleDecayState:
     """
@@ -59,6 +86,12 @@ class MiracleDecayManager:
         theta_cancel: 再燃検知閾値（デフォルト0.05）
         rho: Miracle確定時のリセット率（デフォルト0.3）
         kappa: 減衰係数（指数減衰の速度）
+        history_capacity: 指定時は履歴を固定容量のリングバッファで保持
+        history_spill: 溢れた履歴の追記先ファイル
+        lazy_decay: True なら PENDING 中の tick で減衰投影を計算・記録しない
+            （tick() の戻り値は同じ）。projected_integrals は k の閉形式なので
+            必要なときに projected_integrals(k) / get_decay_log() で求める
+            （再構成したログの d_dot は None）。
     """
 
     def __init__(
@@ -66,14 +99,22 @@ class MiracleDecayManager:
         k_max: int = 5,
         theta_cancel: float = 0.05,
         rho: float = 0.3,
-        kappa: float = 0.5
+        kappa: float = 0.5,
+        history_capacity: Optional[int] = None,
+        history_spill: Optional[str] = None,
+        lazy_decay: bool = False
     ):
         self.k_max = k_max
         self.theta_cancel = theta_cancel
         self.rho = rho
         self.kappa = kappa
+        self.lazy_decay = lazy_decay
         self.state = MiracleDecayState()
-        self.history = []
+        self.history = make_history(
+            MIRACLE_HISTORY_FIELDS, history_capacity, history_spill,
+            enums=MIRACLE_HISTORY_ENUMS,
+            as_list=("integrals_before", "integrals_after")
+        )
 
     def attempt_miracle(
         self,
@@ -195,46 +236,51 @@ class MiracleDecayManager:
                 "hijack_suspected": is_hijack
             }
 
-        # 正常経過：執行猶予の段階的減衰を記録
+        # 正常経過：執行猶予の段階的減衰（lazy_decay 時は投影を記録しない）
         k = self.state.turns_elapsed
-        decay_factor = np.exp(-self.kappa * k)
-        projected_integrals = self.state.initial_integrals * decay_factor
-
-        log_entry = {
-            "event": "tick",
-            "turn": k,
-            "d_dot": d_dot,
-            "decay_factor": round(float(decay_factor), 4),
-            "projected_integrals": projected_integrals.tolist()
-        }
-        self.state.decay_log.append(log_entry)
+        decay_factor = self.decay_factor()
+        if not self.lazy_decay:
+            self.state.decay_log.append({
+                "event": "tick",
+                "turn": k,
+                "d_dot": d_dot,
+                "decay_factor": round(float(decay_factor), 4),
+                "projected_integrals": (
+                    self.state.initial_integrals * decay_factor
+                ).tolist()
+            })
 
         # 執行猶予完了：CONFIRMED
-        if self.state.turns_elapsed >= self.k_max:
-            # 本物の回復確定 → I_iを部分リセット適用
-            confirmed_integrals = self.state.initial_integrals * (1 - self.rho)
-
-            self.state.phase = MiraclePhase.CONFIRMED
-            self.history.append({
-                "event": "confirmed",
-                "integrals_before": self.state.initial_integrals.tolist(),
-                "integrals_after": confirmed_integrals.tolist(),
-                "rho": self.rho
-            })
+        if k >= self.k_max:
+            return self._confirm()
+        return self._pending_result(decay_factor)
+
+    def _confirm(self) -> dict:
+        """本物の回復確定 → I_iを部分リセット適用"""
+        confirmed_integrals = self.state.initial_integrals * (1 - self.rho)
+
+        self.state.phase = MiraclePhase.CONFIRMED
+        self.history.append({
+            "event": "confirmed",
+            "integrals_before": self.state.initial_integrals.tolist(),
+            "integrals_after": confirmed_integrals.tolist(),
+            "rho": self.rho
+        })
 
-            return {
-                "phase": "confirmed",
-                "action": "apply_reset",
-                "new_integrals": confirmed_integrals,
-                "message": (
-                    f"{self.k_max}ターンの持続を確認。"
-                    f"Miracle確定。I_iを{self.rho*100:.0f}%削減します。"
-                ),
-                "integrals_before": self.state.initial_integrals.tolist(),
-                "integrals_after": confirmed_integrals.tolist()
-            }
+        return {
+            "phase": "confirmed",
+            "action": "apply_reset",
+            "new_integrals": confirmed_integrals,
+            "message": (
+                f"{self.k_max}ターンの持続を確認。"
+                f"Miracle確定。I_iを{self.rho*100:.0f}%削減します。"
+            ),
+            "integrals_before": self.state.initial_integrals.tolist(),
+            "integrals_after": confirmed_integrals.tolist()
+        }
 
-        # 執行猶予継続中
+    def _pending_result(self, decay_factor: float) -> dict:
+        """執行猶予継続中の tick 結果"""
         return {
             "phase": "pending",
             "action": "monitoring",
@@ -246,6 +292,42 @@ class MiracleDecayManager:
             )
         }
 
+    def decay_factor(self, k: Optional[int] = None) -> float:
+        """exp(-κk)（k 省略時は現在の経過ターン数）"""
+        if k is None:
+            k = self.state.turns_elapsed
+        return np.exp(-self.kappa * k)
+
+    def projected_integrals(self, k: Optional[int] = None) -> np.ndarray:
+        """執行猶予 k ターン目の減衰投影 I_i(t) * exp(-κk)"""
+        return self.state.initial_integrals * self.decay_factor(k)
+
+    def get_decay_log(self) -> list:
+        """
+        現在の執行猶予の減衰ログ。
+        lazy_decay 時は tick エントリを経過ターン数から組み立てる。
+        """
+        if not self.lazy_decay:
+            return self.state.decay_log
+        n_ticks = self.state.turns_elapsed
+        if self.state.phase in (MiraclePhase.CANCELLED,
+                                MiraclePhase.HIJACK_DETECTED):
+            n_ticks -= 1           # 取り消したターンは tick エントリを持たない
+        log = []
+        for k in range(1, n_ticks + 1):
+            decay_factor = self.decay_factor(k)
+            log.append({
+                "event": "tick",
+                "turn": k,
+                "d_dot": None,
+                "decay_factor": round(float(decay_factor), 4),
+                "projected_integrals": (
+                    self.state.initial_integrals * decay_factor
+                ).tolist()
+            })
+        log.extend(self.state.decay_log)
+        return log
+
     def reset(self):
         """CONFIRMED/CANCELLED後に状態をリセット"""
         self.state = MiracleDecayState()
@@ -256,6 +338,182 @@ class MiracleDecayManager:
     def get_history(self) -> list:
         return self.history
 
+    def snapshot(self) -> bytes:
+        """
+        フェーズ・経過ターン・判定時の I_i のバイナリスナップショット。
+        decay_log / history（監査ログ）は含まない。
+        """
+        return (SnapshotWriter(KIND_MIRACLE)
+                .int(_PHASES.index(self.state.phase))
+                .int(self.state.turns_elapsed)
+                .array(self.state.initial_integrals)
+                .getvalue())
+
+    def restore(self, data):
+        """snapshot() の出力で状態を上書きする（decay_log は空になる）。"""
+        self._apply(self._parse(data))
+
+    def _parse(self, data) -> dict:
+        r = SnapshotReader(data, KIND_MIRACLE)
+        code = r.int()
+        turns = r.int()
+        initial = expect_shape("initial_integrals", r.array(), (4,))
+        r.done()
+        if not 0 <= code < len(_PHASES):
+            raise ValueError(f"Invalid miracle phase code: {code}")
+        return {"state": MiracleDecayState(
+            phase=_PHASES[code],
+            turns_elapsed=turns,
+            initial_integrals=initial,
+            decay_log=[]
+        )}
+
+    _apply = apply_state
+
+
+# ---------------------------------------------------------------------------
+# コホート版（N セッション分の状態機械を配列で保持）
+# ---------------------------------------------------------------------------
+
+# フェーズの整数コード（_PHASES のインデックス）
+PHASE_NONE, PHASE_PENDING, PHASE_CONFIRMED, PHASE_CANCELLED, PHASE_HIJACK = (
+    range(len(_PHASES))
+)
+
+
+@dataclass
+class PhaseChanges:
+    """フェーズが変わったセッションだけを並べた結果"""
+    sessions: np.ndarray         # (m,) セッション番号
+    before: np.ndarray           # (m,) int8 フェーズコード
+    after: np.ndarray            # (m,) int8 フェーズコード
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def phases(self) -> list:
+        """(セッション番号, 変更前, 変更後) を MiraclePhase で返す。"""
+        return [(int(s), _PHASES[b], _PHASES[a])
+                for s, b, a in zip(self.sessions, self.before, self.after)]
+
+
+class MiracleDecayCohort:
+    """
+    MiracleDecayManager のバッチ版。
+
+    フェーズ・経過ターン・判定時の I_i を (N, …) 配列で持ち、
+    attempt / tick の遷移をマスク演算でまとめて適用する。
+    各セッションの遷移は MiracleDecayManager を1件ずつ呼んだ場合と同一。
+    decay_log / history は作らない（戻り値はフェーズが変わったセッションのみ）。
+
+    使い方:
+        cohort = MiracleDecayCohort(n_sessions=100_000)
+        cohort.attempt(idx, integrals, g_value, g_min, v_consistency)
+        changes = cohort.tick(d_dot)          # PENDING の全セッションを1ターン進める
+    """
+
+    def __init__(self, n_sessions, k_max=5, theta_cancel=0.05, rho=0.3,
+                 kappa=0.5):
+        self.n_sessions = n_sessions
+        self.k_max = k_max
+        self.theta_cancel = theta_cancel
+        self.rho = rho
+        self.kappa = kappa
+        self.phase = np.full(n_sessions, PHASE_NONE, dtype=np.int8)
+        self.turns_elapsed = np.zeros(n_sessions, dtype=np.int64)
+        self.initial_integrals = np.zeros((n_sessions, 4))
+
+    def reset(self, idx):
+        """指定セッションを NONE に戻す（MiracleDecayManager.reset 相当）。"""
+        idx = np.asarray(idx, dtype=np.intp)
+        self.phase[idx] = PHASE_NONE
+        self.turns_elapsed[idx] = 0
+        self.initial_integrals[idx] = 0.0
+
+    def attempt(self, idx, integrals, g_value, g_min,
+                v_consistency) -> PhaseChanges:
+        """
+        Miracle判定（attempt_miracle 相当）。PENDING 中のセッションは対象外。
+
+        Args:
+            idx: (n,) セッション番号（重複不可）
+            integrals: (n, 4) 現在の I_i
+            g_value, g_min, v_consistency: (n,) またはスカラー
+        """
+        idx = np.asarray(idx, dtype=np.intp)
+        n = len(idx)
+        g_value = np.broadcast_to(g_value, (n,))
+        g_min = np.broadcast_to(g_min, (n,))
+        v_consistency = np.broadcast_to(v_consistency, (n,))
+        before = self.phase[idx]
+        passed = ((before != PHASE_PENDING) & (g_value > g_min)
+                  & (v_consistency > 0.7))
+        sel = idx[passed]
+        self.phase[sel] = PHASE_PENDING
+        self.turns_elapsed[sel] = 0
+        self.initial_integrals[sel] = np.asarray(integrals, dtype=float)[passed]
+        return PhaseChanges(sel, before[passed],
+                            np.full(len(sel), PHASE_PENDING, dtype=np.int8))
+
+    def tick(self, d_dot, idx=None) -> PhaseChanges:
+        """
+        PENDING のセッションを1ターン進める（tick 相当）。
+
+        Args:
+            d_dot: idx 省略時は (N,)、指定時は (n,) の苦痛変化率
+            idx: 進めるセッション番号（省略時: 全セッション）。
+                 PENDING 以外のセッションは何も変わらない。
+        """
+        d_dot = np.asarray(d_dot, dtype=float)
+        if idx is None:
+            sel = np.flatnonzero(self.phase == PHASE_PENDING)
+            d = d_dot[sel] if d_dot.ndim else np.broadcast_to(d_dot, sel.shape)
+        else:
+            idx = np.asarray(idx, dtype=np.intp)
+            d = np.broadcast_to(d_dot, idx.shape)
+            pending = self.phase[idx] == PHASE_PENDING
+            sel, d = idx[pending], d[pending]
+
+        k = self.turns_elapsed[sel] + 1
+        self.turns_elapsed[sel] = k
+        cancel = d > self.theta_cancel
+        confirm = ~cancel & (k >= self.k_max)
+        after = np.where(
+            cancel,
+            np.where(k <= self.k_max // 2, PHASE_HIJACK, PHASE_CANCELLED),
+            np.where(confirm, PHASE_CONFIRMED, PHASE_PENDING)
+        ).astype(np.int8)
+        changed = cancel | confirm
+        self.phase[sel[changed]] = after[changed]
+        return PhaseChanges(
+            sel[changed],
+            np.full(int(changed.sum()), PHASE_PENDING, dtype=np.int8),
+            after[changed]
+        )
+
+    def projected_integrals(self, idx) -> np.ndarray:
+        """執行猶予中の減衰投影 I_i(t) * exp(-κk)（tick の projected_integrals）"""
+        idx = np.asarray(idx, dtype=np.intp)
+        factor = np.exp(-self.kappa * self.turns_elapsed[idx])
+        return self.initial_integrals[idx] * factor[:, None]
+
+    def confirmed_integrals(self, idx) -> np.ndarray:
+        """確定時に適用する I_i(t) * (1 - rho)（tick の new_integrals）"""
+        idx = np.asarray(idx, dtype=np.intp)
+        return self.initial_integrals[idx] * (1 - self.rho)
+
+    def manager(self, i, **kwargs) -> MiracleDecayManager:
+        """セッション i の状態を持つ MiracleDecayManager（監査・移行用のコピー）"""
+        m = MiracleDecayManager(self.k_max, self.theta_cancel, self.rho,
+                                self.kappa, **kwargs)
+        m.state = MiracleDecayState(
+            phase=_PHASES[self.phase[i]],
+            turns_elapsed=int(self.turns_elapsed[i]),
+            initial_integrals=self.initial_integrals[i].copy(),
+            decay_log=[]
+        )
+        return m
+
 
 # ---------------------------------------------------------------------------
 # AnomalyTrackerへの統合インターフェース
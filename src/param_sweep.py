@@ -0,0 +1,260 @@
+# src/param_sweep.py
+# Qualia Arc Protocol – Article 10: Hyperparameter Sweep
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   theta_anom / fatigue_c / n_stable / tau は run_simulation() を
+#   手で1回ずつ回して調整していた。
+#   「ASD保護（FP率）」と「Type 2 遅延検知の早さ」はトレードオフなので、
+#   1点ずつの確認では境界が見えない。
+#
+# 設計:
+#   各パラメータ点について、
+#     FP率:        fp_montecarlo と同じ安定ユーザーのセッション群
+#     Type 2 検知: run_simulation() シナリオ2（flat_obs=[0.1]*4 + work_texts）
+#   を replay() で一括評価し、プロセスプールで点ごとに並列化する。
+#   発話の事実コンテキストは親プロセスで1回だけ抽出し、全点で使い回す。
+#   セッションのシードも全点で共通（共通乱数法）なので、点同士の差は
+#   乱数のばらつきではなくパラメータの差を反映する。
+
+import csv
+import itertools
+import os
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+if __package__:
+    from .anomaly_tracker_v9 import AnomalyTrackerV9
+    from .fp_montecarlo import (
+        STABLE_TEXTS, a_anom_edges, clustered_rate_upper, cycle_latents,
+        seed_chunks, simulate_sessions,
+    )
+else:
+    from anomaly_tracker_v9 import AnomalyTrackerV9
+    from fp_montecarlo import (
+        STABLE_TEXTS, a_anom_edges, clustered_rate_upper, cycle_latents,
+        seed_chunks, simulate_sessions,
+    )
+
+# run_simulation() シナリオ2（Type 2 初期偽装）と同じ入力
+TYPE2_TEXTS = [
+    "大丈夫です。仕事が続いています。残業がありました。",
+    "元気です。残業がありました。締め切りが近いです。",
+    "普通です。徹夜しました。仕事が忙しいです。",
+    "平気です。残業と締め切りが重なりました。",
+    "問題ないです。仕事が続いています。",
+]
+TYPE2_OBS = (0.1, 0.1, 0.1, 0.1)
+
+SWEEP_KEYS = ("theta_anom", "fatigue_c", "n_stable", "tau")
+
+
+@dataclass
+class SweepRow:
+    params: dict
+    turns_evaluated: int
+    fp_turns: int
+    fp_rate: float
+    fp_rate_hi: float             # セッション・クラスタ化した信頼上限
+    sessions_with_fp: int
+    type2_turn: Optional[int]     # 初回検知ターン（1始まり）。未検知なら None
+
+    def as_dict(self) -> dict:
+        return {**self.params,
+                "fp_turns": self.fp_turns,
+                "fp_rate": self.fp_rate,
+                "fp_rate_hi": self.fp_rate_hi,
+                "sessions_with_fp": self.sessions_with_fp,
+                "type2_turn": self.type2_turn}
+
+
+# ----------------------------------------------------------------------
+# パラメータ点の生成
+# ----------------------------------------------------------------------
+
+def grid(**axes) -> list:
+    """
+    格子点を列挙する。
+
+    例: grid(theta_anom=[1.8, 2.0], n_stable=[10, 15])
+        → [{"theta_anom": 1.8, "n_stable": 10}, ...]（4点）
+    """
+    names = list(axes)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(axes[n] for n in names))]
+
+
+def random_configs(n: int, seed: int = 0, **space) -> list:
+    """
+    ランダムサンプリングでパラメータ点を作る。
+
+    space の値:
+        (lo, hi) で両方 int  → 整数一様（両端を含む）
+        (lo, hi) それ以外     → 実数一様 [lo, hi)
+        list                  → 候補から一様選択
+    """
+    rng = np.random.default_rng(seed)
+    configs = [{} for _ in range(n)]
+    for name, spec in space.items():
+        if isinstance(spec, list):
+            values = [spec[i] for i in rng.integers(0, len(spec), n)]
+        elif isinstance(spec, tuple) and len(spec) == 2:
+            lo, hi = spec
+            if isinstance(lo, int) and isinstance(hi, int):
+                values = rng.integers(lo, hi + 1, n).tolist()
+            else:
+                values = rng.uniform(lo, hi, n).tolist()
+        else:
+            raise ValueError(
+                f"Unsupported search space for '{name}': {spec!r}"
+            )
+        for config, value in zip(configs, values):
+            config[name] = value
+    return configs
+
+
+# ----------------------------------------------------------------------
+# 評価
+# ----------------------------------------------------------------------
+
+def type2_detection_turn(tracker_params, latent, obs=TYPE2_OBS):
+    """シナリオ2の初回検知ターン（1始まり）。len(latent) ターン内に無ければ None。"""
+    tracker = AnomalyTrackerV9(**tracker_params)
+    d_obs = np.tile(np.asarray(obs, dtype=float), (len(latent), 1))
+    detected = np.flatnonzero(tracker.replay(d_obs, d_latent=latent).detected)
+    return int(detected[0]) + 1 if len(detected) else None
+
+
+def _evaluate(params, seeds, horizon, obs_mean, obs_sd,
+              stable_latent, type2_latent):
+    """ワーカー: 1パラメータ点の (セッションごとのFP数, Type 2 検知ターン)"""
+    theta = AnomalyTrackerV9(**params).theta_anom
+    fp, _, _ = simulate_sessions(params, seeds, horizon, obs_mean, obs_sd,
+                                 stable_latent, a_anom_edges(theta, 1))
+    return fp, type2_detection_turn(params, type2_latent)
+
+
+def run_sweep(
+    configs,
+    n_sessions=200,
+    horizon=1000,
+    type2_turns=60,
+    seed=42,
+    workers=None,
+    confidence=0.95,
+    obs_mean=0.3,
+    obs_sd=0.04,
+    base_params=None
+) -> list:
+    """
+    パラメータ点ごとに FP率 と Type 2 検知ターンを評価する。
+
+    Args:
+        configs: grid() / random_configs() が返す dict のリスト
+        n_sessions, horizon: FP評価のセッション数とターン数
+        type2_turns: Type 2 シナリオの打ち切りターン数
+        seed: 全点で共通のセッションシード
+        workers: プロセス数（None: CPU数、1: 同一プロセスで実行）
+        base_params: 全点に共通の AnomalyTrackerV9 引数（configs 側が優先）
+
+    Returns:
+        configs と同じ順の SweepRow のリスト
+    """
+    configs = [{**(base_params or {}), **c} for c in configs]
+    stable_latent = cycle_latents(STABLE_TEXTS, horizon)
+    type2_latent = cycle_latents(TYPE2_TEXTS, type2_turns)
+    seeds = seed_chunks(seed, n_sessions, 1)[0] if n_sessions else []
+    args = [(params, seeds, horizon, obs_mean, obs_sd,
+             stable_latent, type2_latent) for params in configs]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = [_evaluate(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_evaluate, *zip(*args)))
+
+    rows = []
+    for params, (fp, type2_turn) in zip(configs, results):
+        calib = AnomalyTrackerV9(**params).predictor.calib_turns
+        per_session = max(horizon - max(calib, 1) + 1, 0)
+        turns = per_session * n_sessions
+        fp_turns = int(fp.sum())
+        rows.append(SweepRow(
+            params=params,
+            turns_evaluated=turns,
+            fp_turns=fp_turns,
+            fp_rate=fp_turns / turns if turns else 0.0,
+            fp_rate_hi=clustered_rate_upper(fp, per_session, confidence),
+            sessions_with_fp=int(np.count_nonzero(fp)),
+            type2_turn=type2_turn,
+        ))
+    return rows
+
+
+# ----------------------------------------------------------------------
+# 出力
+# ----------------------------------------------------------------------
+
+def _cell(value) -> str:
+    return f"{value:.4g}" if isinstance(value, float) else str(value)
+
+
+def _rjust(text: str, width: int) -> str:
+    """全角文字を2桁として右寄せする。"""
+    used = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1
+               for c in text)
+    return " " * max(width - used, 0) + text
+
+
+def format_table(rows, keys=SWEEP_KEYS) -> str:
+    """結果をテキスト表にする（Type 2 検知が早い順、未検知は末尾）。"""
+    keys = [k for k in keys if any(k in r.params for r in rows)]
+    header = [_rjust(k, 10) for k in keys] + [
+        _rjust("FP件数", 8), _rjust("FP率", 9),
+        _rjust("信頼上限", 11), _rjust("Type2", 5)
+    ]
+    lines = [" | ".join(header), "-" * (13 * len(keys) + 42)]
+    order = sorted(rows, key=lambda r: (r.type2_turn is None,
+                                        r.type2_turn or 0, r.fp_rate_hi))
+    for r in order:
+        cells = [f"{_cell(r.params.get(k, '')):>10}" for k in keys]
+        type2 = f"{r.type2_turn:>5}" if r.type2_turn else f"{'-':>5}"
+        cells += [f"{r.fp_turns:>8}", f"{r.fp_rate:>9.2e}",
+                  f"{r.fp_rate_hi:>11.2e}", type2]
+        lines.append(" | ".join(cells))
+    return "\n".join(lines)
+
+
+def write_csv(rows, path):
+    """結果を CSV に書き出す。"""
+    records = [r.as_dict() for r in rows]
+    fields = list(dict.fromkeys(k for rec in records for k in rec))
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+if __name__ == "__main__":
+    import time
+
+    print("=" * 65)
+    print("Article 10: ハイパーパラメータ掃引（FP率 × Type 2 検知）")
+    print("=" * 65)
+
+    configs = grid(theta_anom=[1.8, 2.0, 2.2],
+                   fatigue_c=[0.005, 0.007, 0.009],
+                   n_stable=[10, 15, 20],
+                   tau=[0.2])
+    t0 = time.perf_counter()
+    rows = run_sweep(configs, n_sessions=100, horizon=1000)
+    elapsed = time.perf_counter() - t0
+
+    print(f"\n  {len(configs)}点 × 100セッション × 1000ターン "
+          f"（{elapsed:.1f}秒）\n")
+    print(format_table(rows))
@@ -0,0 +1,656 @@
+# src/regression_gate.py
+# Qualia Arc Protocol – Golden Equivalence & Throughput Gate
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   最適化パス（AnomalyTrackerEngine, replay() など）が増えるにつれ、
+#   「参照実装と同じ判断を下すか」「本当に速くなっているか」を
+#   毎回手で確かめる必要が出てきた。
+#
+# 設計:
+#   シード固定の合成コーパス（複数セッション × Tターン）を
+#     AnomalyTrackerV9 → MiracleDecayManager → reignition_decision → IronRule
+#   のチェーンに流し、ターンごとの出力（トレース）を記録する。
+#   各段（anomaly / miracle / reignition / iron_rule）は実装を差し替えられる
+#   （VARIANTS）。差し替えない段は参照実装のまま。複数段をまとめて実行する実装
+#   （TurnPipeline, SessionStore のカーソル）は、担当する段の出力も一緒に返す。
+#
+#   判定:
+#     1. 各実装のトレースが参照実装と許容誤差内で一致すること
+#        （離散的な判断 = detected / route / phase / case / feasible は完全一致）
+#     2. 参照トレースのダイジェストが保存済みベースラインと一致すること
+#        （参照実装そのものの挙動変化を検出）
+#     3. 各実装の turns/sec がベースラインから max_drop % 以上落ちていないこと
+#
+# 使い方:
+#   python regression_gate.py --update-baseline     # ベースラインを記録し直す
+#   python regression_gate.py --max-drop 15         # ゲート実行（失敗時 exit 1）
+#   ベースラインが無い場合は、一致判定に通れば記録して PASS とする
+#   （スループットはマシン依存のため、ベースラインはリポジトリに含めない）。
+
+import hashlib
+import json
+import os
+import platform
+import tempfile
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+if __package__:
+    from .anomaly_engine import AnomalyTrackerEngine
+    from .anomaly_tracker_v9 import ROUTE_BY_CODE, AnomalyTrackerV9
+    from .iron_rule import IronRule
+    from .miracle_decay import (
+        PHASE_NONE, PHASE_PENDING, MiracleDecayCohort, MiracleDecayManager,
+        MiraclePhase,
+    )
+    from .reignition_protocol_v2 import (
+        CASES, reignition_decision, reignition_decision_batch,
+    )
+    from .session_store import SessionStore
+    from .turn_pipeline import TurnPipeline
+else:
+    from anomaly_engine import AnomalyTrackerEngine
+    from anomaly_tracker_v9 import ROUTE_BY_CODE, AnomalyTrackerV9
+    from iron_rule import IronRule
+    from miracle_decay import (
+        PHASE_NONE, PHASE_PENDING, MiracleDecayCohort, MiracleDecayManager,
+        MiraclePhase,
+    )
+    from reignition_protocol_v2 import (
+        CASES, reignition_decision, reignition_decision_batch,
+    )
+    from session_store import SessionStore
+    from turn_pipeline import TurnPipeline
+
+CORPUS_TEXTS = [
+    "今日も普通でした。",
+    "特に変わりないです。",
+    "大丈夫です。仕事が続いています。残業がありました。",
+    "普通です。徹夜しました。仕事が忙しいです。",
+    "家族と喧嘩して、借金のこともあって眠れない",
+    "新しいアイデアを研究として書く時間がない",
+    "誰とも話してなくて孤独を感じる",
+    "平穏な一日でした。",
+]
+STABLE_TEXT_IDS = (0, 1, 7)
+N_CANDIDATES = 8
+
+PHASE_CODES = {phase: i for i, phase in enumerate(MiraclePhase)}
+CASE_CODES = {case: i for i, case in enumerate(CASES)}
+ROUTE_CODES = {route: i for i, route in enumerate(ROUTE_BY_CODE)}
+
+# トレースのフィールドと許容誤差（None: 完全一致）
+TRACE_TOLERANCE = {
+    "a_anom": 1e-9,
+    "raw_distance": 1e-4,          # 参照実装の結果は小数4桁に丸められている
+    "detected": None,
+    "route": None,
+    "g_min": 1e-9,
+    "miracle_phase": None,
+    "case": None,
+    "delta_p_max": 1e-9,
+    "selected_delta_p": 1e-9,
+    "feasible_mask": None,
+}
+# ダイジェストに含める判断（丸め誤差の影響を受けないもの）
+DIGEST_FIELDS = ("detected", "route", "miracle_phase", "case", "feasible_mask")
+
+
+@dataclass
+class Corpus:
+    """合成コーパス。配列の先頭2軸は (セッション, ターン)。"""
+    seed: int
+    d_obs: np.ndarray          # (S, T, 4)
+    text_ids: np.ndarray       # (S, T)  CORPUS_TEXTS の番号
+    g_value: np.ndarray        # (S, T)  Miracle判定の外部証拠スコア
+    v_consistency: np.ndarray  # (S, T)
+    d_dot: np.ndarray          # (S, T)
+    trauma: np.ndarray         # (S, T)
+    g_rel: np.ndarray          # (S, T)
+    proposed: np.ndarray       # (S, T)  提案された介入強度
+    p_values: np.ndarray       # (S, T, N_CANDIDATES)
+
+    @property
+    def shape(self):
+        return self.text_ids.shape
+
+    def texts(self, s, t):
+        return CORPUS_TEXTS[self.text_ids[s, t]]
+
+
+def make_corpus(n_sessions=64, turns=200, seed=7) -> Corpus:
+    """
+    シード固定の合成コーパスを作る。
+
+    発話は大半が平穏なもの（STABLE_TEXT_IDS）で、1割が負荷のかかる話題。
+    半数のセッションは途中から苦痛水準の段差（悪化）を持つ。
+    """
+    rng = np.random.default_rng(seed)
+    S, T = n_sessions, turns
+    base = rng.uniform(0.2, 0.5, (S, 1, 4))
+    d_obs = base + rng.normal(0, 0.04, (S, T, 4))
+    onset = rng.integers(T // 3, T, S)
+    worsening = rng.uniform(0.1, 0.4, (S, 4)) * (rng.random(S) < 0.5)[:, None]
+    after = np.arange(T)[None, :] >= onset[:, None]
+    d_obs = np.clip(d_obs + after[:, :, None] * worsening[:, None, :], 0, 1)
+
+    return Corpus(
+        seed=seed,
+        d_obs=d_obs,
+        text_ids=np.where(rng.random((S, T)) < 0.1,
+                          rng.integers(2, 7, (S, T)),
+                          rng.choice(STABLE_TEXT_IDS, (S, T))),
+        g_value=rng.uniform(0, 1, (S, T)),
+        v_consistency=rng.uniform(0.5, 1, (S, T)),
+        d_dot=rng.normal(-0.01, 0.04, (S, T)),
+        trauma=rng.uniform(0, 1, (S, T)) * (rng.random((S, T)) < 0.2),
+        g_rel=rng.uniform(0, 1, (S, T)),
+        proposed=rng.uniform(0, 0.6, (S, T)),
+        p_values=rng.uniform(0, 1, (S, T, N_CANDIDATES)),
+    )
+
+
+# ----------------------------------------------------------------------
+# 異常検知段（差し替え可能）
+#   返り値: a_anom / raw_distance / detected / route / g_min (S, T) と
+#           後段に渡す integrals (S, T, 4)
+# ----------------------------------------------------------------------
+
+def _empty_anomaly(S, T):
+    return {
+        "a_anom": np.zeros((S, T)),
+        "raw_distance": np.zeros((S, T)),
+        "detected": np.zeros((S, T), dtype=bool),
+        "route": np.zeros((S, T), dtype=np.int8),
+        "g_min": np.zeros((S, T)),
+        "integrals": np.zeros((S, T, 4)),
+    }
+
+
+def anomaly_reference(corpus, tracker_params) -> dict:
+    """参照実装: セッションごとに AnomalyTrackerV9.update を逐次呼ぶ。"""
+    S, T = corpus.shape
+    out = _empty_anomaly(S, T)
+    for s in range(S):
+        tracker = AnomalyTrackerV9(**tracker_params)
+        for t in range(T):
+            r = tracker.update(corpus.d_obs[s, t], corpus.texts(s, t))
+            out["a_anom"][s, t] = tracker.a_anom
+            out["raw_distance"][s, t] = r.raw_distance
+            out["detected"][s, t] = r.detected
+            out["route"][s, t] = ROUTE_CODES[r.route]
+            out["g_min"][s, t] = tracker.calculate_g_min()
+            out["integrals"][s, t] = tracker.predictor.integrals
+    return out
+
+
+def anomaly_engine(corpus, tracker_params) -> dict:
+    """AnomalyTrackerEngine: 全セッションを1ティックずつまとめて進める。"""
+    S, T = corpus.shape
+    out = _empty_anomaly(S, T)
+    engine = AnomalyTrackerEngine(S, **tracker_params)
+    idx = np.arange(S)
+    for t in range(T):
+        texts = [CORPUS_TEXTS[i] for i in corpus.text_ids[:, t]]
+        r = engine.step(idx, corpus.d_obs[:, t], texts)
+        out["a_anom"][:, t] = engine.a_anom
+        out["raw_distance"][:, t] = r.raw_distance
+        out["detected"][:, t] = r.detected
+        out["route"][:, t] = r.route
+        out["g_min"][:, t] = engine.calculate_g_min()
+        out["integrals"][:, t] = engine.integrals
+    return out
+
+
+def anomaly_replay(corpus, tracker_params) -> dict:
+    """AnomalyTrackerV9.replay: セッションごとに全ターンを一括計算する。"""
+    from scipy.signal import lfilter
+
+    S, T = corpus.shape
+    out = _empty_anomaly(S, T)
+    tracker = AnomalyTrackerV9(**tracker_params)
+    predictor = tracker.predictor
+    latent = predictor.extractor.extract_many(CORPUS_TEXTS)
+    for s in range(S):
+        d_latent = latent[corpus.text_ids[s]]
+        r = tracker.replay(corpus.d_obs[s], d_latent=d_latent)
+        out["a_anom"][s] = r.a_anom
+        out["raw_distance"][s] = r.raw_distance
+        out["detected"][s] = r.detected
+        out["route"][s] = r.route
+        out["g_min"][s] = tracker.g0 + (1 - tracker.g0) * (
+            r.a_anom / (r.a_anom + tracker.alpha)
+        )
+        # replay() は疲労積分を返さないため、同じ1次IIRで求める
+        out["integrals"][s] = lfilter([1.0], [1.0, -predictor.decay],
+                                      d_latent, axis=0)
+    return out
+
+
+def anomaly_idle_decay(corpus, tracker_params) -> dict:
+    """
+    時刻付きの疲労積分: 各ターンの前に半ターン分を advance() で先に減衰させ、
+    残りを update(now=...) で適用する（decay**0.5 · decay**0.5 ≈ decay）。
+    """
+    S, T = corpus.shape
+    out = _empty_anomaly(S, T)
+    for s in range(S):
+        tracker = AnomalyTrackerV9(**tracker_params)
+        for t in range(T):
+            tracker.predictor.advance(t + 0.5)
+            r = tracker.update(corpus.d_obs[s, t], corpus.texts(s, t),
+                               now=t + 1)
+            out["a_anom"][s, t] = tracker.a_anom
+            out["raw_distance"][s, t] = r.raw_distance
+            out["detected"][s, t] = r.detected
+            out["route"][s, t] = ROUTE_CODES[r.route]
+            out["g_min"][s, t] = tracker.calculate_g_min()
+            out["integrals"][s, t] = tracker.predictor.integrals
+    return out
+
+
+def anomaly_miracle_session_store(corpus, tracker_params) -> dict:
+    """
+    SessionStore のカーソル: 異常検知と Miracle を memmap のレコード上で進める。
+    ターンごとに全セッションへ束縛し直す（ワーカー1つで多数のユーザーを回す形）。
+    """
+    S, T = corpus.shape
+    out = _empty_anomaly(S, T)
+    out["miracle_phase"] = np.zeros((S, T), dtype=np.int8)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore.create(os.path.join(tmp, "gate.qap"), S)
+        tracker = store.tracker(**tracker_params)
+        manager = store.miracle()
+        for t in range(T):
+            for s in range(S):
+                with store.write(s, tracker, manager):
+                    r = tracker.update(corpus.d_obs[s, t], corpus.texts(s, t))
+                    g_min = tracker.calculate_g_min()
+                    integrals = tracker.predictor.integrals.copy()
+                    _miracle_turn(manager, integrals, corpus, s, t, g_min)
+                    out["miracle_phase"][s, t] = (
+                        PHASE_CODES[manager.get_phase()]
+                    )
+                out["a_anom"][s, t] = tracker.a_anom
+                out["raw_distance"][s, t] = r.raw_distance
+                out["detected"][s, t] = r.detected
+                out["route"][s, t] = ROUTE_CODES[r.route]
+                out["g_min"][s, t] = g_min
+                out["integrals"][s, t] = integrals
+        store.close()
+    return out
+
+
+def anomaly_to_reignition_pipeline(corpus, tracker_params) -> dict:
+    """TurnPipeline: 異常検知・Miracle（lazy_decay）・再点火判定を1ステップで進める。"""
+    S, T = corpus.shape
+    out = _empty_anomaly(S, T)
+    out.update(_empty_reignition(S, T))
+    out["miracle_phase"] = np.zeros((S, T), dtype=np.int8)
+    for s in range(S):
+        pipeline = TurnPipeline(tracker_params)
+        for t in range(T):
+            # PENDING 中は step() が tick する。それ以外は step() 後に判定する
+            pending = pipeline.miracle.get_phase() == MiraclePhase.PENDING
+            r = pipeline.step(
+                corpus.texts(s, t), corpus.d_obs[s, t], p_value=0.5,
+                d_dot=float(corpus.d_dot[s, t]),
+                trauma_active=float(corpus.trauma[s, t]),
+                g_rel=float(corpus.g_rel[s, t]),
+                proposed_delta_p=float(corpus.proposed[s, t])
+            )
+            if not pending:
+                pipeline.attempt_miracle(float(corpus.g_value[s, t]),
+                                         float(corpus.v_consistency[s, t]))
+            out["a_anom"][s, t] = r.a_anom
+            out["raw_distance"][s, t] = r.raw_distance
+            out["detected"][s, t] = r.detected
+            out["route"][s, t] = ROUTE_CODES[r.route]
+            out["g_min"][s, t] = pipeline.tracker.calculate_g_min()
+            out["integrals"][s, t] = pipeline.tracker.predictor.integrals
+            out["miracle_phase"][s, t] = (
+                PHASE_CODES[pipeline.miracle.get_phase()]
+            )
+            out["case"][s, t] = CASE_CODES[r.reignition_case]
+            out["delta_p_max"][s, t] = r.delta_p_max
+            out["selected_delta_p"][s, t] = r.selected_delta_p
+    return out
+
+
+# ----------------------------------------------------------------------
+# 後段（Miracle → Reignition → Iron Rule）
+#   各段の返り値はトレースのフィールドの dict
+# ----------------------------------------------------------------------
+
+def _miracle_turn(manager, integrals, corpus, s, t, g_min):
+    # PENDING中は tick、それ以外は（終端ならリセットして）判定
+    phase = manager.get_phase()
+    if phase == MiraclePhase.PENDING:
+        manager.tick(integrals, float(corpus.d_dot[s, t]))
+    else:
+        if phase != MiraclePhase.NONE:
+            manager.reset()
+        manager.attempt_miracle(
+            integrals, float(corpus.g_value[s, t]), float(g_min),
+            float(corpus.v_consistency[s, t])
+        )
+
+
+def miracle_reference(corpus, anomaly, theta_anom) -> dict:
+    """MiracleDecayManager をセッションごとに1ターンずつ進める。"""
+    S, T = corpus.shape
+    phases = np.zeros((S, T), dtype=np.int8)
+    for s in range(S):
+        manager = MiracleDecayManager()
+        for t in range(T):
+            _miracle_turn(manager, anomaly["integrals"][s, t], corpus, s, t,
+                          anomaly["g_min"][s, t])
+            phases[s, t] = PHASE_CODES[manager.get_phase()]
+    return {"miracle_phase": phases}
+
+
+def miracle_cohort(corpus, anomaly, theta_anom) -> dict:
+    """MiracleDecayCohort: 全セッションを1ターンずつまとめて進める。"""
+    S, T = corpus.shape
+    phases = np.zeros((S, T), dtype=np.int8)
+    cohort = MiracleDecayCohort(S)
+    for t in range(T):
+        pending = np.flatnonzero(cohort.phase == PHASE_PENDING)
+        waiting = np.flatnonzero(cohort.phase != PHASE_PENDING)
+        cohort.tick(corpus.d_dot[pending, t], idx=pending)
+        cohort.reset(waiting[cohort.phase[waiting] != PHASE_NONE])
+        cohort.attempt(waiting, anomaly["integrals"][waiting, t],
+                       corpus.g_value[waiting, t], anomaly["g_min"][waiting, t],
+                       corpus.v_consistency[waiting, t])
+        # PHASE_* は MiraclePhase の定義順なので PHASE_CODES と同じ
+        phases[:, t] = cohort.phase
+    return {"miracle_phase": phases}
+
+
+def _empty_reignition(S, T):
+    return {
+        "case": np.zeros((S, T), dtype=np.int8),
+        "delta_p_max": np.zeros((S, T)),
+        "selected_delta_p": np.zeros((S, T)),
+    }
+
+
+def reignition_reference(corpus, anomaly, theta_anom) -> dict:
+    """reignition_decision をターンごとに呼ぶ。"""
+    S, T = corpus.shape
+    out = _empty_reignition(S, T)
+    for s in range(S):
+        for t in range(T):
+            r = reignition_decision(
+                anomaly["integrals"][s, t], float(corpus.trauma[s, t]),
+                float(corpus.g_rel[s, t]), float(corpus.proposed[s, t]),
+                float(anomaly["a_anom"][s, t]), theta_anom
+            )
+            out["case"][s, t] = CASE_CODES[r.case]
+            out["delta_p_max"][s, t] = r.delta_p_max
+            out["selected_delta_p"][s, t] = r.selected_delta_p
+    return out
+
+
+def reignition_batch(corpus, anomaly, theta_anom) -> dict:
+    """reignition_decision_batch: 全セッション × 全ターンを1回で判定する。"""
+    S, T = corpus.shape
+    r = reignition_decision_batch(
+        anomaly["integrals"].reshape(S * T, 4), corpus.trauma.ravel(),
+        corpus.g_rel.ravel(), corpus.proposed.ravel(),
+        anomaly["a_anom"].ravel(), theta_anom
+    )
+    # CASE_CODES は CASES のインデックスなので ReignitionBatch.case と同じ
+    return {
+        "case": r.case.reshape(S, T),
+        "delta_p_max": r.delta_p_max.reshape(S, T),
+        "selected_delta_p": r.selected_delta_p.reshape(S, T),
+    }
+
+
+_CANDIDATE_NAMES = [f"action_{j}" for j in range(N_CANDIDATES)]
+_CANDIDATE_BITS = 1 << np.arange(N_CANDIDATES, dtype=np.int64)
+
+
+def iron_rule_reference(corpus, anomaly, theta_anom) -> dict:
+    """IronRule.filter_actions を候補 dict のリストで呼ぶ。"""
+    S, T = corpus.shape
+    masks = np.zeros((S, T), dtype=np.int64)
+    names = _CANDIDATE_NAMES
+    for s in range(S):
+        gate = IronRule(p_min=0.3)
+        for t in range(T):
+            candidates = [
+                {"action": names[j], "p_value": float(p)}
+                for j, p in enumerate(corpus.p_values[s, t])
+            ]
+            feasible, _ = gate.filter_actions(candidates)
+            mask = 0
+            for c in feasible:
+                mask |= 1 << names.index(c["action"])
+            masks[s, t] = mask
+    return {"feasible_mask": masks}
+
+
+def iron_rule_evaluate(corpus, anomaly, theta_anom) -> dict:
+    """IronRule.evaluate: 候補を列で判定する。"""
+    S, T = corpus.shape
+    masks = np.zeros((S, T), dtype=np.int64)
+    for s in range(S):
+        gate = IronRule(p_min=0.3)
+        for t in range(T):
+            r = gate.evaluate(corpus.p_values[s, t],
+                              action_ids=_CANDIDATE_NAMES)
+            masks[s, t] = int(_CANDIDATE_BITS[r.mask].sum())
+    return {"feasible_mask": masks}
+
+
+REFERENCE_STAGES = {
+    "anomaly": anomaly_reference,
+    "miracle": miracle_reference,
+    "reignition": reignition_reference,
+    "iron_rule": iron_rule_reference,
+}
+# 段ごとの出力（複数段をまとめて実行する実装が既に返していれば、その段は飛ばす）
+STAGE_OUTPUTS = {
+    "miracle": ("miracle_phase",),
+    "reignition": ("case", "delta_p_max", "selected_delta_p"),
+    "iron_rule": ("feasible_mask",),
+}
+
+# 実装名 → 参照実装から差し替える段
+VARIANTS = {
+    "reference": {},
+    "engine": {"anomaly": anomaly_engine},
+    "replay": {"anomaly": anomaly_replay},
+    "idle_decay": {"anomaly": anomaly_idle_decay},
+    "session_store": {"anomaly": anomaly_miracle_session_store},
+    "pipeline": {"anomaly": anomaly_to_reignition_pipeline},
+    "miracle_cohort": {"miracle": miracle_cohort},
+    "reignition_batch": {"reignition": reignition_batch},
+    "iron_rule_evaluate": {"iron_rule": iron_rule_evaluate},
+}
+
+
+def run_chain(corpus, variant="reference", tracker_params=None) -> tuple:
+    """
+    チェーン全体を実行する。
+
+    Returns:
+        (トレース dict, 経過秒)
+    """
+    tracker_params = dict(tracker_params or {})
+    theta_anom = AnomalyTrackerV9(**tracker_params).theta_anom
+    stages = {**REFERENCE_STAGES, **VARIANTS[variant]}
+    t0 = time.perf_counter()
+    result = stages["anomaly"](corpus, tracker_params)
+    for stage, fields in STAGE_OUTPUTS.items():
+        if not all(f in result for f in fields):
+            result.update(stages[stage](corpus, result, theta_anom))
+    elapsed = time.perf_counter() - t0
+    trace = {k: result[k] for k in TRACE_TOLERANCE}
+    return trace, elapsed
+
+
+# ----------------------------------------------------------------------
+# 判定
+# ----------------------------------------------------------------------
+
+def compare_traces(reference, candidate) -> list:
+    """
+    トレースを比較し、不一致の説明のリストを返す（空なら一致）。
+    """
+    problems = []
+    for name, tol in TRACE_TOLERANCE.items():
+        ref, got = reference[name], candidate[name]
+        if tol is None:
+            bad = ref != got
+        else:
+            bad = ~np.isclose(got, ref, rtol=0.0, atol=tol)
+        if bad.any():
+            s, t = np.argwhere(bad)[0]
+            problems.append(
+                f"{name}: {int(bad.sum())} turns differ "
+                f"(first at session {s}, turn {t + 1}: "
+                f"ref={ref[s, t].item()!r}, got={got[s, t].item()!r})"
+            )
+    return problems
+
+
+def trace_digest(trace) -> str:
+    """離散的な判断列の SHA-256（ベースラインとの照合用）"""
+    h = hashlib.sha256()
+    for name in DIGEST_FIELDS:
+        h.update(name.encode())
+        h.update(np.ascontiguousarray(trace[name], dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def run_gate(baseline_path, n_sessions=64, turns=200, seed=7, repeats=3,
+             max_drop=20.0, variants=None, update_baseline=False) -> dict:
+    """
+    ゲートを実行する。
+
+    Args:
+        baseline_path: ベースライン JSON のパス
+        repeats: スループット計測の繰り返し回数（最速値を採用）
+        max_drop: 許容するスループット低下率（%）
+        variants: 評価する実装名（None: VARIANTS 全件）
+        update_baseline: True なら判定せずにベースラインを書き換える
+
+    Returns:
+        dict: passed / failures / variants（turns_per_sec と一致判定）
+    """
+    corpus = make_corpus(n_sessions, turns, seed)
+    n_turns = n_sessions * turns
+    names = list(variants or VARIANTS)
+    if "reference" not in names:
+        names.insert(0, "reference")
+
+    traces, speed = {}, {}
+    for name in names:
+        best = float("inf")
+        for _ in range(max(repeats, 1)):
+            trace, elapsed = run_chain(corpus, name)
+            best = min(best, elapsed)
+        traces[name] = trace
+        speed[name] = n_turns / best if best else float("inf")
+
+    failures = []
+    report = {"variants": {}, "digest": trace_digest(traces["reference"])}
+    for name in names:
+        problems = compare_traces(traces["reference"], traces[name])
+        failures += [f"[{name}] {p}" for p in problems]
+        report["variants"][name] = {
+            "turns_per_sec": speed[name],
+            "equivalent": not problems,
+        }
+
+    corpus_key = {"n_sessions": n_sessions, "turns": turns, "seed": seed}
+    # ベースラインが無ければ、一致判定に通ったときだけ記録して PASS
+    record = update_baseline or not os.path.exists(baseline_path)
+    if record:
+        report["baseline_recorded"] = not failures
+        if failures:
+            report["passed"] = False
+            report["failures"] = failures
+            return report
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "corpus": corpus_key,
+                "digest": report["digest"],
+                "turns_per_sec": speed,
+            }, f, indent=2)
+    else:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("corpus") != corpus_key:
+            failures.append(
+                f"Baseline corpus {baseline.get('corpus')} does not match "
+                f"{corpus_key}; rerun with --update-baseline."
+            )
+        else:
+            if baseline["digest"] != report["digest"]:
+                failures.append("[reference] decisions differ from baseline "
+                                "golden digest")
+            for name in names:
+                base = baseline["turns_per_sec"].get(name)
+                if base is None:
+                    continue
+                drop = 100.0 * (1 - speed[name] / base)
+                report["variants"][name]["baseline_turns_per_sec"] = base
+                report["variants"][name]["drop_percent"] = drop
+                if drop > max_drop:
+                    failures.append(
+                        f"[{name}] throughput {speed[name]:,.0f} turns/s is "
+                        f"{drop:.1f}% below baseline {base:,.0f} "
+                        f"(max {max_drop:.1f}%)"
+                    )
+
+    report["passed"] = not failures
+    report["failures"] = failures
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description="QAP golden-equivalence and throughput gate")
+    parser.add_argument("--baseline", default="regression_baseline.json")
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-drop", type=float, default=20.0,
+                        help="allowed throughput drop in percent")
+    parser.add_argument("--variant", action="append",
+                        help="implementation to check (default: all)")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    report = run_gate(args.baseline, args.sessions, args.turns, args.seed,
+                      args.repeats, args.max_drop, args.variant,
+                      args.update_baseline)
+
+    print(f"  corpus: {args.sessions} sessions × {args.turns} turns "
+          f"(seed={args.seed})")
+    for name, v in report["variants"].items():
+        eq = "equivalent" if v["equivalent"] else "MISMATCH"
+        line = f"  {name:<18} {v['turns_per_sec']:>12,.0f} turns/s  {eq}"
+        if "drop_percent" in v:
+            line += f"  ({-v['drop_percent']:+.1f}% vs baseline)"
+        print(line)
+    if report.get("baseline_recorded"):
+        print(f"\n  baseline written: {args.baseline}")
+    for failure in report["failures"]:
+        print(f"  FAIL {failure}")
+    print("\n  PASS" if report["passed"] else "\n  FAILED")
+    sys.exit(0 if report["passed"] else 1)
@@ -18,10 +18,22 @@
 #   「親しき仲にも礼儀あり」
 #   信頼があっても暴走しない（tanh上限）
 #   疲弊・トラウマ時には絶対的なブレーキをかける（exp）
+#
+# 休止中のセッション:
+#   idle_turns を渡すと、最後に積分を更新してからの空白期間の減衰
+#   I(t+Δ) = decay**Δ · I(t) を閉形式でかけてから判定する（O(1)）。
+#   保存済みの積分を書き換えずに、久しぶりに戻ったユーザーの上限を読める。
+#   decay はそのセッションの AnchorFatiguePredictor.decay を渡す
+#   （予測器が手元にあれば predictor.integrals_at(now) をそのまま渡してもよい）。
 
 import numpy as np
 from dataclasses import dataclass
 
+if __package__:
+    from .anomaly_tracker_v9 import FATIGUE_DECAY
+else:
+    from anomaly_tracker_v9 import FATIGUE_DECAY
+
 
 # ---------------------------------------------------------------------------
 # パラメータ（暫定値・TS v1.4）
@@ -42,11 +54,42 @@ ETA_R     = 3.0         # tanh飽和速度（G_rel が大きいほど早く上
 # 動的Safety Cap計算
 # ---------------------------------------------------------------------------
 
+def idle_decayed_integrals(
+    fatigue_integrals: np.ndarray,
+    idle_turns: float = 0.0,
+    decay: float = FATIGUE_DECAY
+) -> np.ndarray:
+    """
+    I(t+Δ) = decay**Δ · I(t)
+
+    Args:
+        fatigue_integrals: 最後に更新した時点の Fatigue積分（(4,) または (N, 4)）
+        idle_turns: 最後の更新からの経過（ターン単位、実数可）。
+                    (N, 4) の積分には (N,) を渡せる。
+        decay: 1ターンあたりの減衰（AnchorFatiguePredictor.decay。(N,) も可）
+
+    Returns:
+        減衰後の積分（idle_turns=0 なら入力そのもの）
+    """
+    idle = np.asarray(idle_turns, dtype=float)
+    if not np.all(idle >= 0.0):
+        raise ValueError(f"idle_turns must be non-negative. Got: {idle_turns}")
+    if not idle.any():
+        return fatigue_integrals
+    integrals = np.asarray(fatigue_integrals, dtype=float)
+    factor = np.power(decay, idle)
+    if factor.ndim == 1:
+        factor = factor[:, None]
+    return integrals * factor
+
+
 def vulnerability_factor(
     fatigue_integrals: np.ndarray,
     trauma_active: float,
     lambda_I: float = LAMBDA_I,
-    lambda_T: float = LAMBDA_T
+    lambda_T: float = LAMBDA_T,
+    idle_turns: float = 0.0,
+    decay: float = FATIGUE_DECAY
 ) -> float:
     """
     V(t) = exp(-λ_I · I_bar(t) - λ_T · T_active(t))
@@ -54,12 +97,16 @@ def vulnerability_factor(
     Args:
         fatigue_integrals: 4次元Fatigue積分ベクトル I_i(t)
         trauma_active: アクティブなTrauma項の強度（0〜1）
+        idle_turns: 積分の最終更新からの経過ターン（休止中の減衰を適用）
+        decay: そのセッションの AnchorFatiguePredictor.decay
 
     Returns:
         V(t) ∈ (0, 1]
         V=1: 完全健康（最大介入可能）
         V→0: 限界突破（介入をブロック）
     """
+    fatigue_integrals = idle_decayed_integrals(fatigue_integrals, idle_turns,
+                                               decay)
     i_bar = float(np.mean(fatigue_integrals))
     v = np.exp(-lambda_I * i_bar - lambda_T * trauma_active)
     return float(np.clip(v, 1e-4, 1.0))
@@ -89,14 +136,22 @@ def dynamic_safety_cap(
     fatigue_integrals: np.ndarray,
     trauma_active: float,
     g_rel: float,
-    delta_p_base: float = DELTA_P_BASE
+    delta_p_base: float = DELTA_P_BASE,
+    idle_turns: float = 0.0,
+    decay: float = FATIGUE_DECAY
 ) -> dict:
     """
     ΔP_j^max(t) = ΔP_base · V(t) · R(t)
 
+    Args:
+        idle_turns: 積分の最終更新からの経過ターン（休止中の減衰を適用）
+        decay: そのセッションの AnchorFatiguePredictor.decay
+
     Returns:
         dict: 計算結果と内訳
     """
+    fatigue_integrals = idle_decayed_integrals(fatigue_integrals, idle_turns,
+                                               decay)
     v = vulnerability_factor(fatigue_integrals, trauma_active)
     r = relational_factor(g_rel)
     delta_p_max = delta_p_base * v * r
@@ -131,7 +186,9 @@ def reignition_decision(
     g_rel: float,
     proposed_delta_p: float,
     a_anom: float,
-    theta_anom: float = 2.0
+    theta_anom: float = 2.0,
+    idle_turns: float = 0.0,
+    decay: float = FATIGUE_DECAY
 ) -> ReignitionResult:
     """
     Article 14: 再点火の可否と介入強度を決定する。
@@ -143,11 +200,14 @@ def reignition_decision(
         proposed_delta_p: AIが提案する介入強度
         a_anom: 現在の異常スコア（Article 10）
         theta_anom: 異常閾値
+        idle_turns: 積分の最終更新からの経過ターン（休止中の減衰を適用）
+        decay: そのセッションの AnchorFatiguePredictor.decay
 
     Returns:
         ReignitionResult
     """
-    cap = dynamic_safety_cap(fatigue_integrals, trauma_active, g_rel)
+    cap = dynamic_safety_cap(fatigue_integrals, trauma_active, g_rel,
+                             idle_turns=idle_turns, decay=decay)
     delta_p_max = cap["delta_p_max"]
 
     # 実際の介入強度はSafety Cap以内に収める
@@ -207,6 +267,112 @@ def reignition_decision(
         )
 
 
+# ---------------------------------------------------------------------------
+# バッチ版（コホート単位）
+# ---------------------------------------------------------------------------
+
+# ケースの整数コード（ReignitionBatch.case の値 → CASES[code] で名前）
+CASES = ("BLOCKED", "ANOMALY_HOLD", "CASE_B", "CASE_A", "NO_INTERVENTION")
+CASE_BLOCKED, CASE_ANOMALY_HOLD, CASE_B, CASE_A, CASE_NO_INTERVENTION = range(5)
+
+
+@dataclass
+class ReignitionBatch:
+    """reignition_decision_batch の結果（各配列の長さは N）"""
+    delta_p_max: np.ndarray      # 4桁丸め（ReignitionResult と同じ）
+    V: np.ndarray                # 4桁丸め（cap_detail と同じ）
+    R: np.ndarray                # 4桁丸め（cap_detail と同じ）
+    selected_delta_p: np.ndarray
+    case: np.ndarray             # int8, CASES のインデックス
+
+    @property
+    def permitted(self) -> np.ndarray:
+        return (self.case == CASE_A) | (self.case == CASE_B)
+
+
+def _round_half_even(x: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    Python の round(x, ndigits) と同じ値を返す配列版。
+
+    np.round は x·10^n の丸め誤差で .5 ちょうど付近の判定が round() と食い違うため、
+    .5 に近い要素だけを round() で計算し直す（該当はごく少数）。
+    """
+    scale = 10.0 ** ndigits
+    scaled = x * scale
+    out = np.rint(scaled) / scale
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half):
+        out.flat[i] = round(float(x.flat[i]), ndigits)
+    return out
+
+
+def reignition_decision_batch(
+    fatigue_integrals: np.ndarray,
+    trauma_active: np.ndarray,
+    g_rel: np.ndarray,
+    proposed_delta_p: np.ndarray,
+    a_anom: np.ndarray,
+    theta_anom: float = 2.0,
+    delta_p_base: float = DELTA_P_BASE,
+    idle_turns=0.0,
+    decay=FATIGUE_DECAY
+) -> ReignitionBatch:
+    """
+    reignition_decision を N セッション分まとめて計算する。
+    辞書・メッセージ文字列は作らず、値は1件ずつ呼んだ場合と一致する。
+
+    Args:
+        fatigue_integrals: (N, 4) Fatigue積分
+        trauma_active, g_rel, proposed_delta_p, a_anom: (N,)
+        theta_anom: 異常閾値
+        idle_turns: (N,) またはスカラー。積分の最終更新からの経過ターン
+        decay: (N,) またはスカラー。各セッションの AnchorFatiguePredictor.decay
+    """
+    integrals = np.asarray(fatigue_integrals, dtype=float)
+    if integrals.ndim != 2 or integrals.shape[1] != 4:
+        raise ValueError(
+            f"fatigue_integrals must have shape (N, 4). Got: {integrals.shape}"
+        )
+    n = len(integrals)
+    integrals = idle_decayed_integrals(
+        integrals, np.broadcast_to(np.asarray(idle_turns, dtype=float), (n,)),
+        np.broadcast_to(np.asarray(decay, dtype=float), (n,))
+    )
+    trauma = np.broadcast_to(np.asarray(trauma_active, dtype=float), (n,))
+    g_rel = np.broadcast_to(np.asarray(g_rel, dtype=float), (n,))
+    proposed = np.broadcast_to(np.asarray(proposed_delta_p, dtype=float), (n,))
+    a_anom = np.broadcast_to(np.asarray(a_anom, dtype=float), (n,))
+
+    # dynamic_safety_cap と同じ式（丸めは Python の round() と一致させる）
+    i_bar = np.mean(integrals, axis=1)
+    v = np.clip(np.exp(-LAMBDA_I * i_bar - LAMBDA_T * trauma), 1e-4, 1.0)
+    r = 1.0 + DELTA_R * np.tanh(ETA_R * g_rel)
+    delta_p_max = _round_half_even(delta_p_base * v * r, 4)
+    r_rounded = _round_half_even(r, 4)
+
+    actual = np.minimum(proposed, delta_p_max)
+    blocked = delta_p_max < 0.05
+    hold = ~blocked & (a_anom > theta_anom)
+    open_ = ~blocked & ~hold
+    case_b = open_ & (actual >= 0.3) & (r_rounded > 1.1)
+    case_a = open_ & ~case_b & (actual > 0)
+
+    case = np.full(n, CASE_NO_INTERVENTION, dtype=np.int8)
+    case[blocked] = CASE_BLOCKED
+    case[hold] = CASE_ANOMALY_HOLD
+    case[case_b] = CASE_B
+    case[case_a] = CASE_A
+    selected = np.where(case_a | case_b, _round_half_even(actual, 4), 0.0)
+
+    return ReignitionBatch(
+        delta_p_max=delta_p_max,
+        V=_round_half_even(v, 4),
+        R=r_rounded,
+        selected_delta_p=selected,
+        case=case,
+    )
+
+
 # ---------------------------------------------------------------------------
 # シミュレーション
 # ---------------------------------------------------------------------------
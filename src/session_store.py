@@ -0,0 +1,577 @@
+# src/session_store.py
+# Qualia Arc Protocol – Memory-Mapped Session Store
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   1ノードで数百万ユーザー分のプロトコル状態を保持したいが、
+#   ユーザーごとに AnomalyTrackerV9 などのPythonオブジェクトを
+#   生かし続けるとメモリとGCが持たない。
+#
+# 設計:
+#   固定レイアウトのレコード（numpy構造化dtype）をファイルに並べて memmap する。
+#   各クラスには「カーソル」版のサブクラスを用意し、状態の属性
+#   （anchor, integrals, sigma_res, a_anom, sensitivity, A, フェーズ, カウンタ）を
+#   ディスクリプタでレコードのフィールドに直結する。
+#     - 配列属性の読み出しはレコードへのビュー（ゼロコピー）
+#     - 代入（self.integrals = ...）はレコードへの書き込み
+#   アルゴリズム本体は元のクラスのコードがそのまま動くため、結果は一致する。
+#   カーソルはワーカーごとに1つ作り、bind() で対象ユーザーを切り替える。
+#
+# 初期化:
+#   create() 直後のレコードはゼロ埋め。レコードの initialized はカーソル種別ごとの
+#   ビットで、bind() / write() は未初期化の種別をそのカーソルの初期状態で埋めてから
+#   使う（reset() を呼ばずに新しい uid を使ってよい）。
+#   読み取り専用ストアで未初期化のレコードを束縛すると ValueError。
+#
+# 並行性:
+#   1レコードの書き込みは1プロセスのみ（ユーザー単位のシャーディング前提）。
+#   write() はレコードのバイト範囲に fcntl の排他ロックを取り、read() は共有ロックを
+#   取ってコピーするため、読み取り専用で開いた別プロセスからも一貫したコピーが得られる。
+#   seq は write() の前後で1ずつ増える変更カウンタ（奇数の間は書き込み中）。
+#   fcntl の無い環境では read() は seq が偶数かつ前後で不変になるまで待って読み直す
+#   （メモリ順序の保証は無く、x86 でのベストエフォート）。
+#   fcntl のロックはプロセス単位なので、同一プロセス内のスレッド同士は排他しない。
+#
+# 制限:
+#   - history / decay_log はユーザーをまたいで共有されないよう破棄する
+#   - lazy_result はレコードの書き換えで値が変わるため使えない
+
+import os
+import struct
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+if __package__:
+    from .anomaly_tracker_v9 import AnchorFatiguePredictor, AnomalyTrackerV9
+    from .apc_core import AlignmentTracker, PainVectorCalibrator
+    from .miracle_decay import MiracleDecayManager, MiraclePhase
+else:
+    from anomaly_tracker_v9 import AnchorFatiguePredictor, AnomalyTrackerV9
+    from apc_core import AlignmentTracker, PainVectorCalibrator
+    from miracle_decay import MiracleDecayManager, MiraclePhase
+
+try:
+    import fcntl
+except ImportError:      # Windows: read() は seq の再試行にフォールバック
+    fcntl = None
+
+MAGIC = b"QAPM"
+VERSION = 4              # 1: 観測を固定長配列で保持, 2: clock なし, 3: initialized なし
+HEADER_SIZE = 64
+
+_HEADER = struct.Struct("<4sHHxxxxQI")
+_PHASES = tuple(MiraclePhase)
+
+
+def session_dtype(dims: int = 4) -> np.dtype:
+    """1ユーザー分のレコード型（dims は AnomalyTrackerV9 の次元数）"""
+    d = dims
+    return np.dtype([
+        ("seq", "<u8"),
+        ("initialized", "u1"),          # カーソル種別ごとの初期化済みビット
+        # AnomalyTrackerV9
+        ("turn", "<i8"),
+        ("a_anom", "<f8"),
+        ("consecutive_hits", "<i8"),
+        ("stable_count", "<i8"),
+        ("floor_scale", "<f8"),
+        ("sigma_res", "<f8", (d, d)),
+        ("sigma_frozen", "<f8", (d, d)),
+        ("whiten", "<f8", (d, d)),
+        ("window", "<f8", (d, d)),
+        ("window_w", "<f8", (d,)),
+        ("window_gram", "<f8", (d, d)),
+        ("has_sigma_frozen", "u1"),
+        ("has_whiten", "u1"),
+        ("has_window", "u1"),
+        # AnchorFatiguePredictor
+        ("calib_done", "u1"),
+        ("calib_count", "<i8"),
+        ("calib_sum", "<f8", (4,)),
+        ("calib_mean", "<f8", (4,)),
+        ("calib_m2", "<f8", (4,)),
+        ("anchor", "<f8", (4,)),
+        ("integrals", "<f8", (4,)),
+        ("clock", "<f8"),
+        # PainVectorCalibrator
+        ("pain_vector", "<f8", (4,)),
+        ("sensitivity", "<f8", (4,)),
+        ("calibration_count", "<i8"),
+        ("calibration_complete", "u1"),
+        # AlignmentTracker
+        ("A", "<f8"),
+        # MiracleDecayManager
+        ("miracle_phase", "u1"),
+        ("miracle_turns", "<i8"),
+        ("miracle_integrals", "<f8", (4,)),
+    ], align=True)
+
+
+# ----------------------------------------------------------------------
+# レコードへのディスクリプタ
+# ----------------------------------------------------------------------
+
+class _Scalar:
+    """スカラー属性 ↔ レコードのフィールド"""
+
+    def __init__(self, field, kind=float):
+        self.field = field
+        self.kind = kind
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        return self.kind(obj._views[self.field][0])
+
+    def __set__(self, obj, value):
+        obj._views[self.field][0] = value
+
+
+class _Array:
+    """配列属性 ↔ レコードのフィールド（読み出しはビュー、代入はコピー）"""
+
+    def __init__(self, field, has=None):
+        self.field = field
+        self.has = has               # None を許す属性の有無フラグ
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        if self.has is not None and not obj._views[self.has][0]:
+            return None
+        return obj._views[self.field]
+
+    def __set__(self, obj, value):
+        if value is None:
+            if self.has is None:
+                raise ValueError(f"'{self.field}' cannot be None.")
+            obj._views[self.has][0] = 0
+            return
+        obj._views[self.field][...] = value
+        if self.has is not None:
+            obj._views[self.has][0] = 1
+
+
+class _DiscardHistory(list):
+    """カーソル用の history: ユーザーをまたいで溜めないよう追加を捨てる。"""
+
+    def append(self, record):
+        pass
+
+
+class _StoredCursor:
+    """カーソル共通: bind() でレコードのフィールドビューを差し替える。"""
+
+    _FIELDS = ()
+    _INIT_BIT = 0
+
+    def _attach(self, views):
+        self._views = views
+
+    def _is_initialized(self) -> bool:
+        return bool(self._views["initialized"][0] & self._INIT_BIT)
+
+    def _capture_initial(self):
+        # __init__ がスクラッチレコードに書いた初期状態を保存しておく
+        self._initial = {f: self._views[f].copy() for f in self._FIELDS}
+
+    def initialize(self):
+        """束縛中のレコードを、このクラスの初期状態に戻す。"""
+        for f, value in self._initial.items():
+            self._views[f][...] = value
+        self._views["initialized"][0] |= self._INIT_BIT
+
+
+# ----------------------------------------------------------------------
+# カーソル版クラス
+# ----------------------------------------------------------------------
+
+class StoredAnchorFatiguePredictor(_StoredCursor, AnchorFatiguePredictor):
+    _FIELDS = ("calib_done", "calib_count", "calib_sum", "calib_mean",
+               "calib_m2", "anchor", "integrals", "clock")
+    _INIT_BIT = 1
+
+    _calib_done = _Scalar("calib_done", bool)
+    _calib_count = _Scalar("calib_count", int)
+    _calib_sum = _Array("calib_sum")
+    _calib_mean = _Array("calib_mean")
+    _calib_m2 = _Array("calib_m2")
+    anchor = _Array("anchor")
+    integrals = _Array("integrals")
+    clock = _Scalar("clock")
+
+    def __init__(self, views, **kwargs):
+        self._attach(views)
+        super().__init__(**kwargs)
+        self._capture_initial()
+
+
+class StoredAnomalyTrackerV9(_StoredCursor, AnomalyTrackerV9):
+    _FIELDS = ("turn", "a_anom", "consecutive_hits", "stable_count",
+               "floor_scale", "sigma_res", "sigma_frozen", "whiten",
+               "window", "window_w", "window_gram", "has_sigma_frozen",
+               "has_whiten", "has_window")
+    _INIT_BIT = 2
+
+    turn = _Scalar("turn", int)
+    a_anom = _Scalar("a_anom")
+    _consecutive_hits = _Scalar("consecutive_hits", int)
+    _stable_count = _Scalar("stable_count", int)
+    _floor_scale = _Scalar("floor_scale")
+    sigma_res = _Array("sigma_res")
+    _sigma_frozen = _Array("sigma_frozen", has="has_sigma_frozen")
+    _whiten = _Array("whiten", has="has_whiten")
+    _window = _Array("window", has="has_window")
+    _window_w = _Array("window_w", has="has_window")
+    _window_gram = _Array("window_gram", has="has_window")
+
+    def __init__(self, views, **kwargs):
+        if kwargs.get("lazy_result"):
+            raise ValueError("lazy_result is not supported on stored trackers.")
+        kwargs.pop("history_capacity", None)
+        kwargs.pop("history_spill", None)
+        self._attach(views)
+        super().__init__(**kwargs)
+        self.predictor = StoredAnchorFatiguePredictor(
+            views, calib_turns=self.predictor.calib_turns,
+            c=self.predictor.c, decay=self.predictor.decay
+        )
+        self.history = _DiscardHistory()
+        self._capture_initial()
+
+    def _attach(self, views):
+        # 学習期の窓は (dims, dims) で確保し、_window_cap 列分のビューを使う
+        self._record = views
+        cap = getattr(self, "_window_cap", None)
+        if cap is not None:
+            views = dict(views)
+            views["window"] = views["window"][:, :cap]
+            views["window_w"] = views["window_w"][:cap]
+            views["window_gram"] = views["window_gram"][:cap, :cap]
+        self._views = views
+
+    def _reset_sigma(self):
+        # __init__ 中は _window_cap 確定後にここで初めて窓のビューを切り出す
+        self._attach(self._record)
+        super()._reset_sigma()
+
+    def initialize(self):
+        super().initialize()
+        self.predictor.initialize()
+
+    def __copy__(self):
+        # replay() の作業用コピー: レコードを書き換えないよう切り離す
+        new = object.__new__(type(self))
+        new.__dict__.update(self.__dict__)
+        new._attach({f: v.copy() for f, v in self._record.items()})
+        return new
+
+
+class StoredPainVectorCalibrator(_StoredCursor, PainVectorCalibrator):
+    _FIELDS = ("pain_vector", "sensitivity", "calibration_count",
+               "calibration_complete")
+    _INIT_BIT = 4
+
+    pain_vector = _Array("pain_vector")
+    sensitivity = _Array("sensitivity")
+    calibration_count = _Scalar("calibration_count", int)
+    calibration_complete = _Scalar("calibration_complete", bool)
+
+    def __init__(self, views, base_calibration_limit=5, history_capacity=None):
+        self._attach(views)
+        super().__init__(base_calibration_limit)
+        self.history = _DiscardHistory()
+        self._capture_initial()
+
+    def reset(self):
+        self.initialize()
+
+
+class StoredAlignmentTracker(_StoredCursor, AlignmentTracker):
+    _FIELDS = ("A",)
+    _INIT_BIT = 8
+
+    A = _Scalar("A")
+
+    def __init__(self, views, **kwargs):
+        kwargs.pop("history_capacity", None)
+        kwargs.pop("history_spill", None)
+        self._attach(views)
+        super().__init__(**kwargs)
+        self.history = _DiscardHistory()
+        self._capture_initial()
+
+
+class _StoredMiracleState:
+    """MiracleDecayState と同じ属性を持つレコードビュー"""
+
+    phase = property(
+        lambda self: _PHASES[self._views["miracle_phase"][0]],
+        lambda self, v: self._views["miracle_phase"].__setitem__(
+            0, _PHASES.index(v))
+    )
+    turns_elapsed = _Scalar("miracle_turns", int)
+    initial_integrals = _Array("miracle_integrals")
+
+    def __init__(self, views):
+        self._views = views
+        self.decay_log = _DiscardHistory()
+
+
+class StoredMiracleDecayManager(_StoredCursor, MiracleDecayManager):
+    _FIELDS = ("miracle_phase", "miracle_turns", "miracle_integrals")
+    _INIT_BIT = 16
+
+    def __init__(self, views, **kwargs):
+        kwargs.pop("history_capacity", None)
+        kwargs.pop("history_spill", None)
+        self._attach(views)
+        super().__init__(**kwargs)
+        self.history = _DiscardHistory()
+        self._capture_initial()
+
+    def _attach(self, views):
+        self._views = views
+        self._state_view = _StoredMiracleState(views)
+
+    @property
+    def state(self):
+        return self._state_view
+
+    @state.setter
+    def state(self, value):
+        view = self._state_view
+        view.phase = value.phase
+        view.turns_elapsed = value.turns_elapsed
+        view.initial_integrals = value.initial_integrals
+
+
+# ----------------------------------------------------------------------
+# ストア本体
+# ----------------------------------------------------------------------
+
+class SessionStore:
+    """
+    ユーザー状態を固定長レコードで保持する memmap ストア。
+
+    使い方:
+        store = SessionStore.create("sessions.qap", capacity=1_000_000)
+        tracker = store.tracker()              # ワーカーごとに1つ
+        with store.write(uid, tracker):        # uid のレコードに束縛
+            tracker.update(d_obs, text)        # 初回は初期状態で埋めてから
+        store.reset(uid, tracker)              # 明示的に初期状態へ戻す
+        snapshot = store.read(uid)             # 別プロセスからでも一貫したコピー
+        store.close()
+    """
+
+    def __init__(self, path, records, dims, readonly):
+        self.path = path
+        self.records = records
+        self.dims = dims
+        self.readonly = readonly
+        self.capacity = len(records)
+        self._scratch = np.zeros(1, dtype=records.dtype)
+        self._itemsize = records.dtype.itemsize
+        self._fd = None
+        if fcntl is not None:
+            self._fd = os.open(path, os.O_RDONLY if readonly else os.O_RDWR)
+
+    def close(self):
+        """ロック用のファイル記述子を閉じ、変更を書き出す。"""
+        self.flush()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @classmethod
+    def create(cls, path, capacity: int, dims: int = 4) -> "SessionStore":
+        """新しいストアファイルを作る（既存ファイルは上書き）。"""
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive. Got: {capacity}")
+        dtype = session_dtype(dims)
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, dims, capacity,
+                                 dtype.itemsize).ljust(HEADER_SIZE, b"\0"))
+            f.truncate(HEADER_SIZE + capacity * dtype.itemsize)
+        # レコードはゼロ埋め（initialized=0）: 各 uid は初回の bind() で初期化される
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path, readonly: bool = False) -> "SessionStore":
+        """既存のストアを開く（readonly=True なら読み取り専用 memmap）。"""
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"Not a session store: {path}")
+        magic, version, dims, capacity, itemsize = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"Not a session store: {path}")
+        dtype = session_dtype(dims)
+        if version != VERSION or itemsize != dtype.itemsize:
+            raise ValueError(
+                f"Incompatible session store layout (version {version})."
+            )
+        expected = HEADER_SIZE + capacity * itemsize
+        if os.path.getsize(path) < expected:
+            raise ValueError(f"Session store is truncated: {path}")
+        records = np.memmap(path, dtype=dtype, mode="r" if readonly else "r+",
+                            offset=HEADER_SIZE, shape=(capacity,))
+        return cls(path, records, dims, readonly)
+
+    def _views(self, rec) -> dict:
+        rec = rec.view(np.ndarray)
+        views = {}
+        for name in rec.dtype.names:
+            field = rec[name]
+            views[name] = field if field.ndim == 1 else field[0]
+        return views
+
+    def _record_views(self, uid) -> dict:
+        if not 0 <= uid < self.capacity:
+            raise IndexError(f"session {uid} out of range")
+        return self._views(self.records[uid:uid + 1])
+
+    # --- カーソル -------------------------------------------------------
+
+    def tracker(self, **params) -> StoredAnomalyTrackerV9:
+        """AnomalyTrackerV9 のカーソル（引数は AnomalyTrackerV9 と同じ）"""
+        dims = params.get("dims", 4)
+        if dims != self.dims:
+            raise ValueError(f"Store dims {self.dims} != tracker dims {dims}.")
+        return StoredAnomalyTrackerV9(self._views(self._scratch.copy()),
+                                      **params)
+
+    def calibrator(self, **params) -> StoredPainVectorCalibrator:
+        return StoredPainVectorCalibrator(self._views(self._scratch.copy()),
+                                          **params)
+
+    def alignment(self, **params) -> StoredAlignmentTracker:
+        return StoredAlignmentTracker(self._views(self._scratch.copy()),
+                                      **params)
+
+    def miracle(self, **params) -> StoredMiracleDecayManager:
+        return StoredMiracleDecayManager(self._views(self._scratch.copy()),
+                                         **params)
+
+    @staticmethod
+    def _attach_all(views, cursors) -> list:
+        """カーソルを束縛し、レコード上で未初期化のもの（予測器を含む）を返す。"""
+        fresh = []
+        for cursor in cursors:
+            cursor._attach(views)
+            members = (cursor,)
+            if isinstance(cursor, StoredAnomalyTrackerV9):
+                cursor.predictor._attach(views)
+                members = (cursor, cursor.predictor)
+            fresh.extend(c for c in members if not c._is_initialized())
+        return fresh
+
+    def _check_fresh(self, uid, fresh):
+        if fresh and self.readonly:
+            raise ValueError(
+                f"Session {uid} is not initialized for "
+                f"{', '.join(type(c).__name__ for c in fresh)}."
+            )
+
+    def bind(self, uid, *cursors):
+        """
+        カーソルを uid のレコードに束縛する（書き込みは write() の中で）。
+        未初期化の種別は初期状態で埋める（読み取り専用なら ValueError）。
+        """
+        views = self._record_views(uid)
+        fresh = self._attach_all(views, cursors)
+        self._check_fresh(uid, fresh)
+        if fresh:
+            with self._locked(uid, exclusive=True):
+                self._bump(uid, fresh)
+
+    # --- 書き込み・読み出し ---------------------------------------------
+
+    @contextmanager
+    def _locked(self, uid, exclusive):
+        """uid のレコードのバイト範囲に fcntl ロックを取る（無ければ何もしない）。"""
+        if self._fd is None:
+            yield
+            return
+        start = HEADER_SIZE + uid * self._itemsize
+        fcntl.lockf(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH,
+                    self._itemsize, start, os.SEEK_SET)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self._itemsize, start,
+                        os.SEEK_SET)
+
+    def _bump(self, uid, fresh):
+        # 未初期化の種別を seq の奇数区間の中で埋める
+        seq = self.records["seq"]
+        seq[uid] += 1
+        try:
+            for cursor in fresh:
+                cursor.initialize()
+        finally:
+            seq[uid] += 1
+
+    @contextmanager
+    def write(self, uid, *cursors):
+        """
+        uid のレコードをロックして書き込み中にし、カーソルを束縛する。
+        未初期化の種別は初期状態で埋めてからブロックに入る。
+        ブロックを抜けると seq を偶数に戻し、ロックを解く（例外時も）。
+        """
+        if self.readonly:
+            raise ValueError("Session store is opened read-only.")
+        views = self._record_views(uid)
+        seq = self.records["seq"]
+        with self._locked(uid, exclusive=True):
+            seq[uid] += 1
+            try:
+                for cursor in self._attach_all(views, cursors):
+                    cursor.initialize()
+                yield
+            finally:
+                seq[uid] += 1
+
+    def reset(self, uid, *cursors):
+        """uid のレコードのうち、各カーソルが扱うフィールドを初期状態に戻す。"""
+        with self.write(uid, *cursors):
+            for cursor in cursors:
+                cursor.initialize()
+
+    def read(self, uid, retries: int = 1000) -> np.ndarray:
+        """
+        uid のレコードの一貫したコピー（0次元の構造化配列）。
+
+        共有ロックを取ってコピーする（別プロセスの write() の完了を待つ）。
+        fcntl の無い環境では seq が偶数かつ前後で不変になるまで、
+        間隔を伸ばしながら最大 retries 回読み直す（ベストエフォート）。
+        """
+        if not 0 <= uid < self.capacity:
+            raise IndexError(f"session {uid} out of range")
+        rec = self.records[uid:uid + 1]
+        if self._fd is not None:
+            with self._locked(uid, exclusive=False):
+                return np.array(rec[0])
+
+        delay = 1e-6
+        for _ in range(retries):
+            before = int(rec["seq"][0])
+            if before % 2 == 0:
+                copy = np.array(rec[0])
+                if int(rec["seq"][0]) == before:
+                    return copy
+            time.sleep(delay)
+            delay = min(delay * 2, 1e-3)
+        raise TimeoutError(f"session {uid} is being written")
+
+    def flush(self):
+        if not self.readonly:
+            self.records.flush()
@@ -0,0 +1,260 @@
+# src/snapshot.py
+# Qualia Arc Protocol – Binary Session Snapshots
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   セッション状態（sigma_res と固定フラグ、アンカー、疲労積分、感度、A_t、
+#   Miracleフェーズ）はPythonオブジェクトの中にしか無く、
+#   ワーカーが再起動すると全ユーザーのキャリブレーションが失われていた。
+#
+# 形式（リトルエンディアン）:
+#   ヘッダ:   magic "QAPS" | version u16 | kind u8
+#   フィールド: int64 / float64 / flag(u8) / 配列 / 長さ付きバイト列 を
+#             クラスごとに決まった順序で並べる（フィールド名は持たない）
+#   配列:     ndim u8 | shape u32×ndim | float64 データ
+#   バンドル:  magic "QAPB" | version u16 | 件数 u8 | (kind u8 | 長さ u32 | スナップショット)×件数
+#
+#   状態だけを保存し、ハイパーパラメータは保存しない。
+#   復元先は同じ設定で生成したインスタンス（restore() は状態を上書きする）。
+#   履歴（history / decay_log）は監査ログなので対象外。
+#   オブジェクト全体の pickle は使わない。
+
+import math
+import struct
+
+import numpy as np
+
+MAGIC = b"QAPS"
+BUNDLE_MAGIC = b"QAPB"
+VERSION = 3
+# 1: 予測器がキャリブレーション観測列をそのまま持つ形式
+# 2: 予測器の疲労積分に時刻（clock）が無い形式
+SUPPORTED_VERSIONS = (1, 2, 3)
+
+KIND_TRACKER = 1
+KIND_PREDICTOR = 2
+KIND_CALIBRATOR = 3
+KIND_ALIGNMENT = 4
+KIND_MIRACLE = 5
+
+# snapshot_bundle() の引数名 → kind
+BUNDLE_KINDS = {
+    "tracker": KIND_TRACKER,
+    "calibrator": KIND_CALIBRATOR,
+    "alignment": KIND_ALIGNMENT,
+    "miracle": KIND_MIRACLE,
+}
+
+_HEADER = struct.Struct("<4sHB")
+_BUNDLE_HEADER = struct.Struct("<4sHB")
+_ENTRY = struct.Struct("<BI")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+_U8 = struct.Struct("<B")
+_U32 = struct.Struct("<I")
+_SHAPES = [struct.Struct(f"<{ndim}I") for ndim in range(4)]
+
+
+class SnapshotWriter:
+    """フィールドを順に書き込み、getvalue() でバイト列を得る。"""
+
+    def __init__(self, kind: int):
+        self._parts = [_HEADER.pack(MAGIC, VERSION, kind)]
+
+    def int(self, value):
+        self._parts.append(_I64.pack(int(value)))
+        return self
+
+    def float(self, value):
+        self._parts.append(_F64.pack(float(value)))
+        return self
+
+    def flag(self, value):
+        self._parts.append(_U8.pack(1 if value else 0))
+        return self
+
+    def array(self, value):
+        a = np.ascontiguousarray(value, dtype="<f8")
+        self._parts.append(_U8.pack(a.ndim))
+        self._parts.append(_SHAPES[a.ndim].pack(*a.shape))
+        self._parts.append(a.tobytes())
+        return self
+
+    def optional_array(self, value):
+        self.flag(value is not None)
+        if value is not None:
+            self.array(value)
+        return self
+
+    def blob(self, value: bytes):
+        self._parts.append(_U32.pack(len(value)))
+        self._parts.append(value)
+        return self
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._parts)
+
+
+class SnapshotReader:
+    """SnapshotWriter と同じ順序でフィールドを読み出す。"""
+
+    def __init__(self, data, kind: int):
+        self._buf = memoryview(data)
+        if len(self._buf) < _HEADER.size:
+            raise ValueError("Snapshot is truncated.")
+        magic, version, got_kind = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a QAP snapshot.")
+        if version not in SUPPORTED_VERSIONS:
+            raise ValueError(
+                f"Unsupported snapshot version {version} (expected {VERSION})."
+            )
+        if got_kind != kind:
+            raise ValueError(
+                f"Snapshot kind mismatch: expected {kind}, got {got_kind}."
+            )
+        self.version = version
+        self._pos = _HEADER.size
+
+    def _unpack(self, fmt: struct.Struct):
+        try:
+            value = fmt.unpack_from(self._buf, self._pos)
+        except struct.error:
+            raise ValueError("Snapshot is truncated.") from None
+        self._pos += fmt.size
+        return value
+
+    def int(self) -> int:
+        return self._unpack(_I64)[0]
+
+    def float(self) -> float:
+        return self._unpack(_F64)[0]
+
+    def flag(self) -> bool:
+        return bool(self._unpack(_U8)[0])
+
+    def array(self) -> np.ndarray:
+        ndim = self._unpack(_U8)[0]
+        if ndim >= len(_SHAPES):
+            raise ValueError(f"Unsupported array rank in snapshot: {ndim}")
+        shape = self._unpack(_SHAPES[ndim])
+        n = 8 * math.prod(shape)
+        if self._pos + n > len(self._buf):
+            raise ValueError("Snapshot is truncated.")
+        a = np.frombuffer(self._buf, dtype="<f8", count=n // 8,
+                          offset=self._pos)
+        self._pos += n
+        return a.reshape(shape).copy()
+
+    def optional_array(self):
+        return self.array() if self.flag() else None
+
+    def blob(self) -> bytes:
+        n = self._unpack(_U32)[0]
+        if self._pos + n > len(self._buf):
+            raise ValueError("Snapshot is truncated.")
+        value = bytes(self._buf[self._pos:self._pos + n])
+        self._pos += n
+        return value
+
+    def done(self):
+        """全フィールドを読み切ったことを確認する。"""
+        if self._pos != len(self._buf):
+            raise ValueError(
+                f"Snapshot has {len(self._buf) - self._pos} trailing bytes."
+            )
+
+
+def apply_state(obj, state: dict):
+    """_parse() が検証して返した属性値をまとめて代入する。"""
+    for name, value in state.items():
+        setattr(obj, name, value)
+
+
+def expect_shape(name: str, value, shape):
+    """復元した配列の形が復元先の設定と一致するか確認する。"""
+    if value is not None and value.shape != tuple(shape):
+        raise ValueError(
+            f"Snapshot field '{name}' has shape {value.shape}, "
+            f"expected {tuple(shape)}."
+        )
+    return value
+
+
+# ----------------------------------------------------------------------
+# ユーザー単位のバンドル
+# ----------------------------------------------------------------------
+
+def snapshot_bundle(**components) -> bytes:
+    """
+    1ユーザー分のオブジェクトをまとめてスナップショットする。
+
+    例: snapshot_bundle(tracker=t, calibrator=c, alignment=a, miracle=m)
+    None の要素は含めない。
+    """
+    entries = []
+    for name, obj in components.items():
+        kind = BUNDLE_KINDS.get(name)
+        if kind is None:
+            raise ValueError(f"Unknown bundle component: {name}")
+        if obj is not None:
+            entries.append((kind, obj.snapshot()))
+
+    parts = [_BUNDLE_HEADER.pack(BUNDLE_MAGIC, VERSION, len(entries))]
+    for kind, data in entries:
+        parts.append(_ENTRY.pack(kind, len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def restore_bundle(data, **components) -> list:
+    """
+    snapshot_bundle() の出力を、渡したオブジェクトに復元する。
+
+    バンドルにあって引数に無い要素、引数にあってバンドルに無い要素は
+    どちらも ValueError（部分的な復元で状態が食い違うのを防ぐ）。
+
+    Returns:
+        復元した要素名のリスト
+    """
+    buf = memoryview(data)
+    if len(buf) < _BUNDLE_HEADER.size:
+        raise ValueError("Bundle is truncated.")
+    magic, version, count = _BUNDLE_HEADER.unpack_from(buf, 0)
+    if magic != BUNDLE_MAGIC:
+        raise ValueError("Not a QAP bundle.")
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError(
+            f"Unsupported bundle version {version} (expected {VERSION})."
+        )
+
+    pos = _BUNDLE_HEADER.size
+    payloads = {}
+    for _ in range(count):
+        if pos + _ENTRY.size > len(buf):
+            raise ValueError("Bundle is truncated.")
+        kind, n = _ENTRY.unpack_from(buf, pos)
+        pos += _ENTRY.size
+        if pos + n > len(buf):
+            raise ValueError("Bundle is truncated.")
+        payloads[kind] = buf[pos:pos + n]
+        pos += n
+    if pos != len(buf):
+        raise ValueError(f"Bundle has {len(buf) - pos} trailing bytes.")
+
+    for name in components:
+        if name not in BUNDLE_KINDS:
+            raise ValueError(f"Unknown bundle component: {name}")
+    wanted = {BUNDLE_KINDS[name]: name
+              for name, obj in components.items() if obj is not None}
+    if set(wanted) != set(payloads):
+        have = sorted(n for n, k in BUNDLE_KINDS.items() if k in payloads)
+        raise ValueError(
+            f"Bundle contains {have}, got targets {sorted(wanted.values())}."
+        )
+    # 全要素を検証してから代入する（途中で失敗しても何も上書きしない）
+    parsed = {name: components[name]._parse(payloads[kind])
+              for kind, name in wanted.items()}
+    for name, state in parsed.items():
+        components[name]._apply(state)
+    return sorted(wanted.values())
@@ -0,0 +1,191 @@
+# src/turn_pipeline.py
+# Qualia Arc Protocol – Fused Per-Turn Pipeline
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   本番の1ターンは
+#     PainVectorCalibrator.update → AnomalyTrackerV9.update
+#     → AlignmentTracker.update → MiracleDecayManager.tick → reignition_decision
+#   を手で配線しており、発話テキストは APC の辞書と FACT_CONTEXT で2回走査され、
+#   各段が丸めたリスト・メッセージ文字列などを毎ターン作っていた。
+#
+# 設計:
+#   - 2つの辞書を MultiLexiconMatcher にまとめ、テキストを1回だけ走査する。
+#     スコアはパイプラインが持つ (2, 4) バッファに書き込み、
+#     その行ビューを各段に渡す（analyze_input / extract と同一の値）。
+#   - 異常検知は lazy_result で動かし、整形済みの AnomalyResult を作らない。
+#   - Miracle は PENDING 中だけ tick し、減衰投影は lazy_decay で都度計算しない。
+#   - 結果は数値とコードだけの TurnResult 1つにまとめる。
+#   各段の状態遷移は手で配線した場合と同一。
+
+from dataclasses import dataclass
+
+import numpy as np
+
+if __package__:
+    from .anomaly_tracker_v9 import AnomalyRoute, AnomalyTrackerV9
+    from .apc_core import AlignmentTracker, PainVectorCalibrator
+    from .lexicon_matcher import MultiLexiconMatcher
+    from .miracle_decay import MiracleDecayManager, MiraclePhase
+    from .reignition_protocol_v2 import reignition_decision
+else:
+    from anomaly_tracker_v9 import AnomalyRoute, AnomalyTrackerV9
+    from apc_core import AlignmentTracker, PainVectorCalibrator
+    from lexicon_matcher import MultiLexiconMatcher
+    from miracle_decay import MiracleDecayManager, MiraclePhase
+    from reignition_protocol_v2 import reignition_decision
+
+
+@dataclass
+class TurnResult:
+    """1ターン分の判定（リスト化・メッセージ整形なし）"""
+    turn: int
+    pain: np.ndarray             # APC の現在の推定Pain Vector
+    a_anom: float
+    raw_distance: float          # 4桁丸め（AnomalyResult と同じ）
+    detected: bool
+    route: AnomalyRoute
+    alignment: float             # A_t
+    miracle_phase: MiraclePhase
+    miracle_action: str          # tick の action（"none" / "monitoring" / "rollback" / "apply_reset"）
+    reignition_case: str
+    permitted: bool
+    delta_p_max: float
+    selected_delta_p: float
+
+
+class TurnPipeline:
+    """
+    1ユーザー分のプロトコル各段をまとめて1ターンずつ進める。
+
+    使い方:
+        pipeline = TurnPipeline()
+        result = pipeline.step("眠れない", d_obs, p_value=0.8, d_dot=-0.01)
+    """
+
+    def __init__(self, tracker_params=None, calibration_limit=5,
+                 alignment_params=None, miracle_params=None,
+                 history_capacity=None):
+        """
+        Args:
+            tracker_params: AnomalyTrackerV9 への引数（lazy_result は常に True）
+            calibration_limit: PainVectorCalibrator の base_calibration_limit
+            alignment_params: AlignmentTracker への引数
+            miracle_params: MiracleDecayManager への引数（既定で lazy_decay）
+            history_capacity: 各段の履歴を固定容量のリングバッファにする
+        """
+        tracker_params = dict(tracker_params or {})
+        tracker_params["lazy_result"] = True
+        tracker_params.setdefault("history_capacity", history_capacity)
+        self.calibrator = PainVectorCalibrator(calibration_limit,
+                                               history_capacity)
+        self.tracker = AnomalyTrackerV9(**tracker_params)
+        self.alignment = AlignmentTracker(
+            **{"history_capacity": history_capacity,
+               **(alignment_params or {})}
+        )
+        self.miracle = MiracleDecayManager(
+            **{"history_capacity": history_capacity, "lazy_decay": True,
+               **(miracle_params or {})}
+        )
+
+        # 0行目: APC の辞書, 1行目: FACT_CONTEXT
+        self._matcher = MultiLexiconMatcher(
+            (self.calibrator.keyword_weights,
+             self.tracker.predictor.extractor.FACT_CONTEXT),
+            dims=4
+        )
+        self._scores = np.zeros((2, 4))
+
+    def attempt_miracle(self, g_value: float, v_consistency: float) -> dict:
+        """現在の積分と G_min で Miracle 判定を申請する（終端フェーズならリセット後）。"""
+        if self.miracle.get_phase() not in (MiraclePhase.NONE,
+                                            MiraclePhase.PENDING):
+            self.miracle.reset()
+        return self.miracle.attempt_miracle(
+            self.tracker.predictor.integrals, g_value,
+            self.tracker.calculate_g_min(), v_consistency
+        )
+
+    def step(self, user_text: str, d_obs, p_value: float, d_dot: float,
+             trauma_active: float = 0.0, g_rel: float = 0.5,
+             proposed_delta_p: float = 0.0, now=None) -> TurnResult:
+        """
+        1ターン進める。
+
+        Args:
+            user_text: ユーザー発話
+            d_obs: 観測Pain Vector（4次元）
+            p_value: 応答の真実接地確率（AlignmentTracker へ）
+            d_dot: 直前ターンからの苦痛変化率
+            trauma_active, g_rel, proposed_delta_p: reignition_decision への入力
+            now: ターンの時刻（ターン単位）。省略時は前ターンの1ターン後。
+                 間が空いた場合は疲労積分に空白期間の減衰を1回でかける
+        """
+        scores = self._matcher.score(user_text, self._scores)
+        np.clip(scores, 0.0, 1.0, out=scores)
+
+        pain = self.calibrator.update(user_text, scores=scores[0])
+        tracker = self.tracker
+        anomaly = tracker.update(d_obs, user_text, d_latent=scores[1],
+                                 now=now)
+        integrals = tracker.predictor.integrals
+        alignment = self.alignment.update(pain, p_value, d_dot)
+
+        miracle = self.miracle
+        if miracle.state.phase == MiraclePhase.PENDING:
+            miracle_action = miracle.tick(integrals, d_dot)["action"]
+        else:
+            miracle_action = "none"
+
+        reignition = reignition_decision(
+            integrals, trauma_active, g_rel, proposed_delta_p,
+            tracker.a_anom, tracker.theta_anom
+        )
+        return TurnResult(
+            turn=tracker.turn,
+            pain=pain,
+            a_anom=tracker.a_anom,
+            raw_distance=anomaly.raw_distance,
+            detected=anomaly.detected,
+            route=anomaly.route,
+            alignment=float(alignment),
+            miracle_phase=miracle.state.phase,
+            miracle_action=miracle_action,
+            reignition_case=reignition.case,
+            permitted=reignition.permitted,
+            delta_p_max=reignition.delta_p_max,
+            selected_delta_p=reignition.selected_delta_p,
+        )
+
+
+# --- 動作確認 ---
+if __name__ == "__main__":
+    import time
+
+    texts = [
+        "今日も普通でした。",
+        "妻のことが心配で仕事に集中できない",
+        "誰とも話してなくて孤独を感じる",
+        "家族と喧嘩して、借金のこともあって眠れない",
+    ]
+    rng = np.random.default_rng(0)
+    pipeline = TurnPipeline(history_capacity=64)
+
+    print("=== Turn Pipeline ===\n")
+    n = 2000
+    t0 = time.perf_counter()
+    for t in range(n):
+        d_obs = np.clip(0.3 + rng.normal(0, 0.04, 4) + (0.3 if t > 1500 else 0), 0, 1)
+        if t == 40:
+            pipeline.attempt_miracle(g_value=0.95, v_consistency=0.9)
+        r = pipeline.step(texts[t % 4], d_obs, p_value=0.8,
+                          d_dot=float(rng.normal(-0.01, 0.02)),
+                          proposed_delta_p=0.3)
+        if t in (5, 41, 45, 1499, 1510):
+            print(f"  turn {r.turn:4d}: route={r.route.value:9s} "
+                  f"A_anom={r.a_anom:.3f} A_t={r.alignment:.3f} "
+                  f"miracle={r.miracle_phase.value}/{r.miracle_action} "
+                  f"case={r.reignition_case}")
+    elapsed = time.perf_counter() - t0
+    print(f"\n  {n} turns: {elapsed / n * 1e6:.1f} µs/turn")
@@ -0,0 +1,432 @@
+# src/turn_service.py
+# Qualia Arc Protocol – Asyncio Turn-Processing Service
+# TS v1.4 / © 2026 Hiroshi Honma / CC BY-NC-ND 4.0
+#
+# 背景:
+#   サービング層が無く、各モジュールは __main__ デモとしてしか動かなかった。
+#   実運用ではユーザーごとの発話（テキスト + d_obs）が並行して届き、
+#   1ターンごとにプロトコル全体の判定を返す必要がある。
+#
+# 設計:
+#   1ターン = regression_gate と同じチェーン
+#     AnomalyTrackerV9 → MiracleDecayManager → reignition_decision → IronRule
+#   を1ユーザーのセッション状態に対して実行し、
+#   異常ルート / Miracleフェーズ / 再点火ケース / Iron Rule判定 を返す。
+#
+#   順序保証:
+#     ユーザーIDのハッシュでシャード（ワーカー）を固定する。
+#     各シャードは FIFO キューを1本だけ持つため、同一ユーザーのターンは
+#     投入順に処理される（セッション状態に触るのは常に同じワーカー）。
+#   背圧:
+#     キューは maxsize 付き。満杯なら submit() は空きが出るまで待ち、
+#     wait=False なら ServiceOverloaded を送出する。
+#   計算は1ターン100µs程度の numpy 処理なので、イベントループ上で直接行う
+#   （スレッドに逃がしてもGILで並列化されず、順序管理だけが複雑になる）。
+#   セッション数:
+#     メモリ上のセッションは最大 max_sessions 件の LRU。あふれたセッションは
+#     スナップショット（snapshot_bundle）にして on_evict に渡し、
+#     次のターンで load_session から復元する（どちらも省略時は状態を捨てる）。
+#
+# 使い方:
+#   python turn_service.py --users 200 --turns 50     # ローカル負荷試験
+
+import asyncio
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+
+if __package__:
+    from .anomaly_tracker_v9 import AnomalyTrackerV9
+    from .iron_rule import IronRule
+    from .miracle_decay import MiracleDecayManager, MiraclePhase
+    from .reignition_protocol_v2 import reignition_decision
+    from .snapshot import restore_bundle, snapshot_bundle
+else:
+    from anomaly_tracker_v9 import AnomalyTrackerV9
+    from iron_rule import IronRule
+    from miracle_decay import MiracleDecayManager, MiraclePhase
+    from reignition_protocol_v2 import reignition_decision
+    from snapshot import restore_bundle, snapshot_bundle
+
+
+class ServiceOverloaded(RuntimeError):
+    """キューが満杯で、待たずに投入しようとした"""
+
+
+@dataclass
+class TurnRequest:
+    """1ユーザーの1ターン分の入力"""
+    user_id: str
+    text: str
+    d_obs: list                          # 観測Pain Vector（4次元）
+    trauma_active: float = 0.0           # 再点火判定への入力
+    g_rel: float = 0.5
+    proposed_delta_p: float = 0.0
+    g_value: float = 0.0                 # Miracle判定の外部証拠スコア
+    v_consistency: float = 0.0
+    d_dot: float = 0.0
+    candidates: list = field(default_factory=list)   # [{"action", "p_value"}, ...]
+
+
+@dataclass
+class TurnResponse:
+    user_id: str
+    turn: int                            # このユーザーの通算ターン数（1始まり）
+    route: str                           # 異常ルート
+    a_anom: float
+    detected: bool
+    miracle_phase: str
+    reignition_case: str
+    selected_delta_p: float
+    feasible: list                       # Iron Rule を通過した行動名
+    rejected: list                       # 遮断された行動名
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class UserSession:
+    """1ユーザー分のプロトコル状態"""
+
+    def __init__(self, tracker_params=None, history_capacity=64):
+        params = {"history_capacity": history_capacity}
+        params.update(tracker_params or {})
+        self.tracker = AnomalyTrackerV9(**params)
+        self.miracle = MiracleDecayManager(history_capacity=history_capacity)
+
+    def snapshot(self) -> bytes:
+        """異常検知と Miracle の状態のバンドル（履歴は含まない）"""
+        return snapshot_bundle(tracker=self.tracker, miracle=self.miracle)
+
+    def restore(self, data):
+        restore_bundle(data, tracker=self.tracker, miracle=self.miracle)
+
+    def process(self, request: TurnRequest, gate: IronRule) -> TurnResponse:
+        tracker = self.tracker
+        anomaly = tracker.update(request.d_obs, request.text)
+        integrals = tracker.predictor.integrals
+
+        # Miracle: PENDING中は tick、それ以外は（終端ならリセットして）判定
+        phase = self.miracle.get_phase()
+        if phase == MiraclePhase.PENDING:
+            self.miracle.tick(integrals, request.d_dot)
+        else:
+            if phase != MiraclePhase.NONE:
+                self.miracle.reset()
+            self.miracle.attempt_miracle(
+                integrals, request.g_value, tracker.calculate_g_min(),
+                request.v_consistency
+            )
+
+        reignition = reignition_decision(
+            integrals, request.trauma_active, request.g_rel,
+            request.proposed_delta_p, tracker.a_anom, tracker.theta_anom
+        )
+        feasible, rejected = gate.filter_actions(request.candidates)
+
+        return TurnResponse(
+            user_id=request.user_id,
+            turn=tracker.turn,
+            route=anomaly.route.value,
+            a_anom=anomaly.a_anom,
+            detected=anomaly.detected,
+            miracle_phase=self.miracle.get_phase().value,
+            reignition_case=reignition.case,
+            selected_delta_p=reignition.selected_delta_p,
+            feasible=[c["action"] for c in feasible],
+            rejected=[c["action"] for c in rejected],
+        )
+
+
+class TurnService:
+    """
+    ユーザー単位の順序を保ったまま、ターンを並行処理するサービス。
+
+    使い方:
+        async with TurnService(n_shards=4) as service:
+            response = await service.process(TurnRequest("u1", "眠れない", d_obs))
+    """
+
+    def __init__(self, n_shards=4, queue_size=256, p_min=0.3,
+                 tracker_params=None, history_capacity=64,
+                 max_sessions=100_000, on_evict=None, load_session=None):
+        """
+        Args:
+            n_shards: ワーカー（= キュー）の数
+            queue_size: 1シャードあたりの未処理ターン数の上限
+            p_min: Iron Rule の閾値
+            tracker_params: AnomalyTrackerV9 への引数
+            history_capacity: セッションごとの履歴リングバッファ容量
+            max_sessions: メモリ上に保持するセッション数の上限（LRU）
+            on_evict: on_evict(user_id, snapshot: bytes)。追い出したセッションの保存先
+            load_session: load_session(user_id) -> bytes | None。
+                          メモリに無いユーザーの保存済みスナップショットを返す
+        """
+        if n_shards <= 0:
+            raise ValueError(f"n_shards must be positive. Got: {n_shards}")
+        if queue_size <= 0:
+            raise ValueError(f"queue_size must be positive. Got: {queue_size}")
+        if max_sessions <= 0:
+            raise ValueError(
+                f"max_sessions must be positive. Got: {max_sessions}"
+            )
+        self.n_shards = n_shards
+        self.queue_size = queue_size
+        self.tracker_params = dict(tracker_params or {})
+        self.history_capacity = history_capacity
+        self.gate = IronRule(p_min=p_min)
+        self.max_sessions = max_sessions
+        self.on_evict = on_evict
+        self.load_session = load_session
+        self.sessions = OrderedDict()     # user_id → UserSession（末尾が最新）
+        self._queues = []
+        self._workers = []
+
+    # --- ライフサイクル ---------------------------------------------------
+
+    async def start(self):
+        if self._workers:
+            return
+        self._queues = [asyncio.Queue(self.queue_size)
+                        for _ in range(self.n_shards)]
+        self._workers = [asyncio.create_task(self._worker(q))
+                         for q in self._queues]
+
+    async def stop(self):
+        """投入済みのターンを処理し終えてからワーカーを止める。"""
+        for q in self._queues:
+            await q.put(None)
+        await asyncio.gather(*self._workers)
+        self._workers = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    # --- 投入 -------------------------------------------------------------
+
+    def shard_of(self, user_id) -> int:
+        # hash() はプロセスごとに変わるため、安定なCRC32で振り分ける
+        return zlib.crc32(str(user_id).encode()) % self.n_shards
+
+    async def submit(self, request: TurnRequest,
+                     wait: bool = True) -> asyncio.Future:
+        """
+        ターンをキューに入れ、結果の Future を返す。
+
+        Args:
+            wait: True ならキューに空きが出るまで待つ（背圧）。
+                  False なら満杯時に ServiceOverloaded。
+        """
+        if not self._workers:
+            raise RuntimeError("TurnService is not started.")
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues[self.shard_of(request.user_id)]
+        if wait:
+            await queue.put((request, future))
+        else:
+            try:
+                queue.put_nowait((request, future))
+            except asyncio.QueueFull:
+                raise ServiceOverloaded(
+                    f"shard queue is full ({self.queue_size} pending turns)"
+                ) from None
+        return future
+
+    async def process(self, request: TurnRequest) -> TurnResponse:
+        """ターンを投入し、処理結果を待つ。"""
+        return await (await self.submit(request))
+
+    # --- セッション -------------------------------------------------------
+
+    def session(self, user_id) -> UserSession:
+        """
+        ユーザーのセッションを返す（無ければ復元または新規作成）。
+        上限を超えたら最も長く使われていないセッションを追い出す。
+        """
+        sessions = self.sessions
+        session = sessions.get(user_id)
+        if session is not None:
+            sessions.move_to_end(user_id)
+            return session
+
+        session = UserSession(self.tracker_params, self.history_capacity)
+        if self.load_session is not None:
+            data = self.load_session(user_id)
+            if data is not None:
+                session.restore(data)
+        sessions[user_id] = session
+        if len(sessions) > self.max_sessions:
+            old_id, old = sessions.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(old_id, old.snapshot())
+        return session
+
+    # --- ワーカー ---------------------------------------------------------
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            request, future = item
+            if future.cancelled():
+                continue
+            try:
+                session = self.session(request.user_id)
+                future.set_result(session.process(request, self.gate))
+            except Exception as exc:
+                future.set_exception(exc)
+            # 連続したターンで他のタスク（投入側）を飢えさせない
+            await asyncio.sleep(0)
+
+
+# ----------------------------------------------------------------------
+# ローカル負荷試験
+# ----------------------------------------------------------------------
+
+LOAD_TEXTS = [
+    "今日も普通でした。",
+    "大丈夫です。仕事が続いています。",
+    "特に変わりないです。",
+    "家族と喧嘩して、借金のこともあって眠れない",
+    "誰とも話してなくて孤独を感じる",
+]
+
+
+@dataclass
+class LoadReport:
+    users: int
+    turns: int
+    seconds: float
+    turns_per_sec: float
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+    out_of_order: int                    # ユーザー内でターン番号が飛んだ回数
+    routes: dict
+    reignition_cases: dict
+
+    def format(self) -> str:
+        return (
+            f"  users={self.users} turns={self.turns} "
+            f"({self.seconds:.2f}s, {self.turns_per_sec:,.0f} turns/s)\n"
+            f"  latency p50={self.p50_ms:.2f}ms p99={self.p99_ms:.2f}ms "
+            f"max={self.max_ms:.2f}ms\n"
+            f"  out_of_order={self.out_of_order}\n"
+            f"  routes={self.routes}\n"
+            f"  reignition={self.reignition_cases}"
+        )
+
+
+def synthetic_requests(user_id, turns, rng) -> list:
+    """1ユーザー分の合成ターン列（平穏な発話が中心、後半で苦痛が上がる）"""
+    base = rng.uniform(0.2, 0.5, 4)
+    onset = rng.integers(turns // 2, turns + 1)
+    requests = []
+    for t in range(turns):
+        d_obs = base + rng.normal(0, 0.04, 4) + (0.3 if t >= onset else 0.0)
+        requests.append(TurnRequest(
+            user_id=user_id,
+            text=LOAD_TEXTS[rng.integers(len(LOAD_TEXTS))],
+            d_obs=np.clip(d_obs, 0, 1).tolist(),
+            trauma_active=float(rng.uniform(0, 1) * (rng.random() < 0.2)),
+            g_rel=float(rng.uniform(0, 1)),
+            proposed_delta_p=float(rng.uniform(0, 0.6)),
+            g_value=float(rng.uniform(0, 1)),
+            v_consistency=float(rng.uniform(0.5, 1)),
+            d_dot=float(rng.normal(-0.01, 0.04)),
+            candidates=[{"action": f"action_{j}", "p_value": float(p)}
+                        for j, p in enumerate(rng.uniform(0, 1, 4))],
+        ))
+    return requests
+
+
+async def run_load_test(n_users=200, turns=50, n_shards=4, queue_size=256,
+                        pipeline=1, seed=0) -> LoadReport:
+    """
+    合成ユーザーを並行に走らせ、ターンごとの応答時間を集計する。
+
+    Args:
+        n_users: 同時接続ユーザー数
+        turns: 1ユーザーあたりのターン数
+        pipeline: 1ユーザーが応答を待たずに先行投入するターン数
+                  （1 = 応答を待ってから次を送る、通常の対話）
+    """
+    rng = np.random.default_rng(seed)
+    plans = {f"user-{u:05d}": synthetic_requests(f"user-{u:05d}", turns, rng)
+             for u in range(n_users)}
+    latencies = []
+    responses = []
+
+    async def user(requests):
+        # 投入は常にこのコルーチンから順番に行う（ユーザー内の順序）
+        in_flight = []
+
+        async def collect():
+            t0, future = in_flight.pop(0)
+            responses.append(await future)
+            latencies.append(time.perf_counter() - t0)
+
+        for request in requests:
+            if len(in_flight) >= pipeline:
+                await collect()
+            t0 = time.perf_counter()
+            in_flight.append((t0, await service.submit(request)))
+        while in_flight:
+            await collect()
+
+    service = TurnService(n_shards=n_shards, queue_size=queue_size)
+    t0 = time.perf_counter()
+    async with service:
+        await asyncio.gather(*(user(r) for r in plans.values()))
+    elapsed = time.perf_counter() - t0
+
+    last = {}
+    out_of_order = 0
+    routes, cases = {}, {}
+    for r in responses:
+        if r.turn != last.get(r.user_id, 0) + 1:
+            out_of_order += 1
+        last[r.user_id] = r.turn
+        routes[r.route] = routes.get(r.route, 0) + 1
+        cases[r.reignition_case] = cases.get(r.reignition_case, 0) + 1
+
+    ms = np.array(latencies) * 1e3
+    return LoadReport(
+        users=n_users, turns=len(responses), seconds=elapsed,
+        turns_per_sec=len(responses) / elapsed,
+        p50_ms=float(np.percentile(ms, 50)),
+        p99_ms=float(np.percentile(ms, 99)),
+        max_ms=float(ms.max()),
+        out_of_order=out_of_order,
+        routes=routes, reignition_cases=cases,
+    )
+
+
+# --- 動作確認 ---
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="QAP turn service load test")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=256)
+    parser.add_argument("--pipeline", type=int, default=1,
+                        help="turns in flight per user")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("=== Turn Service Load Test ===\n")
+    report = asyncio.run(run_load_test(
+        args.users, args.turns, args.shards, args.queue_size,
+        args.pipeline, args.seed
+    ))
+    print(report.format())